@@ -0,0 +1,41 @@
+'''
+Measures AsyncInsights throughput (requests per second) against the fake UCI engine.
+
+    python benchmarks/async_throughput.py --engines 4 --requests 400 --delay 20
+'''
+import argparse
+import asyncio
+import sys
+import time
+import chess.engine
+from chessx.aio import AsyncEnginePool, AsyncInsights
+
+FENS = [
+    'rn2kb1r/pp2qppp/2p2n2/4p1B1/2B1P3/1QN5/PPP2PPP/R3K2R b KQkq - 1 9',
+    '1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1',
+    'r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24',
+    '6k1/pp1n2pp/3bN3/3P1p2/1PP5/4rBqr/P2Q2P1/R4RK1 w - - 0 27',
+]
+
+
+async def run(engines: int, requests: int, delay: int) -> float:
+    command = [sys.executable, '-m', 'chessx.fake_uci']
+    async with AsyncEnginePool(command, size=engines, options={'Delay': delay}) as pool:
+        insights = AsyncInsights(pool, limit=chess.engine.Limit(time=delay / 1000))
+        start = time.perf_counter()
+        await insights.get_many(FENS[i % len(FENS)] for i in range(requests))
+        return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--delay', type=int, default=20, help='milliseconds the fake engine spends per analysis')
+    args = parser.parse_args()
+    rps = asyncio.run(run(args.engines, args.requests, args.delay))
+    print(f'{args.requests} requests, {args.engines} engines, {args.delay} ms per analysis: {rps:.1f} requests/s')
+
+
+if __name__ == '__main__':
+    main()
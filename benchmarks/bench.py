@@ -0,0 +1,177 @@
+'''
+Times each heuristic over the position corpus in benchmarks/corpus/*.epd and reports
+positions per second and p50/p99 latency per path. BuildInsights runs against an
+in-process stub engine, so only the library's own work is measured.
+
+    python benchmarks/bench.py                           # report only
+    python benchmarks/bench.py --save baseline.json      # record a baseline
+    python benchmarks/bench.py --check baseline.json     # exit 1 on a throughput regression
+
+Baselines are machine specific: record them on the machine that checks them. They are not
+committed, and --check fails straight away when its baseline file does not exist.
+'''
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import chess
+import chess.engine
+from chessx.fake_uci import material_score
+from chessx.heuristic import BuildInsights, PinnedPieces, PositionContext, PSQT, TrappedPieces
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+class StubEngine:
+    '''
+    Answers analyse() instantly with the material balance, like chessx.fake_uci but in process
+    '''
+    def analyse(self, board: chess.Board, limit: chess.engine.Limit) -> Dict[str, Any]:
+        return {'score': chess.engine.PovScore(chess.engine.Cp(material_score(board)), board.turn)}
+
+
+class StubPool:
+    def __init__(self) -> None:
+        self.engine = StubEngine()
+
+    @contextmanager
+    def borrow(self) -> Iterator[StubEngine]:
+        yield self.engine
+
+
+def load_corpus(pattern: str = '*.epd') -> List[Tuple[str, str]]:
+    '''
+    Returns (category, fen) pairs, the category being the name of the EPD file
+    '''
+    positions = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, pattern))):
+        category = os.path.splitext(os.path.basename(path))[0]
+        with open(path) as f:
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    board, _ = chess.Board.from_epd(line)
+                    positions.append((category, board.fen()))
+    return positions
+
+
+def _psqt(fen: str) -> None:
+    PSQT(fen).get_explanations()
+
+
+def _pins(fen: str) -> None:
+    PinnedPieces(fen).get_explanations()
+
+
+def _trapped(fen: str) -> None:
+    TrappedPieces(fen).get_explanations()
+
+
+_stub_pool = StubPool()
+
+
+def _insights(fen: str) -> None:
+    BuildInsights(PositionContext(fen), pool=_stub_pool).get_insights()  # type: ignore
+
+
+PATHS: Dict[str, Callable[[str], None]] = {
+    'psqt': _psqt,
+    'pins': _pins,
+    'trapped': _trapped,
+    'insights': _insights,
+}
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_path(fn: Callable[[str], None], fens: List[str], rounds: int) -> Dict[str, float]:
+    '''
+    Times fn on every fen for rounds passes after one warm-up pass
+    '''
+    for fen in fens:
+        fn(fen)
+    latencies = []
+    clock = time.perf_counter
+    for _ in range(rounds):
+        for fen in fens:
+            start = clock()
+            fn(fen)
+            latencies.append(clock() - start)
+    total = sum(latencies)
+    return {
+        'positions': len(latencies),
+        'positions_per_sec': len(latencies) / total,
+        'p50_us': percentile(latencies, 0.50) * 1e6,
+        'p99_us': percentile(latencies, 0.99) * 1e6,
+        'mean_us': statistics.fmean(latencies) * 1e6,
+    }
+
+
+def run(paths: List[str], rounds: int, corpus: str = '*') -> Dict[str, Dict[str, float]]:
+    fens = [fen for _, fen in load_corpus(f'{corpus}.epd')]
+    if not fens:
+        raise SystemExit(f'no positions found in {CORPUS_DIR}')
+    return {name: run_path(PATHS[name], fens, rounds) for name in paths}
+
+
+def check(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    '''
+    Returns a message for every path whose throughput fell more than threshold below the baseline
+    '''
+    failures = []
+    for name, result in results.items():
+        if name not in baseline['results']:
+            continue
+        expected = baseline['results'][name]['positions_per_sec']
+        actual = result['positions_per_sec']
+        if actual < expected * (1 - threshold):
+            failures.append(f'{name}: {actual:.0f} positions/s is {1 - actual / expected:.0%} below the baseline of {expected:.0f}')
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', help=f'paths to time, any of {", ".join(PATHS)} (default: all)')
+    parser.add_argument('--corpus', default='*', help='EPD file in benchmarks/corpus to use, without extension (default: all)')
+    parser.add_argument('--rounds', type=int, default=20, help='timed passes over the corpus per path')
+    parser.add_argument('--save', metavar='JSON', help='write the results to this baseline file')
+    parser.add_argument('--check', metavar='JSON', help='compare throughput against this baseline file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed throughput drop, as a fraction (default 0.2)')
+    args = parser.parse_args()
+    unknown = [name for name in args.paths if name not in PATHS]
+    if unknown:
+        parser.error(f'unknown paths: {", ".join(unknown)}')
+    if args.check and args.check != args.save and not os.path.exists(args.check):
+        parser.error(f'no baseline at {args.check} (record one with --save {args.check})')
+
+    results = run(args.paths or list(PATHS), args.rounds, args.corpus)
+    print(f'{"path":<10} {"positions/s":>12} {"p50 us":>10} {"p99 us":>10}')
+    for name, result in results.items():
+        print(f'{name:<10} {result["positions_per_sec"]:>12.0f} {result["p50_us"]:>10.1f} {result["p99_us"]:>10.1f}')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'chess': chess.__version__,
+                       'corpus': args.corpus, 'rounds': args.rounds, 'results': results}, f, indent=2)
+        print(f'baseline saved to {args.save}')
+    if args.check:
+        with open(args.check) as f:
+            failures = check(results, json.load(f), args.threshold)
+        for failure in failures:
+            print(f'REGRESSION {failure}', file=sys.stderr)
+        if failures:
+            sys.exit(1)
+        print(f'no regression beyond {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
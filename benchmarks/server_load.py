@@ -0,0 +1,90 @@
+'''
+Load-tests chessx.server on one machine: starts an InsightServer on a Unix socket with the
+fake UCI engine and fires requests from concurrent keep-alive clients. Reports requests per
+second, client-side latency percentiles, rejections (503) and the server's own stats.
+
+    python benchmarks/server_load.py --engines 4 --clients 64 --requests 2000 --delay 20
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import chess
+import chess.engine
+from chessx.aio import AsyncEnginePool
+from chessx.server import InsightServer, percentile
+
+
+def random_positions(n: int, seed: int = 0) -> list:
+    '''
+    Returns n positions reached by random playouts, nearly all distinct so the server cache does not answer them
+    '''
+    rng = random.Random(seed)
+    fens = []
+    while len(fens) < n:
+        board = chess.Board()
+        for _ in range(rng.randint(8, 60)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        if not board.is_game_over():
+            fens.append(board.fen())
+    return fens
+
+
+async def client(path: str, fens: list, latencies: list, statuses: dict) -> None:
+    reader, writer = await asyncio.open_unix_connection(path)
+    for fen in fens:
+        body = json.dumps({'fen': fen}).encode()
+        start = time.perf_counter()
+        writer.write(f'POST /insights HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while (line := await reader.readline()) != b'\r\n':
+            if line.lower().startswith(b'content-length:'):
+                length = int(line.split(b':')[1])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    writer.close()
+
+
+async def run(args: argparse.Namespace) -> None:
+    command = [sys.executable, '-m', 'chessx.fake_uci']
+    path = os.path.join(tempfile.mkdtemp(), 'chessx.sock')
+    async with AsyncEnginePool(command, size=args.engines, options={'Delay': args.delay}) as pool:
+        async with InsightServer(pool, limit=chess.engine.Limit(depth=1), max_batch=args.max_batch,
+                                 max_wait=args.max_wait_ms / 1000, queue_size=args.queue_size) as server:
+            async with await server.listen(path=path):
+                latencies: list = []
+                statuses: dict = {}
+                fens = random_positions(args.requests)
+                start = time.perf_counter()
+                await asyncio.gather(*(client(path, fens[c::args.clients], latencies, statuses) for c in range(args.clients)))
+                elapsed = time.perf_counter() - start
+                print(f'{len(latencies)} requests from {args.clients} clients, {args.engines} engines, {args.delay} ms per analysis: '
+                      f'{len(latencies) / elapsed:.1f} requests/s')
+                print('client latency p50/p90/p99: ' + '/'.join(f'{percentile(latencies, q) * 1000:.1f}' for q in (50, 90, 99)) + ' ms')
+                print(f'statuses: {statuses}')
+                print(f'server: {server.stats}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--delay', type=int, default=20, help='milliseconds the fake engine spends per analysis')
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--queue-size', type=int, default=256)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
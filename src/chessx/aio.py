@@ -0,0 +1,199 @@
+'''
+asyncio counterparts of EnginePool and BuildInsights for use inside event loops.
+'''
+from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Tuple, Union
+import asyncio
+import contextvars
+import functools
+import chess.engine
+from chessx import metrics
+from chessx.cache import ExplanationCache
+from chessx.engine import EngineCommand, default_engine_command
+from chessx.heuristic import BuildInsights, PositionContext
+
+EngineProcess = Tuple[asyncio.SubprocessTransport, chess.engine.UciProtocol]
+
+
+class AsyncEnginePool:
+    '''
+    Keeps a fixed number of warm UCI engines driven by python-chess's asyncio protocol.
+    Coroutines check engines out and return them; at most size analyses run at once.
+    '''
+
+    def __init__(self, command: Union[EngineCommand, None] = None, size: int = 1, threads: Union[int, None] = None,
+                 hash_mb: Union[int, None] = None, options: Union[Dict[str, Any], None] = None, timeout: float = 10.0) -> None:
+        if size < 1:
+            raise ValueError(f'size must be at least 1, got {size}')
+        self.command = command if command is not None else default_engine_command()
+        self.size = size
+        self.timeout = timeout
+        self.options = dict(options or {})
+        if threads is not None:
+            self.options['Threads'] = threads
+        if hash_mb is not None:
+            self.options['Hash'] = hash_mb
+        self.restarts = 0
+        self._closed = False
+        self._idle: Union[asyncio.Queue[EngineProcess], None] = None
+        self._engines: List[EngineProcess] = []
+
+    async def start(self) -> AsyncEnginePool:
+        '''
+        Spawns the engines, must be awaited inside the event loop that uses the pool
+        '''
+        self._idle = asyncio.Queue()
+        try:
+            for engine in await asyncio.gather(*(self._spawn() for _ in range(self.size))):
+                self._idle.put_nowait(engine)
+        except BaseException:
+            await self.close()
+            raise
+        return self
+
+    async def _spawn(self) -> EngineProcess:
+        transport, protocol = await asyncio.wait_for(chess.engine.popen_uci(self.command), self.timeout)
+        engine = (transport, protocol)
+        self._engines.append(engine)
+        if self.options:
+            await protocol.configure(self.options)
+        return engine
+
+    async def _discard(self, engine: EngineProcess) -> None:
+        if engine in self._engines:
+            self._engines.remove(engine)
+        transport, protocol = engine
+        try:
+            await asyncio.wait_for(protocol.quit(), self.timeout)
+        except Exception:
+            transport.close()
+
+    async def restart(self, engine: EngineProcess) -> EngineProcess:
+        '''
+        Replaces a crashed or hung engine with a freshly spawned one
+        '''
+        await self._discard(engine)
+        self.restarts += 1
+        metrics.count('engine_restarts')
+        return await self._spawn()
+
+    async def is_healthy(self, engine: EngineProcess) -> bool:
+        try:
+            await asyncio.wait_for(engine[1].ping(), self.timeout)
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError, asyncio.TimeoutError, OSError):
+            return False
+        return True
+
+    async def checkout(self) -> EngineProcess:
+        '''
+        Waits for an idle engine, restarting it first if it fails its health check
+        '''
+        if self._idle is None or self._closed:
+            raise RuntimeError('AsyncEnginePool is not started or already closed')
+        engine = await self._idle.get()
+        if not await self.is_healthy(engine):
+            try:
+                engine = await self.restart(engine)
+            except BaseException:
+                self._idle.put_nowait(engine)
+                raise
+        return engine
+
+    def checkin(self, engine: EngineProcess) -> None:
+        if self._idle is None or self._closed:
+            engine[0].close()
+        else:
+            self._idle.put_nowait(engine)
+
+    @asynccontextmanager
+    async def borrow(self) -> AsyncIterator[chess.engine.UciProtocol]:
+        '''
+        Async context manager yielding the protocol of a checked out engine
+        '''
+        engine = await self.checkout()
+        try:
+            yield engine[1]
+        except chess.engine.EngineTerminatedError:
+            try:
+                engine = await self.restart(engine)
+            finally:
+                self.checkin(engine)
+            raise
+        except BaseException:
+            self.checkin(engine)
+            raise
+        else:
+            self.checkin(engine)
+
+    async def close(self) -> None:
+        self._closed = True
+        await asyncio.gather(*(self._discard(engine) for engine in list(self._engines)), return_exceptions=True)
+
+    async def __aenter__(self) -> AsyncEnginePool:
+        return await self.start()
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+
+def _insights_for(position: Union[str, PositionContext], score: int, cache: Union[ExplanationCache, None]) -> List[str]:
+    return BuildInsights(position, cache=cache, score=score).get_insights()
+
+
+class AsyncInsights:
+    '''
+    Async BuildInsights: engine analyses run concurrently on an AsyncEnginePool, while the
+    CPU-bound heuristics run on executor (the loop's default thread pool if None) so the
+    event loop never stalls. A cache is only consulted by thread executors, not process ones.
+    '''
+
+    def __init__(self, pool: AsyncEnginePool, limit: Union[chess.engine.Limit, None] = None,
+                 executor: Union[Executor, None] = None, cache: Union[ExplanationCache, None] = None) -> None:
+        self.pool = pool
+        self.limit = limit if limit is not None else chess.engine.Limit(time=0.1)
+        self.executor = executor
+        self.cache = cache
+
+    async def get_score(self, fen: Union[str, PositionContext]) -> int:
+        '''
+        Returns the engine's score in centipawns from White's point of view.
+        Raises chess.engine.EngineError if the engine sent no score.
+        '''
+        ctx = PositionContext.of(fen)
+        cache_key = ('eval', ctx.zobrist_key, repr(self.limit))
+        if self.cache is not None:
+            score = self.cache.get(cache_key)
+            if score is not None:
+                return score
+        with metrics.timed('engine'):
+            async with self.pool.borrow() as engine:
+                info = await engine.analyse(ctx.board, self.limit)
+        if 'score' not in info:
+            raise chess.engine.EngineError(f'engine sent no score for {ctx.fen}')
+        score = info['score'].white().score(mate_score=100000)
+        if self.cache is not None:
+            self.cache.put(cache_key, score)
+        return score
+
+    async def get_insights(self, fen: str) -> List[str]:
+        '''
+        Returns the same explanations as BuildInsights(fen).get_insights()
+        '''
+        ctx = PositionContext(fen)
+        score = await self.get_score(ctx)
+        loop = asyncio.get_running_loop()
+        if isinstance(self.executor, ProcessPoolExecutor):
+            # neither a cache nor a metrics sink can be shipped to worker processes, and the FEN is smaller than the board
+            return await loop.run_in_executor(self.executor, functools.partial(_insights_for, fen, score, None))
+        # run in a copy of this task's context, so that the heuristics report to its metrics sink;
+        # the thread shares the board parsed for the engine
+        call = functools.partial(contextvars.copy_context().run, _insights_for, ctx, score, self.cache)
+        return await loop.run_in_executor(self.executor, call)
+
+    async def get_many(self, fens: Iterable[str]) -> List[List[str]]:
+        '''
+        Explains all fens concurrently, results in input order
+        '''
+        return await asyncio.gather(*(self.get_insights(fen) for fen in fens))
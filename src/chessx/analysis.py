@@ -0,0 +1,144 @@
+'''
+Latency-budgeted engine analysis.
+
+An AnalysisPolicy turns a per-request time budget into engine limits, follows the search
+iteration by iteration and stops it as soon as the score has settled, so quiet positions
+return early while sharp ones may use the whole budget but never more.
+'''
+from __future__ import annotations
+from typing import Dict, List, Tuple, Union
+import time
+import chess
+import chess.engine
+from chessx import metrics
+
+
+class AnalysisReport:
+    '''
+    Result of one budgeted analysis: the latest info of every principal variation (best first),
+    the limit the engine was given and how much of the budget was spent
+    '''
+    def __init__(self, lines: List[chess.engine.InfoDict], limit: chess.engine.Limit, budget: float, elapsed: float,
+                 stopped_early: bool) -> None:
+        self.lines = lines
+        self.limit = limit
+        self.budget = budget
+        self.elapsed = elapsed
+        self.stopped_early = stopped_early
+
+    @property
+    def score(self) -> int:
+        '''
+        Score of the best line in centipawns from White's point of view
+        '''
+        return self.lines[0]['score'].white().score(mate_score=100000)
+
+    @property
+    def depth(self) -> int:
+        return self.lines[0].get('depth', 0)
+
+    @property
+    def nodes(self) -> int:
+        return max((line.get('nodes', 0) for line in self.lines), default=0)
+
+    @property
+    def budget_used(self) -> float:
+        '''
+        Fraction of the budget spent, above 1.0 if the engine overran it
+        '''
+        return self.elapsed/self.budget
+
+    def alternatives(self) -> List[Tuple[chess.Move, int]]:
+        '''
+        Returns the first move of every line with its score in centipawns from White's point of view
+        '''
+        return [(line['pv'][0], line['score'].white().score(mate_score=100000)) for line in self.lines if line.get('pv')]
+
+    def __str__(self):
+        return (f'score: {self.score}, depth: {self.depth}, nodes: {self.nodes}, lines: {len(self.lines)}, '
+                f'elapsed: {self.elapsed*1000:.1f} ms, budget_used: {self.budget_used:.0%}, stopped_early: {self.stopped_early}')
+
+
+class AnalysisPolicy:
+    '''
+    Chooses engine limits from a latency budget (seconds per request) and stops the search early
+    once the best line's score has stayed within stable_cp centipawns for stable_depths consecutive
+    depths, counting only depths from min_depth on. A part (reserve) of the budget is kept back
+    for the engine's own overhead. nodes_per_second, if known for the engine and machine, also caps
+    the search by nodes, which makes results reproducible. multipv lines are reported.
+    '''
+    def __init__(self, budget: float = 0.1, multipv: int = 1, min_depth: int = 4, max_depth: Union[int, None] = None,
+                 stable_depths: int = 3, stable_cp: int = 15, nodes_per_second: Union[int, None] = None,
+                 reserve: float = 0.1) -> None:
+        if budget <= 0:
+            raise ValueError(f'budget must be positive, got {budget}')
+        if multipv < 1:
+            raise ValueError(f'multipv must be at least 1, got {multipv}')
+        self.budget = budget
+        self.multipv = multipv
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.stable_depths = stable_depths
+        self.stable_cp = stable_cp
+        self.nodes_per_second = nodes_per_second
+        self.reserve = reserve
+
+    def __repr__(self):
+        return (f'AnalysisPolicy(budget={self.budget!r}, multipv={self.multipv!r}, min_depth={self.min_depth!r}, '
+                f'max_depth={self.max_depth!r}, stable_depths={self.stable_depths!r}, stable_cp={self.stable_cp!r}, '
+                f'nodes_per_second={self.nodes_per_second!r}, reserve={self.reserve!r})')
+
+    def limit_for(self, board: chess.Board) -> chess.engine.Limit:
+        '''
+        Returns the engine limit for board: a single iteration for a forced move, else the budget
+        less the reserve, capped by max_depth and by the nodes the engine can search in that time
+        '''
+        if board.legal_moves.count() <= 1:
+            return chess.engine.Limit(depth=1)
+        seconds = self.budget*(1-self.reserve)
+        nodes = int(self.nodes_per_second*seconds) if self.nodes_per_second else None
+        return chess.engine.Limit(time=seconds, depth=self.max_depth, nodes=nodes)
+
+    def is_stable(self, scores: List[Tuple[int, int]]) -> bool:
+        '''
+        scores holds (depth, centipawns) of the exact best line score of every completed depth so far
+        '''
+        recent = [cp for depth, cp in scores if depth >= self.min_depth][-self.stable_depths:]
+        return len(recent) == self.stable_depths and max(recent)-min(recent) <= self.stable_cp
+
+    def analyse(self, engine: chess.engine.SimpleEngine, board: chess.Board) -> AnalysisReport:
+        '''
+        Analyses board on engine within the budget and returns what the search found.
+        Raises chess.engine.EngineError if the engine sent no exact score.
+        '''
+        start = time.perf_counter()
+        limit = self.limit_for(board)
+        # the last line of each depth completes that iteration
+        last_line = max(1, min(self.multipv, board.legal_moves.count()))
+        scores: List[Tuple[int, int]] = []
+        # latest info per line, as of the last completed depth
+        lines: Dict[int, chess.engine.InfoDict] = {}
+        stopped_early = False
+        with engine.analysis(board, limit, multipv=self.multipv) as analysis:
+            for info in analysis:
+                # lines cut short by the aspiration window only bound the score of their depth
+                if 'score' not in info or info.get('lowerbound') or info.get('upperbound'):
+                    continue
+                lines[info.get('multipv', 1)] = info
+                # a depth is only complete once its best line has an exact score too
+                if info.get('multipv', 1) != last_line or 1 not in lines:
+                    continue
+                scores.append((lines[1].get('depth', 0), lines[1]['score'].white().score(mate_score=100000)))
+                if self.is_stable(scores):
+                    stopped_early = True
+                elif time.perf_counter()-start < self.budget:
+                    continue
+                # whatever the engine sends after this is ignored
+                analysis.stop()
+                break
+            analysis.wait()
+        if not lines:
+            raise chess.engine.EngineError(f'engine sent no scored line for {board.fen()}')
+        if stopped_early:
+            metrics.count('early_stops')
+        return AnalysisReport([lines[k] for k in sorted(lines)], limit, self.budget, time.perf_counter()-start, stopped_early)
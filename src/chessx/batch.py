@@ -0,0 +1,196 @@
+'''
+Vectorised scoring of large position batches with NumPy.
+
+Positions are given either as an N x 12 x 64 occupancy tensor or as N x 12 packed
+bitboards (uint64), with the 12 planes ordered like PIECE_SYMBOLS: PNBRQK for White
+followed by pnbrqk for Black.
+'''
+from __future__ import annotations
+from typing import Iterable
+import chess
+from chessx.heuristic import PSQT
+from chessx.packed import PositionBuffer
+from chessx.records import Explanation, pack_records
+
+try:
+    import numpy as np
+except ImportError as e:  # pragma: no cover
+    raise ImportError('chessx.batch requires numpy, install it with: pip install chessx[numpy]') from e
+
+PIECE_SYMBOLS = 'PNBRQKpnbrqk'
+
+# lowercase piece types in the column order of batch_piece_eval
+PIECE_TYPES = 'pnbrqk'
+
+
+def build_psqt_tables() -> np.ndarray:
+    '''
+    Returns a 12 x 64 array holding piece value + piece square table entry
+    for every (piece, square), built from PSQT.build_psqt_map
+    '''
+    psqt_map = PSQT.build_psqt_map()
+    tables = np.empty((12, 64), dtype=np.int64)
+    for i, symbol in enumerate(PIECE_SYMBOLS):
+        tables[i] = np.asarray(psqt_map[symbol], dtype=np.int64)+PSQT.piece_val_map[symbol.lower()]
+    tables.setflags(write=False)
+    return tables
+
+
+def build_byte_tables(tables: np.ndarray) -> np.ndarray:
+    '''
+    Returns a 12 x 8 x 256 lookup table: the summed score of every possible
+    byte of a bitboard, so packed positions can be scored without unpacking them
+    '''
+    bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder='little')
+    byte_tables = np.einsum('pbk,vk->pbv', tables.reshape(12, 8, 8), bits.astype(np.int64))
+    byte_tables.setflags(write=False)
+    return byte_tables
+
+
+PSQT_TABLES = build_psqt_tables()
+PSQT_BYTE_TABLES = build_byte_tables(PSQT_TABLES)
+
+
+def pack_boards(boards: Iterable[chess.Board]) -> np.ndarray:
+    '''
+    Returns an N x 12 uint64 array with one bitboard per piece symbol
+    '''
+    rows = []
+    for board in boards:
+        rows.append([board.pieces_mask(chess.PIECE_SYMBOLS.index(symbol.lower()), symbol.isupper()) for symbol in PIECE_SYMBOLS])
+    return np.array(rows, dtype=np.uint64).reshape(-1, 12)
+
+
+def unpack_bitboards(bitboards: np.ndarray) -> np.ndarray:
+    '''
+    Converts N x 12 packed bitboards into an N x 12 x 64 occupancy tensor
+    '''
+    as_bytes = np.ascontiguousarray(bitboards, dtype='<u8').view(np.uint8).reshape(-1, 12, 8)
+    return np.unpackbits(as_bytes, axis=2, bitorder='little').astype(bool)
+
+
+def batch_piece_eval(positions: np.ndarray) -> np.ndarray:
+    '''
+    Takes N x 12 packed bitboards or an N x 12 x 64 occupancy tensor.
+    Returns an N x 6 array of white minus black PSQT scores, one column per
+    piece type in PIECE_TYPES order, equal to PSQT.get_piece_eval for each position
+    '''
+    positions = np.asarray(positions)
+    if positions.ndim == 2:
+        as_bytes = np.ascontiguousarray(positions, dtype='<u8').view(np.uint8).reshape(-1, 12, 8)
+        scores = PSQT_BYTE_TABLES[np.arange(12)[:, None], np.arange(8), as_bytes].sum(axis=2)
+    elif positions.ndim == 3:
+        scores = np.einsum('nps,ps->np', positions.astype(np.int64, copy=False), PSQT_TABLES)
+    else:
+        raise ValueError(f'Expected N x 12 bitboards or N x 12 x 64 occupancy, got shape {positions.shape}')
+    return scores[:, :6]-scores[:, 6:]
+
+
+# the chessx.packed position layout, one field per packed field
+POSITION_DTYPE = np.dtype([('white', '<u8'), ('black', '<u8'), ('pawns', '<u8'), ('knights', '<u8'), ('bishops', '<u8'),
+                           ('rooks', '<u8'), ('queens', '<u8'), ('kings', '<u8'), ('castling', '<u2'), ('ep_square', 'u1'),
+                           ('flags', 'u1'), ('halfmove_clock', '<u2'), ('fullmove_number', '<u2')])
+
+PIECE_FIELDS = ('pawns', 'knights', 'bishops', 'rooks', 'queens', 'kings')
+
+
+def positions_array(buffer: PositionBuffer) -> np.ndarray:
+    '''
+    Returns a structured (POSITION_DTYPE) view of the positions in buffer, without copying.
+    Delete the view before closing the buffer.
+    '''
+    return np.frombuffer(buffer.shm.buf, dtype=POSITION_DTYPE, count=len(buffer))
+
+
+def piece_bitboards(positions: np.ndarray) -> np.ndarray:
+    '''
+    Converts packed positions (POSITION_DTYPE) into N x 12 bitboards in PIECE_SYMBOLS order
+    '''
+    bitboards = np.empty((len(positions), 12), dtype=np.uint64)
+    for i, field in enumerate(PIECE_FIELDS):
+        bitboards[:, i] = positions[field] & positions['white']
+        bitboards[:, i+6] = positions[field] & positions['black']
+    return bitboards
+
+
+# one int32 field per Explanation field, laid out like pack_records
+RECORD_DTYPE = np.dtype([(field, np.int32) for field in Explanation._fields])
+
+
+def records_array(records: Iterable[Explanation]) -> np.ndarray:
+    '''
+    Returns explanation records as a structured array, for filtering and counting in bulk,
+    e.g. np.bincount(a['piece_type'][a['kind'] == KIND_TRAPPED])
+    '''
+    return np.frombuffer(pack_records(records), dtype=RECORD_DTYPE)
+
+
+# (shift, mask of the squares a step in that direction can land on) per sliding direction
+ROOK_DIRECTIONS = [(8, chess.BB_ALL), (-8, chess.BB_ALL), (1, ~chess.BB_FILE_A & chess.BB_ALL), (-1, ~chess.BB_FILE_H & chess.BB_ALL)]
+BISHOP_DIRECTIONS = [(9, ~chess.BB_FILE_A & chess.BB_ALL), (7, ~chess.BB_FILE_H & chess.BB_ALL),
+                     (-7, ~chess.BB_FILE_A & chess.BB_ALL), (-9, ~chess.BB_FILE_H & chess.BB_ALL)]
+KNIGHT_STEPS = [(17, ~chess.BB_FILE_A), (15, ~chess.BB_FILE_H), (10, ~(chess.BB_FILE_A | chess.BB_FILE_B)),
+                (6, ~(chess.BB_FILE_G | chess.BB_FILE_H)), (-6, ~(chess.BB_FILE_A | chess.BB_FILE_B)),
+                (-10, ~(chess.BB_FILE_G | chess.BB_FILE_H)), (-15, ~chess.BB_FILE_A), (-17, ~chess.BB_FILE_H)]
+
+# lowercase piece types in the column order of batch_mobility
+MOBILITY_PIECE_TYPES = 'nbrq'
+
+POPCOUNT_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+
+def _shift(bitboards: np.ndarray, shift: int) -> np.ndarray:
+    if shift > 0:
+        return np.left_shift(bitboards, np.uint64(shift))
+    return np.right_shift(bitboards, np.uint64(-shift))
+
+
+def _popcount(bitboards: np.ndarray) -> np.ndarray:
+    as_bytes = np.ascontiguousarray(bitboards, dtype='<u8').view(np.uint8).reshape(bitboards.shape+(8,))
+    return POPCOUNT_TABLE[as_bytes].sum(axis=-1)
+
+
+def _slide(pieces: np.ndarray, empty: np.ndarray, shift: int, mask: int) -> np.ndarray:
+    '''
+    Returns the squares attacked by pieces sliding in one direction (Kogge-Stone occluded fill)
+    '''
+    mask = np.uint64(mask)
+    empty = empty & mask
+    for step in (shift, 2*shift, 4*shift):
+        pieces = pieces | (empty & _shift(pieces, step))
+        empty = empty & _shift(empty, step)
+    return _shift(pieces, shift) & mask
+
+
+def _pawn_attacks(pawns: np.ndarray, color: bool) -> np.ndarray:
+    if color == chess.WHITE:
+        return (_shift(pawns, 7) & np.uint64(~chess.BB_FILE_H & chess.BB_ALL)) | (_shift(pawns, 9) & np.uint64(~chess.BB_FILE_A & chess.BB_ALL))
+    return (_shift(pawns, -7) & np.uint64(~chess.BB_FILE_A & chess.BB_ALL)) | (_shift(pawns, -9) & np.uint64(~chess.BB_FILE_H & chess.BB_ALL))
+
+
+def batch_mobility(bitboards: np.ndarray, safe: bool = True) -> np.ndarray:
+    '''
+    Takes N x 12 packed bitboards. Returns an N x 2 x 4 array with the mobility of White's
+    (row 0) and Black's (row 1) pieces per piece type in MOBILITY_PIECE_TYPES order, equal to
+    Mobility.get_mobility for each position. Every direction is filled and counted separately,
+    so squares reached by several pieces count once per piece.
+    '''
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    if bitboards.ndim != 2 or bitboards.shape[1] != 12:
+        raise ValueError(f'Expected N x 12 bitboards, got shape {bitboards.shape}')
+    white = np.bitwise_or.reduce(bitboards[:, :6], axis=1)
+    black = np.bitwise_or.reduce(bitboards[:, 6:], axis=1)
+    empty = ~(white | black)
+    mobility = np.zeros((len(bitboards), 2, 4), dtype=np.int64)
+    for row, (color, own, offset) in enumerate([(chess.WHITE, white, 0), (chess.BLACK, black, 6)]):
+        targets = ~own
+        if safe:
+            targets &= ~_pawn_attacks(bitboards[:, 6-offset], not color)
+        knights = bitboards[:, offset+1]
+        for shift, mask in KNIGHT_STEPS:
+            mobility[:, row, 0] += _popcount(_shift(knights, shift) & np.uint64(mask & chess.BB_ALL) & targets)
+        for column, directions in [(1, BISHOP_DIRECTIONS), (2, ROOK_DIRECTIONS), (3, BISHOP_DIRECTIONS+ROOK_DIRECTIONS)]:
+            pieces = bitboards[:, offset+column+1]
+            for shift, mask in directions:
+                mobility[:, row, column] += _popcount(_slide(pieces, empty, shift, mask) & targets)
+    return mobility
@@ -0,0 +1,105 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple, Union
+import json
+import sqlite3
+import threading
+from chessx import metrics
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+    def __str__(self):
+        return (f'hits: {self.hits}, misses: {self.misses}, evictions: {self.evictions}, disk_hits: {self.disk_hits}')
+
+
+class ExplanationCache:
+    '''
+    Cache for engine scores and explanation lists, keyed by tuples starting with a
+    position's Zobrist hash. Entries live in an in-memory LRU bounded to maxsize entries
+    and, if path is given, are also written to a SQLite file that survives restarts.
+    Values must be JSON serialisable.
+    '''
+
+    def __init__(self, maxsize: int = 100000, path: Union[str, None] = None) -> None:
+        if maxsize < 1:
+            raise ValueError(f'maxsize must be at least 1, got {maxsize}')
+        self.maxsize = maxsize
+        self.path = path
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._db: Union[sqlite3.Connection, None] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+
+    @staticmethod
+    def _db_key(key: Tuple[Any, ...]) -> str:
+        return json.dumps(key)
+
+    def get(self, key: Tuple[Any, ...]) -> Any:
+        '''
+        Returns the cached value for key, or None on a miss
+        '''
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                metrics.count('cache_hits')
+                return self._entries[key]
+            if self._db is not None:
+                row = self._db.execute('SELECT value FROM cache WHERE key = ?', (self._db_key(key),)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value)
+                    self.stats.hits += 1
+                    self.stats.disk_hits += 1
+                    metrics.count('cache_hits')
+                    return value
+            self.stats.misses += 1
+            metrics.count('cache_misses')
+            return None
+
+    def put(self, key: Tuple[Any, ...], value: Any) -> None:
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', (self._db_key(key), json.dumps(value)))
+
+    def _remember(self, key: Tuple[Any, ...], value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        '''
+        Drops all entries, from memory and from the SQLite file
+        '''
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM cache')
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __enter__(self) -> ExplanationCache:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
@@ -0,0 +1,189 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Union
+import atexit
+import os
+import queue
+import shutil
+import threading
+import chess.engine
+from chessx import metrics
+
+EngineCommand = Union[str, List[str]]
+
+# environment variable holding the path of the UCI engine used when none is configured
+ENGINE_ENV_VAR = 'CHESSX_ENGINE'
+
+
+def default_engine_command() -> EngineCommand:
+    '''
+    Returns the engine set in $CHESSX_ENGINE, else the stockfish found on PATH
+    '''
+    command = os.environ.get(ENGINE_ENV_VAR) or shutil.which('stockfish')
+    if command is None:
+        raise FileNotFoundError(f'No UCI engine found: install stockfish or set ${ENGINE_ENV_VAR}')
+    return command
+
+
+class EnginePool:
+    '''
+    Keeps a fixed number of warm UCI engine processes which callers check out and return,
+    so that an analysis does not pay for a process spawn and a UCI handshake
+    '''
+
+    def __init__(self, command: Union[EngineCommand, None] = None, size: int = 1, threads: Union[int, None] = None,
+                 hash_mb: Union[int, None] = None, options: Union[Dict[str, Any], None] = None, timeout: float = 10.0) -> None:
+        if size < 1:
+            raise ValueError(f'size must be at least 1, got {size}')
+        self.command = command if command is not None else default_engine_command()
+        self.size = size
+        self.timeout = timeout
+        self.options = dict(options or {})
+        if threads is not None:
+            self.options['Threads'] = threads
+        if hash_mb is not None:
+            self.options['Hash'] = hash_mb
+        self.restarts = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._idle: queue.LifoQueue[chess.engine.SimpleEngine] = queue.LifoQueue()
+        self._engines: List[chess.engine.SimpleEngine] = []
+        try:
+            for _ in range(size):
+                self._idle.put(self._spawn())
+        except BaseException:
+            self.close()
+            raise
+
+    def _spawn(self) -> chess.engine.SimpleEngine:
+        engine = chess.engine.SimpleEngine.popen_uci(self.command, timeout=self.timeout)
+        try:
+            if self.options:
+                engine.configure(self.options)
+        except BaseException:
+            engine.close()
+            raise
+        with self._lock:
+            self._engines.append(engine)
+        return engine
+
+    def _discard(self, engine: chess.engine.SimpleEngine) -> None:
+        with self._lock:
+            if engine in self._engines:
+                self._engines.remove(engine)
+        try:
+            engine.close()
+        except Exception:
+            pass
+
+    def restart(self, engine: chess.engine.SimpleEngine) -> chess.engine.SimpleEngine:
+        '''
+        Replaces a crashed or hung engine with a freshly spawned one
+        '''
+        self._discard(engine)
+        self.restarts += 1
+        metrics.count('engine_restarts')
+        return self._spawn()
+
+    def is_healthy(self, engine: chess.engine.SimpleEngine) -> bool:
+        '''
+        Returns True if the engine answers isready in time
+        '''
+        try:
+            engine.ping()
+        except (chess.engine.EngineError, chess.engine.EngineTerminatedError, TimeoutError, OSError):
+            return False
+        return True
+
+    def checkout(self, timeout: Union[float, None] = None) -> chess.engine.SimpleEngine:
+        '''
+        Takes an idle engine out of the pool, blocking up to timeout seconds for one to be returned.
+        Engines that fail their health check are restarted before being handed out.
+        '''
+        if self._closed:
+            raise RuntimeError('EnginePool is closed')
+        try:
+            engine = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f'No engine became available within {timeout}s') from None
+        if not self.is_healthy(engine):
+            try:
+                engine = self.restart(engine)
+            except BaseException:
+                # keep the pool at its size even if the restart failed, the next checkout retries
+                self._idle.put(engine)
+                raise
+        return engine
+
+    def checkin(self, engine: chess.engine.SimpleEngine) -> None:
+        '''
+        Returns a checked out engine to the pool
+        '''
+        if self._closed:
+            self._discard(engine)
+        else:
+            self._idle.put(engine)
+
+    @contextmanager
+    def borrow(self, timeout: Union[float, None] = None) -> Iterator[chess.engine.SimpleEngine]:
+        '''
+        Context manager that checks an engine out and returns it afterwards
+        '''
+        engine = self.checkout(timeout=timeout)
+        try:
+            yield engine
+        except chess.engine.EngineTerminatedError:
+            # the engine crashed while in use, hand back a working one
+            try:
+                engine = self.restart(engine)
+            finally:
+                self.checkin(engine)
+            raise
+        except BaseException:
+            self.checkin(engine)
+            raise
+        else:
+            self.checkin(engine)
+
+    def close(self) -> None:
+        '''
+        Quits all engines, including the ones that are still checked out once they are returned
+        '''
+        self._closed = True
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(engine)
+
+    def __enter__(self) -> EnginePool:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+_default_pool: Union[EnginePool, None] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> EnginePool:
+    '''
+    Returns a process-wide pool with one engine, created on first use
+    '''
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool._closed:
+            _default_pool = EnginePool()
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+def set_default_pool(pool: Union[EnginePool, None]) -> None:
+    '''
+    Replaces the pool used by BuildInsights when none is given
+    '''
+    global _default_pool
+    with _default_pool_lock:
+        _default_pool = pool
@@ -0,0 +1,239 @@
+'''
+Bulk export of corpus analyses to NDJSON or Parquet.
+
+A source (FEN/EPD lines or a PGN file, one row per ply) is analysed position by position
+and written in batches: one line per row to an NDJSON file, or one Parquet file (a single
+row group) per batch to a directory. Only one batch is held in memory, and each completed
+batch is checkpointed, so an interrupted run resumes after the last batch it finished.
+
+    python -m chessx.export games.pgn analysis.ndjson --engine stockfish
+    python -m chessx.export positions.fen analysis/ --format parquet
+'''
+from __future__ import annotations
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, TextIO, Tuple, Type, Union
+import argparse
+import glob
+import json
+import logging
+import os
+import chess
+import chess.engine
+import chess.pgn
+from chessx import metrics
+from chessx.engine import EnginePool
+from chessx.game import MainlineVisitor
+from chessx.heuristic import Heuristic, INSIGHT_HEURISTICS, PositionContext
+from chessx.records import Explanation, KIND_NAMES, render
+
+logger = logging.getLogger(__name__)
+
+# (fen, game index, ply), the last two None for positions not taken from a game
+SourcePosition = Tuple[str, Union[int, None], Union[int, None]]
+
+Row = Dict[str, Any]
+
+
+def read_fens(stream: TextIO) -> Iterator[SourcePosition]:
+    '''
+    Yields the positions of a file with one FEN or EPD per line, skipping blank lines and # comments.
+    Lines that are neither are skipped with a warning, so that a resumed export skips them too.
+    '''
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            board = chess.Board(line)
+        except ValueError:
+            try:
+                board, _ = chess.Board.from_epd(line)
+            except ValueError as e:
+                logger.warning('skipping line %d, not a FEN or EPD: %s', number, e)
+                continue
+        yield board.fen(), None, None
+
+
+def read_pgn(stream: TextIO) -> Iterator[SourcePosition]:
+    '''
+    Yields the position after every mainline ply of every game in a PGN stream
+    '''
+    game_index = 0
+    while True:
+        game = chess.pgn.read_game(stream, Visitor=MainlineVisitor)
+        if game is None:
+            break
+        board = game.headers.board()
+        for ply, move in enumerate(game.moves, start=1):
+            board.push(move)
+            yield board.fen(), game_index, ply
+        game_index += 1
+
+
+def analyse_position(fen: str, heuristics: Sequence[Type[Heuristic]] = INSIGHT_HEURISTICS,
+                     pool: Union[EnginePool, None] = None, limit: Union[chess.engine.Limit, None] = None) -> Row:
+    '''
+    Returns the engine score (None without a pool), the records of every heuristic for both
+    sides and their rendered text for one position. Raises chess.engine.EngineError if the
+    engine sent no score.
+    '''
+    ctx = PositionContext(fen)
+    score = None
+    if pool is not None:
+        with metrics.timed('engine'), pool.borrow() as engine:
+            info = engine.analyse(ctx.board, limit if limit is not None else chess.engine.Limit(time=0.1))
+        if 'score' not in info:
+            raise chess.engine.EngineError(f'engine sent no score for {fen}')
+        score = info['score'].white().score(mate_score=100000)
+    records: List[Explanation] = []
+    for heuristic in heuristics:
+        records.extend(heuristic(ctx).get_records())
+    return {
+        'fen': fen,
+        'score': score,
+        'findings': [dict(record._asdict(), heuristic=KIND_NAMES[record.kind]) for record in records],
+        'explanations': [render(record) for record in records],
+    }
+
+
+class NDJSONExporter:
+    '''
+    Appends rows to path as JSON lines. After every batch the file is flushed to disk and its
+    size and row count saved to path.checkpoint; a partly written batch is cut off on resume.
+    '''
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.checkpoint_path = f'{path}.checkpoint'
+
+    def completed_rows(self) -> int:
+        rows, offset = 0, 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            rows, offset = checkpoint['rows'], checkpoint['offset']
+        with open(self.path, 'a') as f:
+            f.truncate(offset)
+        return rows
+
+    def reset(self) -> None:
+        for path in (self.path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write_batch(self, rows: List[Row], completed_rows: int) -> None:
+        with open(self.path, 'a') as f:
+            f.writelines(json.dumps(row, separators=(',', ':')) + '\n' for row in rows)
+            f.flush()
+            os.fsync(f.fileno())
+            offset = f.tell()
+        _write_atomic(self.checkpoint_path, json.dumps({'rows': completed_rows, 'offset': offset}))
+
+
+class ParquetExporter:
+    '''
+    Writes every batch to directory as its own Parquet file, part-<first row>.parquet, holding a
+    single row group. Files are renamed into place once complete, so the directory only ever holds
+    completed batches and reads as one dataset with pyarrow.dataset or pandas. Requires pyarrow.
+    '''
+    def __init__(self, directory: str) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:  # pragma: no cover
+            raise ImportError('Parquet export requires pyarrow, install it with: pip install chessx[parquet]') from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.directory = directory
+        record = pyarrow.struct([(field, pyarrow.int32()) for field in Explanation._fields] + [('heuristic', pyarrow.string())])
+        self.schema = pyarrow.schema([
+            ('index', pyarrow.int64()),
+            ('game', pyarrow.int64()),
+            ('ply', pyarrow.int32()),
+            ('fen', pyarrow.string()),
+            ('score', pyarrow.int32()),
+            ('findings', pyarrow.list_(record)),
+            ('explanations', pyarrow.list_(pyarrow.string())),
+        ])
+        os.makedirs(directory, exist_ok=True)
+
+    def _parts(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, 'part-*.parquet')))
+
+    def completed_rows(self) -> int:
+        return sum(self.pq.read_metadata(path).num_rows for path in self._parts())
+
+    def reset(self) -> None:
+        for path in self._parts():
+            os.remove(path)
+
+    def write_batch(self, rows: List[Row], completed_rows: int) -> None:
+        path = os.path.join(self.directory, f'part-{rows[0]["index"]:012d}.parquet')
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        self.pq.write_table(table, f'{path}.tmp', row_group_size=len(rows))
+        os.replace(f'{path}.tmp', path)
+
+
+def _write_atomic(path: str, data: str) -> None:
+    with open(f'{path}.tmp', 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f'{path}.tmp', path)
+
+
+def export(source: Iterable[SourcePosition], exporter: Union[NDJSONExporter, ParquetExporter], batch_size: int = 1000,
+           resume: bool = True, heuristics: Sequence[Type[Heuristic]] = INSIGHT_HEURISTICS,
+           pool: Union[EnginePool, None] = None, limit: Union[chess.engine.Limit, None] = None) -> int:
+    '''
+    Analyses every position of source and writes the rows to exporter in batches of batch_size.
+    With resume, the positions already exported by an earlier run of the same source are skipped.
+    Returns the number of rows in the export.
+    '''
+    if batch_size < 1:
+        raise ValueError(f'batch_size must be at least 1, got {batch_size}')
+    if resume:
+        completed = exporter.completed_rows()
+    else:
+        exporter.reset()
+        completed = 0
+    positions = enumerate(source)
+    if completed:
+        # consume the source up to the resume point without analysing it
+        next(islice(positions, completed - 1, None), None)
+    while True:
+        batch = []
+        for index, (fen, game, ply) in islice(positions, batch_size):
+            row: Row = {'index': index, 'game': game, 'ply': ply}
+            row.update(analyse_position(fen, heuristics, pool, limit))
+            batch.append(row)
+        if not batch:
+            return completed
+        completed += len(batch)
+        exporter.write_batch(batch, completed)
+
+
+def main() -> None:  # pragma: no cover
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='PGN file (.pgn) or file with one FEN/EPD per line')
+    parser.add_argument('output', help='NDJSON file, or directory for --format parquet')
+    parser.add_argument('--format', choices=['ndjson', 'parquet'], default='ndjson')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--engine', help='UCI engine command for scores (default: no scores)')
+    parser.add_argument('--time', type=float, default=0.1, help='engine seconds per position')
+    parser.add_argument('--no-resume', action='store_true', help='start over instead of resuming')
+    args = parser.parse_args()
+
+    exporter = ParquetExporter(args.output) if args.format == 'parquet' else NDJSONExporter(args.output)
+    pool = EnginePool(args.engine) if args.engine else None
+    try:
+        with open(args.input) as stream:
+            source = read_pgn(stream) if args.input.endswith('.pgn') else read_fens(stream)
+            rows = export(source, exporter, args.batch_size, resume=not args.no_resume, pool=pool, limit=chess.engine.Limit(time=args.time))
+    finally:
+        if pool is not None:
+            pool.close()
+    print(f'{rows} rows in {args.output}')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
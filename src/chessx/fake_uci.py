@@ -0,0 +1,172 @@
+'''
+A minimal UCI engine for tests and load tests, so that no real Stockfish is needed.
+
+Run it as ``python -m chessx.fake_uci``. Its score is the material balance of the
+position from the side to move's point of view, and its best move is the first legal move.
+
+Options make its searches scriptable: MaxDepth sets how many iterations a search runs (one
+info line per depth and principal variation), MultiPV how many moves are reported, Delay the
+milliseconds each iteration takes, and Script a comma separated list of scores returned at
+depth 1, 2, ... instead of the material balance (the last one repeats at greater depths).
+A search stops early at the depth, nodes or movetime given to go.
+'''
+from __future__ import annotations
+import queue
+import sys
+import threading
+import time
+from typing import List, Union
+import chess
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+OPTIONS = [
+    'option name Threads type spin default 1 min 1 max 512',
+    'option name Hash type spin default 16 min 1 max 33554432',
+    'option name Delay type spin default 0 min 0 max 60000',
+    'option name MultiPV type spin default 1 min 1 max 500',
+    'option name MaxDepth type spin default 1 min 1 max 245',
+    'option name Script type string default <empty>',
+]
+
+
+def material_score(board: chess.Board) -> int:
+    '''
+    Returns material balance in centipawns from the side to move's point of view
+    '''
+    score = 0
+    for piece in board.piece_map().values():
+        value = PIECE_VALUES[piece.piece_type]
+        score += value if piece.color == board.turn else -value
+    return score
+
+
+def parse_position(args: List[str]) -> chess.Board:
+    '''
+    Parses the arguments of a UCI "position" command
+    '''
+    if args[0] == 'startpos':
+        board = chess.Board()
+        rest = args[1:]
+    else:
+        moves_at = args.index('moves') if 'moves' in args else len(args)
+        board = chess.Board(' '.join(args[1:moves_at]))
+        rest = args[moves_at:]
+    if rest and rest[0] == 'moves':
+        for uci in rest[1:]:
+            board.push_uci(uci)
+    return board
+
+
+class FakeEngine:
+    def __init__(self, out=sys.stdout) -> None:
+        self.out = out
+        self.board = chess.Board()
+        self.options = {'threads': 1, 'hash': 16, 'delay': 0, 'multipv': 1, 'maxdepth': 1}
+        self.script: List[int] = []
+        # set by the input thread as soon as a stop arrives, so that a running search can see it
+        self.stop_requested = threading.Event()
+        self.pending: Union[str, None] = None
+
+    def send(self, line: str) -> None:
+        self.out.write(line + '\n')
+        self.out.flush()
+
+    def score_at(self, depth: int) -> int:
+        if self.script:
+            return self.script[min(depth, len(self.script)) - 1]
+        return material_score(self.board)
+
+    def search(self, args: List[str]) -> None:
+        start = time.monotonic()
+        limits = {name: int(value) for name, value in zip(args, args[1:]) if name in ('depth', 'nodes', 'movetime')}
+        moves = list(self.board.legal_moves)
+        if not moves:
+            if self.options['delay']:
+                time.sleep(self.options['delay'] / 1000)
+            score = 'mate 0' if self.board.is_check() else 'cp 0'
+            self.send(f'info depth 0 score {score}')
+            self.pending = 'bestmove (none)'
+        else:
+            nodes = 0
+            for depth in range(1, min(self.options['maxdepth'], limits.get('depth', self.options['maxdepth'])) + 1):
+                if self.options['delay']:
+                    time.sleep(self.options['delay'] / 1000)
+                nodes += depth*len(moves)
+                score = self.score_at(depth)
+                # alternatives are reported 10 centipawns apart
+                for multipv, move in enumerate(moves[:self.options['multipv']], start=1):
+                    self.send(f'info depth {depth} seldepth {depth} multipv {multipv} nodes {nodes} '
+                              f'score cp {score - 10*(multipv-1)} pv {move.uci()}')
+                if nodes >= limits.get('nodes', nodes+1) or (time.monotonic()-start)*1000 >= limits.get('movetime', float('inf')):
+                    break
+                if self.stop_requested.is_set():
+                    break
+            self.pending = f'bestmove {moves[0].uci()}'
+        if 'infinite' not in args:
+            self.stop()
+
+    def stop(self) -> None:
+        if self.pending is not None:
+            self.send(self.pending)
+            self.pending = None
+
+    def handle(self, line: str) -> bool:
+        '''
+        Handles one line of input, returns False once the engine should exit
+        '''
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send('id name chessx-fake-uci')
+            self.send('id author chessx')
+            for option in OPTIONS:
+                self.send(option)
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            value_at = args.index('value') if 'value' in args else len(args)
+            name = ' '.join(args[1:value_at]).lower()
+            value = ' '.join(args[value_at + 1:])
+            if name == 'script':
+                self.script = [int(score) for score in value.split(',') if score.strip()]
+            elif name in self.options:
+                self.options[name] = int(value)
+        elif command == 'ucinewgame':
+            self.board = chess.Board()
+        elif command == 'position':
+            self.board = parse_position(args)
+        elif command == 'go':
+            self.search(args)
+        elif command == 'stop':
+            self.stop_requested.clear()
+            self.stop()
+        elif command == 'quit':
+            return False
+        return True
+
+
+def read_input(engine: FakeEngine, lines: queue.Queue[Union[str, None]]) -> None:
+    for line in sys.stdin:
+        if line.strip() == 'stop':
+            engine.stop_requested.set()
+        lines.put(line.strip())
+    lines.put(None)
+
+
+def main() -> None:
+    engine = FakeEngine()
+    # input is read on a thread of its own, so a stop can interrupt a search between iterations
+    lines: queue.Queue[Union[str, None]] = queue.Queue()
+    threading.Thread(target=read_input, args=(engine, lines), daemon=True).start()
+    while True:
+        line = lines.get()
+        if line is None or not engine.handle(line):
+            break
+
+
+if __name__ == '__main__':
+    main()
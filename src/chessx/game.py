@@ -0,0 +1,131 @@
+from __future__ import annotations
+from typing import Iterator, List, Sequence, TextIO, Type, Union
+import chess
+import chess.pgn
+from chessx.heuristic import Heuristic, IncrementalPinnedPieces, IncrementalPSQT, IncrementalTrappedPieces, PositionContext
+
+DEFAULT_HEURISTICS: Sequence[Type[Heuristic]] = (IncrementalPSQT, IncrementalPinnedPieces, IncrementalTrappedPieces)
+
+
+class PlyExplanations:
+    '''
+    Explanations for the position reached after one ply of a game
+    '''
+    def __init__(self, game_index: int, headers: chess.pgn.Headers, ply: int, move: Union[chess.Move, None], san: str,
+                 explanations: List[str]) -> None:
+        self.game_index = game_index
+        self.headers = headers
+        self.ply = ply
+        self.move = move
+        self.san = san
+        self.explanations = explanations
+
+    def __str__(self):
+        return (f'game: {self.game_index}, ply: {self.ply}, move: {self.san}, explanations: {len(self.explanations)}')
+
+
+class PlyDiff:
+    '''
+    Explanations that appeared (new) or no longer hold (resolved) after one ply of a game,
+    compared with the position before it
+    '''
+    def __init__(self, game_index: int, headers: chess.pgn.Headers, ply: int, move: chess.Move, san: str,
+                 new: List[str], resolved: List[str]) -> None:
+        self.game_index = game_index
+        self.headers = headers
+        self.ply = ply
+        self.move = move
+        self.san = san
+        self.new = new
+        self.resolved = resolved
+
+    def __str__(self):
+        return (f'game: {self.game_index}, ply: {self.ply}, move: {self.san}, new: {len(self.new)}, resolved: {len(self.resolved)}')
+
+
+class MainlineVisitor(chess.pgn.BaseVisitor["MainlineVisitor"]):
+    '''
+    PGN visitor that keeps only the headers and mainline moves of a game, skipping
+    variations and comments instead of building a full game tree
+    '''
+    def begin_game(self) -> None:
+        self.headers = chess.pgn.Headers()
+        self.moves: List[chess.Move] = []
+        self.errors: List[Exception] = []
+
+    def visit_header(self, tagname: str, tagvalue: str) -> None:
+        self.headers[tagname] = tagvalue
+
+    def begin_variation(self) -> chess.pgn.SkipType:
+        return chess.pgn.SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move) -> None:
+        if not self.errors:
+            self.moves.append(move)
+
+    def handle_error(self, error: Exception) -> None:
+        # keep the moves up to the first illegal or unparsable one
+        self.errors.append(error)
+
+    def result(self) -> MainlineVisitor:
+        return self
+
+
+def explain_game(pgn_stream: TextIO, ex_color: Union[bool, None] = None,
+                 heuristics: Sequence[Type[Heuristic]] = DEFAULT_HEURISTICS) -> Iterator[PlyExplanations]:
+    '''
+    Streams explanations for every ply of every game in a PGN stream.
+    Games are read one at a time, so memory does not grow with the size of the file,
+    and each game is walked by pushing moves onto a single board shared by all heuristics.
+    Incremental heuristics are built once per game and updated move by move, the others once per ply.
+    '''
+    return _walk_games(pgn_stream, ex_color, heuristics, with_start=False)
+
+
+def diff_game(pgn_stream: TextIO, ex_color: Union[bool, None] = None,
+              heuristics: Sequence[Type[Heuristic]] = DEFAULT_HEURISTICS) -> Iterator[PlyDiff]:
+    '''
+    Streams, for every ply of every game in a PGN stream, only the explanations that the ply
+    added or resolved; the first ply of a game is compared with its starting position.
+    With the default (incremental) heuristics a ply recomputes only the findings the move could affect.
+    '''
+    previous: List[str] = []
+    for ply in _walk_games(pgn_stream, ex_color, heuristics, with_start=True):
+        if ply.move is not None:
+            current = set(ply.explanations)
+            before = set(previous)
+            yield PlyDiff(ply.game_index, ply.headers, ply.ply, ply.move, ply.san,
+                          [ex for ex in ply.explanations if ex not in before], [ex for ex in previous if ex not in current])
+        previous = ply.explanations
+
+
+def _walk_games(pgn_stream: TextIO, ex_color: Union[bool, None], heuristics: Sequence[Type[Heuristic]],
+                with_start: bool) -> Iterator[PlyExplanations]:
+    '''
+    Yields the explanations after every ply, preceded for every game by those of its
+    starting position (ply 0, move None) if with_start
+    '''
+    game_index = 0
+    while True:
+        game = chess.pgn.read_game(pgn_stream, Visitor=MainlineVisitor)
+        if game is None:
+            break
+        ctx = PositionContext.from_board(game.headers.board())
+        instances: List[Union[Heuristic, None]] = [heuristic(ctx) if heuristic.incremental else None for heuristic in heuristics]
+        if with_start:
+            yield PlyExplanations(game_index, game.headers, 0, None, '', _explain(ctx, heuristics, instances, ex_color))
+        for ply, move in enumerate(game.moves, start=1):
+            san = ctx.board.san(move)
+            ctx.push(move)
+            yield PlyExplanations(game_index, game.headers, ply, move, san, _explain(ctx, heuristics, instances, ex_color))
+        game_index += 1
+
+
+def _explain(ctx: PositionContext, heuristics: Sequence[Type[Heuristic]], instances: List[Union[Heuristic, None]],
+             ex_color: Union[bool, None]) -> List[str]:
+    explanations = []
+    for heuristic, instance in zip(heuristics, instances):
+        if instance is None:
+            instance = heuristic(ctx)
+        explanations.extend(instance.get_explanations(ex_color=ex_color))
+    return explanations
@@ -1,56 +1,336 @@
 from __future__ import annotations
 from collections import defaultdict
-from typing import Dict, List, Union
+from typing import Callable, Dict, List, Sequence, Tuple, Type, TYPE_CHECKING, Union
 from abc import ABC, abstractmethod
+import functools
 import chess
 import chess.engine
+import chess.polyglot
+from chessx import metrics
+from chessx.analysis import AnalysisPolicy, AnalysisReport
+from chessx.cache import ExplanationCache
+from chessx.engine import EnginePool, get_default_pool
+from chessx.records import Explanation, KIND_MOBILITY, KIND_PESTO, KIND_PIN, KIND_PSQT, KIND_TRAPPED, render_all
+
+if TYPE_CHECKING:
+    from chessx.index import ExplanationIndex, IndexEntry
+
+
+class MoveObserver:
+    '''
+    Interface for state that PositionContext keeps up to date as moves are pushed and popped
+    '''
+    def before_push(self, board: chess.Board, move: chess.Move) -> None:
+        pass
+
+    def after_push(self, board: chess.Board, move: chess.Move) -> None:
+        pass
+
+    def before_pop(self, board: chess.Board) -> None:
+        pass
+
+    def after_pop(self, board: chess.Board, move: chess.Move) -> None:
+        pass
+
+
+def changed_squares(board: chess.Board, move: chess.Move) -> List[int]:
+    '''
+    Returns the squares whose contents change when move is played on board,
+    including the captured pawn of an en passant and the rook of a castling move
+    '''
+    squares = [move.from_square, move.to_square]
+    if board.is_en_passant(move):
+        squares.append(chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square)))
+    elif board.is_castling(move):
+        # covers standard and Chess960 rook placements alike
+        rank = chess.square_rank(move.from_square)
+        squares = [chess.square(file, rank) for file in range(8)]
+    return squares
+
+
+class PositionContext:
+    '''
+    Parses a position once and caches everything the heuristics derive from it:
+    the board, piece locations, attack sets and the Zobrist key
+    '''
+
+    @metrics.instrumented('parse')
+    def __init__(self, fen: str) -> None:
+        metrics.count('boards_built')
+        self.board = chess.Board(fen)
+        self.observers: List[MoveObserver] = []
+        self._invalidate()
+        self._fen = fen
+
+    @classmethod
+    def from_board(cls, board: chess.Board) -> PositionContext:
+        '''
+        Wraps an existing board without copying or re-parsing it
+        '''
+        ctx = cls.__new__(cls)
+        ctx.board = board
+        ctx.observers = []
+        ctx._invalidate()
+        return ctx
+
+    @classmethod
+    def of(cls, position: Union[str, PositionContext]) -> PositionContext:
+        '''
+        Returns position unchanged if it already is a context, else parses it as a FEN
+        '''
+        if isinstance(position, PositionContext):
+            return position
+        return cls(position)
+
+    @property
+    def fen(self) -> str:
+        if self._fen is None:
+            self._fen = self.board.fen()
+        return self._fen
+
+    @property
+    def piece_loc_map(self) -> Dict[str, List[int]]:
+        '''
+        piece_symbols mapped to the squares they occupy, in ascending square order
+        '''
+        if self._piece_loc_map is None:
+            piece_loc_map: Dict[str, List[int]] = defaultdict(list)
+            for sq, piece in sorted(self.board.piece_map().items()):
+                piece_loc_map[piece.symbol()].append(sq)
+            self._piece_loc_map = piece_loc_map
+        return self._piece_loc_map
+
+    @property
+    def zobrist_key(self) -> int:
+        if self._zobrist_key is None:
+            self._zobrist_key = chess.polyglot.zobrist_hash(self.board)
+        return self._zobrist_key
+
+    def push(self, move: chess.Move) -> None:
+        '''
+        Plays move on the board and drops everything cached for the previous position.
+        Observers are notified before and after the move is made.
+        '''
+        for observer in self.observers:
+            observer.before_push(self.board, move)
+        self.board.push(move)
+        self._invalidate()
+        for observer in self.observers:
+            observer.after_push(self.board, move)
+
+    def pop(self) -> chess.Move:
+        '''
+        Takes back the last move and drops everything cached for the previous position.
+        Observers are notified before and after the move is taken back.
+        '''
+        for observer in self.observers:
+            observer.before_pop(self.board)
+        move = self.board.pop()
+        self._invalidate()
+        for observer in self.observers:
+            observer.after_pop(self.board, move)
+        return move
+
+    def _invalidate(self) -> None:
+        self._fen: Union[str, None] = None
+        self._piece_loc_map: Union[Dict[str, List[int]], None] = None
+        self._attackers: Dict[Tuple[bool, int], chess.SquareSet] = {}
+        self._zobrist_key: Union[int, None] = None
+        self._see: Dict[Tuple[int, bool, int, int], int] = {}
+        self._attack_maps: Dict[bool, Tuple[List[int], List[int]]] = {}
+
+    def attack_map(self, color: bool) -> Tuple[List[int], List[int]]:
+        '''
+        Returns two 64-entry lists: how many pieces of color attack each square and the
+        value of the least valuable of them (0 if none). Built once per position.
+        '''
+        maps = self._attack_maps.get(color)
+        if maps is None:
+            board = self.board
+            counts = [0]*64
+            least_values = [0]*64
+            # most valuable pieces first, so cheaper attackers overwrite them
+            for piece_type in reversed(chess.PIECE_TYPES):
+                value = PIECE_VALUES[piece_type]
+                for sq in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                    for target in chess.scan_forward(board.attacks_mask(sq)):
+                        counts[target] += 1
+                        least_values[target] = value
+            maps = self._attack_maps[color] = (counts, least_values)
+        return maps
+
+    def see(self, square: int, side: bool, value: int, from_sq: Union[int, None] = None) -> int:
+        '''
+        Memoised static_exchange_eval for side's piece worth value on square, after
+        moving there from from_sq (if given)
+        '''
+        # the moving piece leaves from_sq, which uncovers sliders only if from_sq lies on a line through
+        # square; otherwise (knight moves) the result is the same for every piece of that value
+        # moving to square, so it is shared between them. Without from_sq nothing is vacated (-2).
+        if from_sq is None:
+            key = (square, side, value, -2)
+        else:
+            key = (square, side, value, from_sq if chess.BB_RAYS[from_sq][square] else -1)
+        score = self._see.get(key)
+        if score is None:
+            metrics.count('see_calls')
+            vacated = chess.BB_EMPTY if from_sq is None else chess.BB_SQUARES[from_sq]
+            score = self._see[key] = static_exchange_eval(self.board, square, side, value, vacated)
+        return score
+
+    def attackers(self, color: bool, sq: int) -> chess.SquareSet:
+        '''
+        Cached equivalent of board.attackers(color, sq)
+        '''
+        attackers = self._attackers.get((color, sq))
+        if attackers is None:
+            attackers = self._attackers[(color, sq)] = self.board.attackers(color, sq)
+        return attackers
+
+
+def _cached_explanations(name: str, get_explanations: Callable[..., List[str]]) -> Callable[..., List[str]]:
+    '''
+    Wraps a heuristic's get_explanations so that it consults the heuristic's cache first
+    '''
+    @functools.wraps(get_explanations)
+    def wrapper(self: Heuristic, ex_color=None) -> List[str]:
+        cache = self.cache
+        if cache is None:
+            return get_explanations(self, ex_color)
+        key = ('explanations', self.ctx.zobrist_key, name, self.version, ex_color)
+        explanations = cache.get(key)
+        if explanations is None:
+            explanations = get_explanations(self, ex_color)
+            cache.put(key, explanations)
+        return list(explanations)
+    return wrapper
 
 
 class Heuristic(ABC):
+    # incremental heuristics are built once per game and follow the moves pushed on their context
+    incremental = False
+    # part of the cache key, bump it whenever a heuristic's explanations change
+    version = 1
+    # explanations are looked up in and stored to this cache, if set (per instance or for all heuristics)
+    cache: Union[ExplanationCache, None] = None
+    ctx: PositionContext
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # both are reported to the active metrics sink, if any, as e.g. 'PSQT.__init__'
+        if '__init__' in cls.__dict__:
+            cls.__init__ = metrics.instrumented(f'{cls.__name__}.__init__')(cls.__dict__['__init__'])  # type: ignore
+        if 'get_explanations' in cls.__dict__:
+            get_explanations = _cached_explanations(cls.__name__, cls.__dict__['get_explanations'])
+            cls.get_explanations = metrics.instrumented(f'{cls.__name__}.get_explanations')(get_explanations)  # type: ignore
+        if 'get_records' in cls.__dict__:
+            cls.get_records = metrics.instrumented(f'{cls.__name__}.get_records')(cls.__dict__['get_records'])  # type: ignore
+
     @abstractmethod
-    def get_explanations(self) -> List[str]:
+    def get_explanations(self, ex_color=None) -> List[str]:
         pass
 
+    @abstractmethod
+    def get_records(self, ex_color=None) -> List[Explanation]:
+        '''
+        Returns the findings behind get_explanations as structured records, see chessx.records
+        '''
+
+
+def score_advantage(score: int) -> Union[bool, None]:
+    '''
+    Returns the side BuildInsights explains the position for: None if the score (centipawns
+    from White's point of view) is level, else True for White or False for Black
+    '''
+    if abs(score) < 60:
+        return None
+    return score > 0
+
 
 class BuildInsights:
     '''
     Use engine evaluation to generate insights
     '''
-    def __init__(self, fen: str) -> None:
-        self.fen = fen
-        self.stockfish = chess.engine.SimpleEngine.popen_uci(r"/opt/homebrew/Cellar/stockfish/14.1/bin/stockfish")
-        self.info = self.stockfish.analyse(chess.Board(self.fen), chess.engine.Limit(time=0.1))
-        self.eval = self.info['score'].white().score(mate_score=100000)
-        self.stockfish.quit()
+    def __init__(self, fen: Union[str, PositionContext], pool: Union[EnginePool, None] = None,
+                 limit: Union[chess.engine.Limit, None] = None, cache: Union[ExplanationCache, None] = None,
+                 score: Union[int, None] = None, policy: Union[AnalysisPolicy, None] = None,
+                 index: Union[ExplanationIndex, None] = None) -> None:
+        '''
+        Analyses the position with an engine borrowed from pool (default: a shared one-engine pool).
+        If cache is given, the engine score and the explanations are looked up there first.
+        A score (centipawns from White's point of view) computed elsewhere, e.g. by an async engine,
+        skips the engine altogether. info is None whenever no engine was asked.
+        With a policy, the analysis follows its latency budget instead of limit and its report
+        (depth, budget used, multi-PV lines) is kept in report.
+        Positions found in a precomputed index (see chessx.index) take their score and findings
+        from it, whatever the limit or policy.
+        '''
+        self.ctx = PositionContext.of(fen)
+        self.fen = self.ctx.fen
+        self.pool = pool
+        self.limit = limit if limit is not None else chess.engine.Limit(time=0.1)
+        self.policy = policy
+        self.cache = cache
+        self.info: Union[chess.engine.InfoDict, None] = None
+        self.report: Union[AnalysisReport, None] = None
+        self.entry: Union[IndexEntry, None] = index.lookup(self.ctx.zobrist_key) if index is not None else None
+        cached_eval = score
+        if cached_eval is None and self.entry is not None:
+            cached_eval = self.entry.score
+        if cached_eval is None and cache is not None:
+            cache_key = ('eval', self.ctx.zobrist_key, repr(self.policy or self.limit))
+            cached_eval = cache.get(cache_key)
+        if cached_eval is None:
+            with metrics.timed('engine'), (self.pool or get_default_pool()).borrow() as engine:
+                if self.policy is None:
+                    self.info = engine.analyse(self.ctx.board, self.limit)
+                else:
+                    self.report = self.policy.analyse(engine, self.ctx.board)
+                    self.info = self.report.lines[0]
+            if 'score' not in self.info:
+                raise chess.engine.EngineError(f'engine sent no score for {self.fen}')
+            self.eval: int = self.info['score'].white().score(mate_score=100000)
+            if cache is not None:
+                cache.put(cache_key, self.eval)
+        else:
+            self.eval = cached_eval
         self.advantage: Union[bool, None] = None
 
     def __get_all_explanations(self) -> List[str]:
+        if self.entry is not None and self.entry.score == self.eval:
+            # the index holds the findings for the side its own score favours
+            return render_all(self.entry.records)
         exp_list = []
-        psqt = PSQT(self.fen)
-        pin = PinnedPieces(self.fen)
-        tp = TrappedPieces(self.fen)
-        for ex in psqt.get_explanations(ex_color=self.advantage):
-            exp_list.append(ex)
-        for ex in pin.get_explanations(ex_color=self.advantage):
-            exp_list.append(ex)
-        for ex in tp.get_explanations(ex_color=self.advantage):
-            exp_list.append(ex)
+        for heuristic in INSIGHT_HEURISTICS:
+            instance = heuristic(self.ctx)
+            if self.cache is not None:
+                instance.cache = self.cache
+            exp_list.extend(instance.get_explanations(ex_color=self.advantage))
         return exp_list
 
+    def get_alternatives(self) -> List[str]:
+        '''
+        Returns the best move and the alternatives found by a multi-PV policy with their scores,
+        nothing if the engine ran without a policy or was not asked
+        '''
+        if self.report is None:
+            return []
+        alternatives = []
+        for i, (move, score) in enumerate(self.report.alternatives()):
+            label = 'Best move' if i == 0 else 'Alternative'
+            alternatives.append(f'{label}: {self.ctx.board.san(move)} ({score/100:+.2f})')
+        return alternatives
+
+    @metrics.instrumented('BuildInsights.get_insights')
     def get_insights(self) -> List[str]:
         '''
         Returns explanations tailored according to stockfish's evaluation
         '''
         exp_list = []
-        if abs(self.eval) < 60:
-            self.advantage = None
+        self.advantage = score_advantage(self.eval)
+        if self.advantage is None:
             exp_list.append('Position is equal')
         else:
-            if self.eval > 0:
-                self.advantage = True
-            else:
-                self.advantage = False
-
             color = 'White' if self.advantage else 'Black'
             if abs(self.eval) < 125:
                 exp_list.append(f'{color} is slightly better because:')
@@ -63,7 +343,36 @@ class BuildInsights:
         return exp_list
 
 
+def _build_beyond_masks() -> List[List[int]]:
+    '''
+    BB_BEYOND[a][b] holds the squares on the ray from a through b that lie beyond b,
+    or 0 if a and b do not share a rank, file or diagonal
+    '''
+    beyond = [[chess.BB_EMPTY]*64 for _ in range(64)]
+    for a in chess.SQUARES:
+        for b in chess.SQUARES:
+            line = chess.BB_RAYS[a][b]
+            if a == b or not line:
+                continue
+            # square indices grow monotonically along a line
+            side = chess.BB_ALL ^ ((2 << b)-1) if b > a else (1 << b)-1
+            beyond[a][b] = line & side
+    return beyond
+
+
+BB_BEYOND = _build_beyond_masks()
+
+# BB_LEAPS[sq]: every square from which a knight, king or pawn of either colour attacks sq
+BB_LEAPS = [chess.BB_SQUARES[sq] | chess.BB_KNIGHT_ATTACKS[sq] | chess.BB_KING_ATTACKS[sq] |
+            chess.BB_PAWN_ATTACKS[chess.WHITE][sq] | chess.BB_PAWN_ATTACKS[chess.BLACK][sq] for sq in chess.SQUARES]
+
+# piece values used for pins and exchanges, indexed by chess.PieceType
+PIECE_VALUES = [0, 1, 3, 3, 5, 9, 200]
+
+
 class PinnedPieceType:
+    __slots__ = ('piece_sq', 'pinned_to_sq', 'pinned_by_sq')
+
     def __init__(self, piece_sq: int, pinned_to_sq: int, pinned_by_sq: int) -> None:
         self.piece_sq = piece_sq
         self.pinned_to_sq = pinned_to_sq
@@ -73,111 +382,243 @@ class PinnedPieceType:
         return (f'piece_sq: {self.piece_sq}, pinned_to_sq: {self.pinned_to_sq}, pinned_by_sq: {self.pinned_by_sq}')
 
 
-class PinnedPieces:
+class PinnedPieces(Heuristic):
     '''
     a pin is a chess tactic in which a defending piece cannot move without exposing a more
     valuable defending piece on its other side to capture by the attacking piece
     '''
 
-    def __init__(self, fen: str) -> None:
-        self.fen = fen
-        self.board = chess.Board(self.fen)
+    def __init__(self, fen: Union[str, PositionContext]) -> None:
+        self.ctx = PositionContext.of(fen)
+        self.fen = self.ctx.fen
+        self.board = self.ctx.board
         self.piece_name = {'p': 'Pawn', 'n': 'Knight', 'b': 'Bishop', 'r': 'Rook', 'q': 'Queen', 'k': 'King'}
         self.piece_val_map = {
             'p': 1, 'n': 3, 'b': 3, 'r': 5, 'q': 9, 'k': 200
         }
-        self.pinned_pieces = self.get_pinned_pieces()
+        # pins are searched lazily, per colour of the pinned pieces
+        self._pinned: Dict[bool, List[PinnedPieceType]] = {}
+
+    @property
+    def pinned_pieces(self) -> List[PinnedPieceType]:
+        return self.get_pinned_pieces()
+
+    def get_pinned_pieces(self, color: Union[bool, None] = None) -> List[PinnedPieceType]:
+        '''
+        Returns all pieces (other than queens and kings) of color, or of both colours if None,
+        attacked by a bishop, rook or queen that shield a more valuable piece of their own colour
+        on the same ray. Each colour is searched once, on first request.
+        '''
+        if color is None:
+            pinned_pieces = self.get_pinned_pieces(chess.WHITE) + self.get_pinned_pieces(chess.BLACK)
+            pinned_pieces.sort(key=lambda piece: (piece.piece_sq, piece.pinned_by_sq))
+            return pinned_pieces
+        if color not in self._pinned:
+            self._pinned[color] = self._find_pins(color)
+        return list(self._pinned[color])
+
+    def _find_pins(self, color: bool) -> List[PinnedPieceType]:
+        board = self.board
+        pinned_pieces = []
+        sliders = board.occupied_co[not color] & (board.bishops | board.rooks | board.queens)
+        for key in chess.scan_forward(sliders):
+            pinned_pieces.extend(self._slider_pins(key))
+        pinned_pieces.sort(key=lambda piece: (piece.piece_sq, piece.pinned_by_sq))
+        return pinned_pieces
 
-    def get_pinned_pieces(self) -> List[PinnedPieceType]:
-        # Find all pieces that are being attacked by a rook or a bishop
-        # For each of these pieces - find all the pieces (of greater value than the curr piece) attacked by their attackers (rook/bishop)
-        # now remove the piece from the board and check if the number of attacked pieces increase
-        # if they increase -> then the piece was pinned, if not, the piece wasn't pinned
+    def _slider_pins(self, key: int) -> List[PinnedPieceType]:
+        # Look at the pieces the slider on key attacks and x-ray through each of them along the
+        # precomputed ray beyond it: the first piece found there is what the attacked piece shields
+        board = self.board
+        occupied = board.occupied
         pinned_pieces = []
-        for sq in range(64):
-            if self.board.piece_at(sq) is not None and self.board.piece_at(sq).symbol().lower() not in ['q', 'k']:
-                piece_val = self.piece_val_map[self.board.piece_at(sq).symbol().lower()]
-                piece_color = self.board.color_at(sq)
-                can_be_pinned = False
-                # initialize defaultdict
-                can_be_pinned_by = defaultdict(list)
-                for sq2 in self.board.attackers(not piece_color, sq):
-                    if self.board.piece_at(sq2).symbol().lower() in ['b', 'r', 'q']:
-                        can_be_pinned = True
-                        can_be_pinned_by[sq2]
-                if can_be_pinned:
-                    for key in can_be_pinned_by.keys():
-                        for sq2 in self.board.attacks(key):
-                            if self.board.piece_at(sq2) and self.board.color_at(sq2) is piece_color and\
-                                    self.piece_val_map[self.board.piece_at(sq2).symbol().lower()] > piece_val:
-                                can_be_pinned_by[key].append(sq2)
-                    temp = self.board.copy()
-                    temp.remove_piece_at(sq)
-                    for key in can_be_pinned_by.keys():
-                        for sq2 in temp.attacks(key):
-                            if temp.piece_at(sq2) and temp.color_at(sq2) is piece_color and\
-                                    self.piece_val_map[temp.piece_at(sq2).symbol().lower()] > piece_val and \
-                                    sq2 not in can_be_pinned_by[key]:
-                                pinned_piece = PinnedPieceType(piece_sq=sq, pinned_to_sq=sq2, pinned_by_sq=key)
-                                pinned_pieces.append(pinned_piece)
+        pinned_co = board.occupied_co[not board.color_at(key)]
+        candidates = pinned_co & ~(board.queens | board.kings)
+        for sq in chess.scan_forward(board.attacks_mask(key) & candidates):
+            behind = BB_BEYOND[key][sq] & occupied
+            if not behind:
+                continue
+            sq2 = chess.lsb(behind) if sq > key else chess.msb(behind)
+            if pinned_co & chess.BB_SQUARES[sq2] and \
+                    PIECE_VALUES[board.piece_type_at(sq2)] > PIECE_VALUES[board.piece_type_at(sq)]:
+                pinned_pieces.append(PinnedPieceType(piece_sq=sq, pinned_to_sq=sq2, pinned_by_sq=key))
         return pinned_pieces
 
     def get_absolute_pins(self) -> List[PinnedPieceType]:
         '''
         An absolute pin is one where the piece shielded by the pinned piece is the king.
+        Like board.is_pinned, any square that is the only non-empty square between a king
+        and an enemy slider on the same line counts as pinned (or every square if none is occupied).
         '''
+        board = self.board
+        occupied = board.occupied
         pinned_pieces = []
-        colors = [chess.BLACK, chess.WHITE]
-        for color in colors:
-            for sq in range(64):
-                if self.board.is_pinned(color, sq):
-                    pinned_piece = PinnedPieceType(piece_sq=sq, pinned_to_sq=self.board.king(color), pinned_by_sq=-1)
-                    potential_pinned_by_sqs = []
-                    for sq2 in self.board.pin(color, sq):
-                        if self.board.color_at(sq2) is not None and self.board.color_at(sq2) is not color and self.board.piece_at(sq2).symbol().lower() != 'p':
-                            potential_pinned_by_sqs.append(sq2)
-                    if len(potential_pinned_by_sqs) == 1:
-                        pinned_piece.pinned_by_sq = potential_pinned_by_sqs[0]
-                    else:
-                        base_dist = self.board.king(color)-sq
-                        min_dist = 64
-                        for i in range(len(potential_pinned_by_sqs)):
-                            if base_dist > 0:
-                                if sq-potential_pinned_by_sqs[i] > 0 and sq-potential_pinned_by_sqs[i] < min_dist:
-                                    pinned_piece.pinned_by_sq = potential_pinned_by_sqs[i]
-                                    min_dist = sq-potential_pinned_by_sqs[i]
-                            else:
-                                if sq-potential_pinned_by_sqs[i] < 0 and potential_pinned_by_sqs[i]-sq < min_dist:
-                                    pinned_piece.pinned_by_sq = potential_pinned_by_sqs[i]
-                                    min_dist = potential_pinned_by_sqs[i]-sq
-                    pinned_pieces.append(pinned_piece)
+        for color in [chess.BLACK, chess.WHITE]:
+            king = board.king(color)
+            if king is None:
+                continue
+            enemy = board.occupied_co[not color]
+            snipers = (chess.BB_RANK_ATTACKS[king][0] | chess.BB_FILE_ATTACKS[king][0]) & (board.rooks | board.queens) & enemy
+            snipers |= chess.BB_DIAG_ATTACKS[king][0] & (board.bishops | board.queens) & enemy
+            color_pins = []
+            for sniper in chess.scan_forward(snipers):
+                between = chess.between(king, sniper)
+                blockers = between & occupied
+                if blockers & (blockers-1):
+                    continue
+                for sq in chess.scan_forward(blockers or between):
+                    color_pins.append(PinnedPieceType(piece_sq=sq, pinned_to_sq=king, pinned_by_sq=sniper))
+            color_pins.sort(key=lambda piece: piece.piece_sq)
+            pinned_pieces.extend(color_pins)
         return pinned_pieces
 
     def get_explanations(self, ex_color=None) -> List[str]:
         '''
         Returns list of explanations corresponding to each pinned piece
         '''
-        # pinned_pieces = self.get_absolute_pins()
         # White Rook at f1 is pinned to its King at g1 by the opponent's Rook at a1
-        explanation_list = []
-        for piece in self.pinned_pieces:
-            if ex_color is False:
-                color = 'White' if self.board.color_at(piece.piece_sq) is True else None
-            elif ex_color is True:
-                color = 'Black' if self.board.color_at(piece.piece_sq) is False else None
-            else:
-                color = 'White' if self.board.color_at(piece.piece_sq) is True else 'Black'
-            if color is not None:
-                explanation_list.append(f'{color} {self.piece_name[self.board.piece_at(piece.piece_sq).symbol().lower()]} '
-                                        f'at {chess.square_name(piece.piece_sq)} is pinned to its '
-                                        f'{self.piece_name[self.board.piece_at(piece.pinned_to_sq).symbol().lower()]} '
-                                        f'at {chess.square_name(piece.pinned_to_sq)} by the opponent\'s '
-                                        f'{self.piece_name[self.board.piece_at(piece.pinned_by_sq).symbol().lower()]} '
-                                        f'at {chess.square_name(piece.pinned_by_sq)}')
-        return explanation_list
+        return render_all(self.get_records(ex_color))
+
+    def get_records(self, ex_color=None) -> List[Explanation]:
+        '''
+        Returns one KIND_PIN record per pinned piece, of both colours if ex_color is None,
+        else of the side without the advantage
+        '''
+        # ex_color is the side with the advantage: only the other side's pins are reported
+        piece_type_at = self.board.piece_type_at
+        return [Explanation(KIND_PIN, int(self.board.color_at(piece.piece_sq)), piece_type_at(piece.piece_sq), piece.piece_sq,
+                            piece_type_at(piece.pinned_to_sq), piece.pinned_to_sq, piece_type_at(piece.pinned_by_sq), piece.pinned_by_sq)
+                for piece in self.get_pinned_pieces(None if ex_color is None else not ex_color)]
+
+
+class IncrementalFindings(MoveObserver, ABC):
+    '''
+    Keeps per-piece findings between the moves pushed on and popped off a PositionContext:
+    after every move, subclasses drop (in _forget) only the findings that depend on one of
+    the squares the move changed. They call _track() once set up.
+    '''
+    ctx: PositionContext
+
+    @abstractmethod
+    def _forget(self, changed: int) -> None:
+        pass
+
+    def _track(self) -> None:
+        self.ctx.observers.append(self)
+
+    def before_push(self, board: chess.Board, move: chess.Move) -> None:
+        self._forget(chess.SquareSet(changed_squares(board, move)).mask)
+
+    def after_pop(self, board: chess.Board, move: chess.Move) -> None:
+        self._forget(chess.SquareSet(changed_squares(board, move)).mask)
+
+    def push(self, move: chess.Move) -> None:
+        self.ctx.push(move)
+
+    def pop(self) -> chess.Move:
+        return self.ctx.pop()
+
+
+class IncrementalPinnedPieces(PinnedPieces, IncrementalFindings):
+    '''
+    PinnedPieces that follows the moves on its PositionContext. The pins of every slider are kept
+    and searched again only after a move that changes a square on one of the slider's lines.
+    '''
+    incremental = True
+
+    def __init__(self, fen: Union[str, PositionContext]) -> None:
+        super().__init__(fen)
+        # slider square -> (pins, squares they depend on)
+        self._slider_cache: Dict[int, Tuple[List[PinnedPieceType], int]] = {}
+        self._track()
+
+    def _slider_pins(self, key: int) -> List[PinnedPieceType]:
+        entry = self._slider_cache.get(key)
+        if entry is None:
+            entry = self._slider_cache[key] = (super()._slider_pins(key), self._dependencies(key))
+        return entry[0]
+
+    def _dependencies(self, key: int) -> int:
+        '''
+        Returns the squares whose contents decide the pins of the slider on key: its own square,
+        the squares it attacks and, behind every piece it attacks, the ray up to the next piece
+        '''
+        board = self.board
+        occupied = board.occupied
+        attacks = board.attacks_mask(key)
+        dependencies = chess.BB_SQUARES[key] | attacks
+        for sq in chess.scan_forward(attacks & occupied):
+            beyond = BB_BEYOND[key][sq]
+            behind = beyond & occupied
+            if behind:
+                sq2 = chess.lsb(behind) if sq > key else chess.msb(behind)
+                beyond &= chess.between(sq, sq2) | chess.BB_SQUARES[sq2]
+            dependencies |= beyond
+        return dependencies
+
+    def _forget(self, changed: int) -> None:
+        self._pinned.clear()
+        self._slider_cache = {key: entry for key, entry in self._slider_cache.items() if not entry[1] & changed}
+
+
+def attackers_to(board: chess.Board, square: int, occupied: int) -> int:
+    '''
+    Returns the pieces of both colours in occupied that attack square, with sliders
+    seeing through every square missing from occupied
+    '''
+    queens_and_rooks = board.queens | board.rooks
+    queens_and_bishops = board.queens | board.bishops
+    attackers = (
+        (chess.BB_KING_ATTACKS[square] & board.kings) |
+        (chess.BB_KNIGHT_ATTACKS[square] & board.knights) |
+        (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] & queens_and_rooks) |
+        (chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied] & queens_and_rooks) |
+        (chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied] & queens_and_bishops) |
+        (chess.BB_PAWN_ATTACKS[chess.BLACK][square] & board.pawns & board.occupied_co[chess.WHITE]) |
+        (chess.BB_PAWN_ATTACKS[chess.WHITE][square] & board.pawns & board.occupied_co[chess.BLACK]))
+    return attackers & occupied
+
+
+def static_exchange_eval(board: chess.Board, square: int, side: bool, value: int, vacated: int = chess.BB_EMPTY) -> int:
+    '''
+    Static exchange evaluation: returns how much the opponent of side wins (0 if nothing)
+    by capturing side's piece worth value on square, with both sides recapturing with their
+    least valuable attacker and x-ray attackers joining in as the pieces in front of them leave.
+    The squares in vacated are treated as empty, e.g. the square a piece is moving away from.
+    Works on bitboards only, no move is made on the board.
+    '''
+    occupied = (board.occupied & ~vacated) | chess.BB_SQUARES[square]
+    attackers = attackers_to(board, square, occupied)
+    gains = []
+    on_square = value
+    mover = not side
+    while True:
+        own_attackers = attackers & board.occupied_co[mover]
+        if not own_attackers:
+            break
+        for piece_type in chess.PIECE_TYPES:
+            candidates = own_attackers & board.pieces_mask(piece_type, mover)
+            if candidates:
+                break
+        if piece_type == chess.KING and attackers & board.occupied_co[not mover]:
+            # the king cannot capture onto a defended square
+            break
+        gains.append(on_square)
+        on_square = PIECE_VALUES[piece_type]
+        occupied ^= chess.BB_SQUARES[chess.lsb(candidates)]
+        # removing the capturer may uncover a slider behind it
+        attackers = attackers_to(board, square, occupied)
+        mover = not mover
+    # each side may stop capturing when continuing would lose material
+    score = 0
+    for gain in reversed(gains):
+        score = max(0, gain-score)
+    return score
 
 
 class TrappedPieceType:
+    __slots__ = ('piece_sq',)
+
     def __init__(self, piece_sq: int) -> None:
         self.piece_sq = piece_sq
 
@@ -185,97 +626,90 @@ class TrappedPieceType:
         return (f'piece_sq: {self.piece_sq}')
 
 
-class TrappedPieces:
+class TrappedPieces(Heuristic):
     '''
     if all squares that a piece can go to are controlled by the opponent, then the piece is trapped.
     '''
-    def __init__(self, fen: str) -> None:
-        self.fen = fen
-        self.board = chess.Board(self.fen)
+    def __init__(self, fen: Union[str, PositionContext]) -> None:
+        self.ctx = PositionContext.of(fen)
+        self.fen = self.ctx.fen
+        self.board = self.ctx.board
         self.piece_name = {'p': 'Pawn(s)', 'n': 'Knight(s)', 'b': 'Bishop(s)', 'r': 'Rook(s)', 'q': 'Queen', 'k': 'King'}
         self.piece_val_map = {
             'p': 1, 'n': 3, 'b': 3, 'r': 5, 'q': 9, 'k': 200
         }
+        self._trapped: Dict[bool, List[TrappedPieceType]] = {}
 
-    def check_en_prise(self, from_sq: int, to_sq: int) -> bool:
-        curr_piece = self.board.piece_at(from_sq)
-        curr_color = self.board.color_at(from_sq)
-        curr_piece_val = self.piece_val_map[curr_piece.symbol().lower()]
-        tboard = chess.Board(self.fen)
-        tboard.push(chess.Move(from_square=from_sq, to_square=to_sq))
-
-        defenders = tboard.attackers(curr_color, to_sq)
-        attackers = tboard.attackers(not curr_color, to_sq)
-
-        len_a = len(attackers)
-        len_d = len(defenders)
-
-        # if there are no defenders but there are attackers then return True
-        if len_a > 0 and len_d == 0:
-            return True
+    def revealed_attacks(self, from_sq: int, color: bool) -> Dict[int, int]:
+        '''
+        Returns the squares that sliders of color would newly attack if from_sq were emptied,
+        mapped to the value of the least valuable such slider
+        '''
+        board = self.board
+        revealed: Dict[int, int] = {}
+        sliders = self.ctx.attackers(color, from_sq).mask & (board.bishops | board.rooks | board.queens)
+        for slider in chess.scan_forward(sliders):
+            ray = BB_BEYOND[slider][from_sq]
+            blockers = ray & board.occupied
+            if blockers:
+                blocker = chess.lsb(blockers) if from_sq > slider else chess.msb(blockers)
+                ray &= chess.between(from_sq, blocker) | chess.BB_SQUARES[blocker]
+            value = PIECE_VALUES[board.piece_type_at(slider)]
+            for sq in chess.scan_forward(ray):
+                revealed[sq] = min(value, revealed.get(sq, value))
+        return revealed
 
-        if len_a == 0:
-            return False
+    def check_en_prise(self, from_sq: int, to_sq: int, revealed: Union[Dict[int, int], None] = None) -> bool:
+        '''
+        Returns True if the piece on from_sq would lose material by static exchange after moving to to_sq.
+        Most squares are decided from the opponent's attack map, only the rest need a full SEE.
+        revealed is revealed_attacks(from_sq, opponent), computed here if not given.
+        '''
+        curr_color = self.board.color_at(from_sq)
+        curr_piece_val = PIECE_VALUES[self.board.piece_type_at(from_sq)]
+        counts, least_values = self.ctx.attack_map(not curr_color)
+        num_attackers = counts[to_sq]
+        least_value = least_values[to_sq]
+        if revealed is None:
+            revealed = self.revealed_attacks(from_sq, not curr_color)
+        if to_sq in revealed:
+            least_value = min(least_value, revealed[to_sq]) if num_attackers else revealed[to_sq]
+            num_attackers += 1
 
-        # If any of the attackers have lower piece val than that of curr_piece,
-        # return True
-        for att_piece in attackers:
-            if self.piece_val_map[tboard.piece_at(att_piece).symbol().lower()] < curr_piece_val:
-                return True
-
-        attackers_val = [self.piece_val_map[tboard.piece_at(att_piece).symbol().lower()] for att_piece in attackers]
-        attackers_val = sorted(attackers_val)
-        defenders_val = [self.piece_val_map[tboard.piece_at(def_piece).symbol().lower()] for def_piece in defenders]
-        defenders_val = sorted(defenders_val)
-        a = 0
-        d = 0
-        score = 0
-        temp = curr_piece_val
-        while a < len_a and d < len_d:
-            if attackers_val[a] < defenders_val[d] and score <= 0:
-                return False
-            else:
-                score += temp-attackers_val[a]
-                temp = defenders_val[d]
-                a += 1
-                d += 1
-        if len_a > len_d:
-            score += temp-attackers_val[a]
-            if score <= 0:
-                return False
-            else:
-                return True
-        elif score <= 0:
+        if num_attackers == 0:
             return False
-        else:
+        # capturing with a cheaper piece wins material whatever the recaptures
+        if least_value < curr_piece_val:
             return True
+        return self.ctx.see(to_sq, curr_color, curr_piece_val, from_sq) > 0
 
-    def get_trapped_pieces(self) -> List[TrappedPieceType]:
+    def get_trapped_pieces(self, color: Union[bool, None] = None) -> List[TrappedPieceType]:
         '''
-        Returns list of all trapped pieces in a position
+        Returns list of all trapped pieces of color (both colours if None) in a position.
+        Each colour is searched once, on first request.
         '''
-        trapped_pieces = []
-        for i in range(64):
-            if self.board.piece_at(i) is not None and self.board.piece_at(i).piece_type > 1 and self.is_trapped(i):
-                trapped_pieces.append(TrappedPieceType(i))
-        return trapped_pieces
+        if color is None:
+            trapped_pieces = self.get_trapped_pieces(chess.WHITE) + self.get_trapped_pieces(chess.BLACK)
+            trapped_pieces.sort(key=lambda piece: piece.piece_sq)
+            return trapped_pieces
+        if color not in self._trapped:
+            board = self.board
+            self._trapped[color] = [TrappedPieceType(i) for i in chess.scan_forward(board.occupied_co[color] & ~board.pawns)
+                                    if self.is_trapped(i)]
+        return list(self._trapped[color])
 
     def is_trapped(self, curr_sq: int) -> bool:
         '''
         Returns True if piece at the given input square is trapped,
         else Returns False
         '''
-        # get list of all possible squares that the current piece can go to
-        possible_squares = []
+        # get all possible squares that the current piece can go to
         curr_col = self.board.color_at(curr_sq)
-        for sq in self.board.attacks(curr_sq):
-            if self.board.piece_at(sq) is not None and self.board.piece_at(sq).color is curr_col:
-                continue
-            possible_squares.append(sq)
+        possible_squares = self.board.attacks_mask(curr_sq) & ~self.board.occupied_co[curr_col]
 
         # if the piece is not attacking any sqaures -> then check if
         # it's at it's starting square -> in that case -> it's not trapped
-        if len(possible_squares) == 0:
+        if not possible_squares:
             if curr_sq == 0 and self.board.piece_at(curr_sq).symbol() == 'R':
                 return False
             elif curr_sq == 2 and self.board.piece_at(curr_sq).symbol() == 'B':
@@ -294,54 +728,164 @@ class TrappedPieces:
                 return False
 
         # Check if all these possible squares are defended by the opposite side
-        num_possible_sqs = len(possible_squares)
-        num_defended_sqs = 0
-        # for sq in possible_squares:
-        #     # get attackers of the possible squares
-        #     attacker_sqs=self.board.attackers(not curr_col, sq)
-        #     for a_sq in attacker_sqs:
-        #         if self.piece_val_map[self.board.piece_at(a_sq).symbol().lower()] < \
-        #             self.piece_val_map[self.board.piece_at(curr_sq).symbol().lower()]:
-        #             num_defended_sqs+=1
-        #             break
-        for sq in possible_squares:
-            if self.check_en_prise(from_sq=curr_sq, to_sq=sq):
-                num_defended_sqs += 1
-
-        if num_possible_sqs-num_defended_sqs == 0:
-            return True
-        else:
-            return False
+        return self._escape_square(curr_sq) is None
+
+    def _escape_square(self, curr_sq: int) -> Union[int, None]:
+        '''
+        Returns a square the piece at curr_sq can move to without losing material by static exchange,
+        None if there is none
+        '''
+        curr_col = self.board.color_at(curr_sq)
+        possible_squares = self.board.attacks_mask(curr_sq) & ~self.board.occupied_co[curr_col]
+        revealed = self.revealed_attacks(curr_sq, not curr_col)
+        for sq in chess.scan_forward(possible_squares):
+            if not self.check_en_prise(from_sq=curr_sq, to_sq=sq, revealed=revealed):
+                return sq
+        return None
 
     def get_explanations(self, ex_color=None) -> List[str]:
         '''
         Returns list of explanations corresponding to each trapped piece
         '''
-        trapped_pieces = self.get_trapped_pieces()
-        explanation_list = []
-        for piece in trapped_pieces:
-            if ex_color is False:
-                color = 'White' if self.board.color_at(piece.piece_sq) is True else None
-            elif ex_color is True:
-                color = 'Black' if self.board.color_at(piece.piece_sq) is False else None
-            else:
-                color = 'White' if self.board.color_at(piece.piece_sq) is True else 'Black'
-            if color is not None:
-                sq = chess.square_name(piece.piece_sq)
-                explanation_list.append(f'{color} {self.piece_name[self.board.piece_at(piece.piece_sq).symbol().lower()]} at {sq} is trapped')
-        return explanation_list
+        return render_all(self.get_records(ex_color))
+
+    def get_records(self, ex_color=None) -> List[Explanation]:
+        '''
+        Returns one KIND_TRAPPED record per trapped piece, of both colours if ex_color is None,
+        else of the side without the advantage
+        '''
+        # ex_color is the side with the advantage: only the other side's pieces are reported
+        board = self.board
+        return [Explanation(KIND_TRAPPED, int(board.color_at(piece.piece_sq)), board.piece_type_at(piece.piece_sq), piece.piece_sq)
+                for piece in self.get_trapped_pieces(None if ex_color is None else not ex_color)]
 
 
-class Mobility:
+class IncrementalTrappedPieces(TrappedPieces, IncrementalFindings):
     '''
-    Class containing logic to evaluate Mobility of Pieces
+    TrappedPieces that follows the moves on its PositionContext. Every piece's escape square is kept
+    together with the squares that decide it and looked for again only after a move that changes one
+    of them. A piece that can escape only depends on its own square and that of one escape.
     '''
+    incremental = True
 
-    def __init__(self, fen: str) -> None:
-        self.fen = fen
+    def __init__(self, fen: Union[str, PositionContext]) -> None:
+        super().__init__(fen)
+        # square -> (escape square, squares it depends on)
+        self._square_cache: Dict[int, Tuple[Union[int, None], int]] = {}
+        self._track()
+
+    def _escape_square(self, curr_sq: int) -> Union[int, None]:
+        entry = self._square_cache.get(curr_sq)
+        if entry is None:
+            escape = super()._escape_square(curr_sq)
+            entry = self._square_cache[curr_sq] = (escape, self._dependencies(curr_sq, escape))
+        return entry[0]
+
+    def _dependencies(self, sq: int, escape: Union[int, None]) -> int:
+        '''
+        Returns the squares whose contents decide the escape of the piece on sq: its own square,
+        the path to escape and every square from which a piece attacks escape, or could x-ray it in
+        an exchange. Without an escape, all the squares it attacks and all its destinations count.
+        '''
+        board = self.board
+        if escape is None:
+            attacks = board.attacks_mask(sq)
+            dependencies = chess.BB_SQUARES[sq] | attacks
+            targets = attacks & ~board.occupied_co[board.color_at(sq)]
+        else:
+            dependencies = chess.BB_SQUARES[sq] | chess.between(sq, escape)
+            targets = chess.BB_SQUARES[escape]
+        # sq is vacated by the moving piece and the rays of an exchange pass through sliders moving
+        # along them and through adjacent pieces (which may capture first); anything else blocks them
+        occupied = board.occupied & ~chess.BB_SQUARES[sq]
+        straight = occupied & ~(board.rooks | board.queens)
+        diagonal = occupied & ~(board.bishops | board.queens)
+        for target in chess.scan_forward(targets):
+            adjacent = ~chess.BB_KING_ATTACKS[target]
+            dependencies |= (BB_LEAPS[target] |
+                             chess.BB_RANK_ATTACKS[target][chess.BB_RANK_MASKS[target] & straight & adjacent] |
+                             chess.BB_FILE_ATTACKS[target][chess.BB_FILE_MASKS[target] & straight & adjacent] |
+                             chess.BB_DIAG_ATTACKS[target][chess.BB_DIAG_MASKS[target] & diagonal & adjacent])
+        return dependencies
+
+    def _forget(self, changed: int) -> None:
+        self._trapped.clear()
+        self._square_cache = {sq: entry for sq, entry in self._square_cache.items() if not entry[1] & changed}
+
+
+def pawn_attacks(pawns: int, color: bool) -> int:
+    '''
+    Returns every square attacked by the pawns of color in the bitboard pawns, computed set-wise
+    '''
+    if color == chess.WHITE:
+        return (((pawns << 7) & ~chess.BB_FILE_H) | ((pawns << 9) & ~chess.BB_FILE_A)) & chess.BB_ALL
+    return ((pawns >> 7) & ~chess.BB_FILE_A) | ((pawns >> 9) & ~chess.BB_FILE_H)
+
+
+# safe mobility differences (in squares) from which a piece type is more, or much more, active
+MOBILITY_MARGIN = 4
+MOBILITY_LARGE_MARGIN = 10
+
+
+class Mobility(Heuristic):
+    '''
+    Class containing logic to evaluate Mobility of Pieces: the number of squares the knights, bishops,
+    rooks and queens of each side attack that are not occupied by their own pieces (pseudo-legal moves,
+    pins are not considered). Safe mobility also leaves out squares attacked by enemy pawns.
+    '''
+    piece_types = [chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+
+    def __init__(self, fen: Union[str, PositionContext]) -> None:
+        self.ctx = PositionContext.of(fen)
+        self.fen = self.ctx.fen
+        self.board = self.ctx.board
+        self._mobility: Dict[Tuple[bool, bool], Dict[int, int]] = {}
+
+    def get_mobility(self, color: bool, safe: bool = True) -> Dict[int, int]:
+        '''
+        Returns the mobility of color's pieces, summed per piece type, memoised per (color, safe)
+        '''
+        key = (color, safe)
+        if key not in self._mobility:
+            board = self.board
+            targets = ~board.occupied_co[color]
+            if safe:
+                targets &= ~pawn_attacks(board.pieces_mask(chess.PAWN, not color), not color)
+            self._mobility[key] = {
+                piece_type: sum(chess.popcount(board.attacks_mask(sq) & targets)
+                                for sq in chess.scan_forward(board.pieces_mask(piece_type, color)))
+                for piece_type in self.piece_types
+            }
+        return self._mobility[key]
+
+    def get_explanations(self, ex_color=None) -> List[str]:
+        '''
+        Returns list of explanations corresponding to each piece type that is clearly more active on one side
+        '''
+        return render_all(self.get_records(ex_color))
+
+    def get_records(self, ex_color=None) -> List[Explanation]:
+        '''
+        Returns one KIND_MOBILITY record per piece type whose safe mobility differs by at least
+        MOBILITY_MARGIN squares, value being white minus black. Only the side ex_color (both if None)
+        is reported as the more active one.
+        '''
+        white = self.get_mobility(chess.WHITE)
+        black = self.get_mobility(chess.BLACK)
+        records = []
+        for piece_type in self.piece_types:
+            difference = white[piece_type]-black[piece_type]
+            if abs(difference) < MOBILITY_MARGIN:
+                continue
+            color = difference > 0
+            if ex_color is None or ex_color == color:
+                records.append(Explanation(KIND_MOBILITY, int(color), piece_type, value=difference))
+        return records
 
 
 class PSQTType:
+    __slots__ = ('piece_sq',)
+
     def __init__(self, piece_sq: int) -> None:
         self.piece_sq = piece_sq
 
@@ -349,21 +893,24 @@ class PSQTType:
         return (f'piece_sq: {self.piece_sq}')
 
 
-# TODO: PeSTO's Evaluation Function
 class PSQT(Heuristic):
     '''
     Class containing logic for Piece Square Tables
     '''
+    piece_val_map = {
+        'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 20000
+    }
+    # built once below the class and shared by all instances
+    psqt_map: Dict[str, Sequence[int]]
+    record_kind = KIND_PSQT
 
-    def __init__(self, fen: str) -> None:
-        self.fen = fen
-        self.piece_loc_map = self.build_piece_loc_map()
-        self.psqt_map = self.build_psqt_map()
-        self.piece_val_map = {
-            'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 20000
-        }
+    def __init__(self, fen: Union[str, PositionContext]) -> None:
+        self.ctx = PositionContext.of(fen)
+        self.fen = self.ctx.fen
+        self._piece_evals: Dict[str, int] = {}
 
-    def build_psqt_map(self) -> Dict[str, List[int]]:
+    @staticmethod
+    def build_psqt_map() -> Dict[str, List[int]]:
         '''
         Returns a dictionary containing piece_symbols as keys and their
         respective piece square table array as values
@@ -437,52 +984,358 @@ class PSQT(Heuristic):
         psqt_map['k'] = psqt_map['K'][::-1]
         return psqt_map
 
+    @property
+    def piece_loc_map(self) -> Dict[str, List[int]]:
+        return self.build_piece_loc_map()
+
     def build_piece_loc_map(self) -> Dict[str, List[int]]:
         '''
         Returns a dictionary containing piece_symbols as keys and their
         respective positions on the board as a list of integers using input FEN
         '''
-        board = chess.Board(self.fen)
-        piece_loc_map = defaultdict(list)
-        for i in range(64):
-            curr_piece = board.piece_at(i)
-            if curr_piece:
-                piece_loc_map[curr_piece.symbol()].append(i)
-        return piece_loc_map
+        return self.ctx.piece_loc_map
 
     def get_piece_eval(self, piece_symbol: str) -> int:
         '''
         Takes piece_symbol as input
-        Returns board eval corresponding to just that piece
+        Returns board eval corresponding to just that piece, computed once per piece type
         '''
-        white_eval = 0
         piece_type = piece_symbol.lower()
+        if piece_type in self._piece_evals:
+            return self._piece_evals[piece_type]
+        white_eval = 0
         for sq in self.piece_loc_map[piece_symbol.upper()]:
             white_eval += self.piece_val_map[piece_type]+self.psqt_map[piece_symbol.upper()][sq]
         black_eval = 0
         for sq in self.piece_loc_map[piece_symbol.lower()]:
             black_eval += self.piece_val_map[piece_type]+self.psqt_map[piece_symbol.lower()][sq]
+        self._piece_evals[piece_type] = white_eval-black_eval
         return white_eval-black_eval
 
     def get_explanations(self, ex_color=None) -> List[str]:
         '''
         Returns list of explanations corresponding to each piece square table
         '''
+        return render_all(self.get_records(ex_color))
+
+    def get_records(self, ex_color=None) -> List[Explanation]:
+        '''
+        Returns one record_kind record per piece type whose placement favours a side, value being the
+        white minus black score. With ex_color False every piece type is reported for Black unscored.
+        '''
         pieces = ['p', 'b', 'n', 'r', 'q', 'k']
-        piece_name = {'p': 'Pawn(s)', 'n': 'Knight(s)', 'b': 'Bishop(s)', 'r': 'Rook(s)', 'q': 'Queen', 'k': 'King'}
-        explanation_list = []
+        records = []
         for piece in pieces:
+            piece_type = chess.PIECE_SYMBOLS.index(piece)
             if ex_color is False:
-                explanation_list.append(f"Black's {piece_name[piece]} is/are placed at better square(s) than White")
-            elif ex_color is True:
-                if self.get_piece_eval(piece) > 0:
-                    explanation_list.append(f"White's {piece_name[piece]} is/are placed at better square(s) than Black")
+                records.append(Explanation(self.record_kind, int(chess.BLACK), piece_type))
             else:
-                if self.get_piece_eval(piece) > 0:
-                    explanation_list.append(f"White's {piece_name[piece]} is/are placed at better square(s) than Black")
-                elif self.get_piece_eval(piece) < 0:
-                    explanation_list.append(f"Black's {piece_name[piece]} is/are placed at better square(s) than White")
-        return explanation_list
+                piece_eval = self.get_piece_eval(piece)
+                if piece_eval > 0:
+                    records.append(Explanation(self.record_kind, int(chess.WHITE), piece_type, value=piece_eval))
+                elif piece_eval < 0 and ex_color is None:
+                    records.append(Explanation(self.record_kind, int(chess.BLACK), piece_type, value=piece_eval))
+        return records
+
+
+PSQT.psqt_map = {symbol: tuple(table) for symbol, table in PSQT.build_psqt_map().items()}
+
+# the heuristics BuildInsights explains a position with, in the order of its explanations
+INSIGHT_HEURISTICS: Sequence[Type[Heuristic]] = (PSQT, PinnedPieces, TrappedPieces, Mobility)
+
+
+class IncrementalTotals(MoveObserver, ABC):
+    '''
+    Keeps an evaluation made of per-piece contributions up to date as moves are pushed and popped:
+    only the pieces on the squares a move changes are taken out and put back. Subclasses implement
+    _add(symbol, sq, sign), adding (sign 1) or removing (sign -1) one piece's contribution,
+    and call _track() once their totals are set up.
+    '''
+    ctx: PositionContext
+
+    @abstractmethod
+    def _add(self, symbol: str, sq: int, sign: int) -> None:
+        pass
+
+    def _track(self) -> None:
+        for symbol, squares in self.ctx.piece_loc_map.items():
+            for sq in squares:
+                self._add(symbol, sq, 1)
+        # changed squares of every pushed move, needed to take it back
+        self._undo_stack: List[List[int]] = []
+        self.ctx.observers.append(self)
+
+    def _update(self, board: chess.Board, squares: List[int], sign: int) -> None:
+        for sq in squares:
+            piece = board.piece_at(sq)
+            if piece is not None:
+                self._add(piece.symbol(), sq, sign)
+
+    def before_push(self, board: chess.Board, move: chess.Move) -> None:
+        squares = changed_squares(board, move)
+        self._undo_stack.append(squares)
+        self._update(board, squares, -1)
+
+    def after_push(self, board: chess.Board, move: chess.Move) -> None:
+        self._update(board, self._undo_stack[-1], 1)
+
+    def before_pop(self, board: chess.Board) -> None:
+        self._update(board, self._undo_stack[-1], -1)
+
+    def after_pop(self, board: chess.Board, move: chess.Move) -> None:
+        self._update(board, self._undo_stack.pop(), 1)
+
+    def push(self, move: chess.Move) -> None:
+        self.ctx.push(move)
+
+    def pop(self) -> chess.Move:
+        return self.ctx.pop()
+
+
+class IncrementalPSQT(PSQT, IncrementalTotals):
+    '''
+    PSQT that keeps per-piece-type white/black totals and updates them in O(1)
+    whenever a move is pushed on or popped off its PositionContext
+    '''
+    incremental = True
+
+    def __init__(self, fen: Union[str, PositionContext]) -> None:
+        super().__init__(fen)
+        self.white_totals = dict.fromkeys(self.piece_val_map, 0)
+        self.black_totals = dict.fromkeys(self.piece_val_map, 0)
+        self._track()
+
+    def _add(self, symbol: str, sq: int, sign: int) -> None:
+        piece_type = symbol.lower()
+        totals = self.white_totals if symbol.isupper() else self.black_totals
+        totals[piece_type] += sign*(self.piece_val_map[piece_type]+self.psqt_map[symbol][sq])
+
+    def get_piece_eval(self, piece_symbol: str) -> int:
+        piece_type = piece_symbol.lower()
+        return self.white_totals[piece_type]-self.black_totals[piece_type]
+
+
+# PeSTO (Ronald Friederich's Piece-Square Tables Only evaluation): piece values and square bonuses for the
+# middlegame and the endgame, blended by the game phase. Values are indexed by chess.PieceType, tables are
+# written from White's point of view with a8 first, as published.
+PESTO_MG_VALUES = (0, 82, 337, 365, 477, 1025, 0)
+PESTO_EG_VALUES = (0, 94, 281, 297, 512, 936, 0)
+# phase contributed by each piece, the sum is 24 with all pieces on the board
+PESTO_PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4, 0)
+PESTO_MAX_PHASE = 24
+
+_PESTO_MG_TABLES = {
+    chess.PAWN: (
+        0,   0,   0,   0,   0,   0,  0,   0,
+        98, 134,  61,  95,  68, 126, 34, -11,
+        -6,   7,  26,  31,  65,  56, 25, -20,
+        -14,  13,   6,  21,  23,  12, 17, -23,
+        -27,  -2,  -5,  12,  17,   6, 10, -25,
+        -26,  -4,  -4, -10,   3,   3, 33, -12,
+        -35,  -1, -20, -23, -15,  24, 38, -22,
+        0,   0,   0,   0,   0,   0,  0,   0,
+    ),
+    chess.KNIGHT: (
+        -167, -89, -34, -49,  61, -97, -15, -107,
+        -73, -41,  72,  36,  23,  62,   7,  -17,
+        -47,  60,  37,  65,  84, 129,  73,   44,
+        -9,  17,  19,  53,  37,  69,  18,   22,
+        -13,   4,  16,  13,  28,  19,  21,   -8,
+        -23,  -9,  12,  10,  19,  17,  25,  -16,
+        -29, -53, -12,  -3,  -1,  18, -14,  -19,
+        -105, -21, -58, -33, -17, -28, -19,  -23,
+    ),
+    chess.BISHOP: (
+        -29,   4, -82, -37, -25, -42,   7,  -8,
+        -26,  16, -18, -13,  30,  59,  18, -47,
+        -16,  37,  43,  40,  35,  50,  37,  -2,
+        -4,   5,  19,  50,  37,  37,   7,  -2,
+        -6,  13,  13,  26,  34,  12,  10,   4,
+        0,  15,  15,  15,  14,  27,  18,  10,
+        4,  15,  16,   0,   7,  21,  33,   1,
+        -33,  -3, -14, -21, -13, -12, -39, -21,
+    ),
+    chess.ROOK: (
+        32,  42,  32,  51, 63,  9,  31,  43,
+        27,  32,  58,  62, 80, 67,  26,  44,
+        -5,  19,  26,  36, 17, 45,  61,  16,
+        -24, -11,   7,  26, 24, 35,  -8, -20,
+        -36, -26, -12,  -1,  9, -7,   6, -23,
+        -45, -25, -16, -17,  3,  0,  -5, -33,
+        -44, -16, -20,  -9, -1, 11,  -6, -71,
+        -19, -13,   1,  17, 16,  7, -37, -26,
+    ),
+    chess.QUEEN: (
+        -28,   0,  29,  12,  59,  44,  43,  45,
+        -24, -39,  -5,   1, -16,  57,  28,  54,
+        -13, -17,   7,   8,  29,  56,  47,  57,
+        -27, -27, -16, -16,  -1,  17,  -2,   1,
+        -9, -26,  -9, -10,  -2,  -4,   3,  -3,
+        -14,   2, -11,  -2,  -5,   2,  14,   5,
+        -35,  -8,  11,   2,   8,  15,  -3,   1,
+        -1, -18,  -9,  10, -15, -25, -31, -50,
+    ),
+    chess.KING: (
+        -65,  23,  16, -15, -56, -34,   2,  13,
+        29,  -1, -20,  -7,  -8,  -4, -38, -29,
+        -9,  24,   2, -16, -20,   6,  22, -22,
+        -17, -20, -12, -27, -30, -25, -14, -36,
+        -49,  -1, -27, -39, -46, -44, -33, -51,
+        -14, -14, -22, -46, -44, -30, -15, -27,
+        1,   7,  -8, -64, -43, -16,   9,   8,
+        -15,  36,  12, -54,   8, -28,  24,  14,
+    ),
+}
+
+_PESTO_EG_TABLES = {
+    chess.PAWN: (
+        0,   0,   0,   0,   0,   0,   0,   0,
+        178, 173, 158, 134, 147, 132, 165, 187,
+        94, 100,  85,  67,  56,  53,  82,  84,
+        32,  24,  13,   5,  -2,   4,  17,  17,
+        13,   9,  -3,  -7,  -7,  -8,   3,  -1,
+        4,   7,  -6,   1,   0,  -5,  -1,  -8,
+        13,   8,   8,  10,  13,   0,   2,  -7,
+        0,   0,   0,   0,   0,   0,   0,   0,
+    ),
+    chess.KNIGHT: (
+        -58, -38, -13, -28, -31, -27, -63, -99,
+        -25,  -8, -25,  -2,  -9, -25, -24, -52,
+        -24, -20,  10,   9,  -1,  -9, -19, -41,
+        -17,   3,  22,  22,  22,  11,   8, -18,
+        -18,  -6,  16,  25,  16,  17,   4, -18,
+        -23,  -3,  -1,  15,  10,  -3, -20, -22,
+        -42, -20, -10,  -5,  -2, -20, -23, -44,
+        -29, -51, -23, -15, -22, -18, -50, -64,
+    ),
+    chess.BISHOP: (
+        -14, -21, -11,  -8, -7,  -9, -17, -24,
+        -8,  -4,   7, -12, -3, -13,  -4, -14,
+        2,  -8,   0,  -1, -2,   6,   0,   4,
+        -3,   9,  12,   9, 14,  10,   3,   2,
+        -6,   3,  13,  19,  7,  10,  -3,  -9,
+        -12,  -3,   8,  10, 13,   3,  -7, -15,
+        -14, -18,  -7,  -1,  4,  -9, -15, -27,
+        -23,  -9, -23,  -5, -9, -16,  -5, -17,
+    ),
+    chess.ROOK: (
+        13, 10, 18, 15, 12,  12,   8,   5,
+        11, 13, 13, 11, -3,   3,   8,   3,
+        7,  7,  7,  5,  4,  -3,  -5,  -3,
+        4,  3, 13,  1,  2,   1,  -1,   2,
+        3,  5,  8,  4, -5,  -6,  -8, -11,
+        -4,  0, -5, -1, -7, -12,  -8, -16,
+        -6, -6,  0,  2, -9,  -9, -11,  -3,
+        -9,  2,  3, -1, -5, -13,   4, -20,
+    ),
+    chess.QUEEN: (
+        -9,  22,  22,  27,  27,  19,  10,  20,
+        -17,  20,  32,  41,  58,  25,  30,   0,
+        -20,   6,   9,  49,  47,  35,  19,   9,
+        3,  22,  24,  45,  57,  40,  57,  36,
+        -18,  28,  19,  47,  31,  34,  39,  23,
+        -16, -27,  15,   6,   9,  17,  10,   5,
+        -22, -23, -30, -16, -16, -23, -36, -32,
+        -33, -28, -22, -43,  -5, -32, -20, -41,
+    ),
+    chess.KING: (
+        -74, -35, -18, -18, -11,  15,   4, -17,
+        -12,  17,  14,  17,  17,  38,  23,  11,
+        10,  17,  23,  15,  20,  45,  44,  13,
+        -8,  22,  24,  27,  26,  33,  26,   3,
+        -18,  -4,  21,  24,  27,  23,   9, -11,
+        -19,  -3,  11,  21,  23,  16,   7,  -9,
+        -27, -11,   4,  13,  14,   4,  -5, -17,
+        -53, -34, -21, -11, -28, -14, -24, -43,
+    ),
+}
+
+
+def pesto_index(symbol: str) -> int:
+    '''
+    Row of a piece in the PeSTO tables: PNBRQK for White, then pnbrqk for Black
+    '''
+    return 'PNBRQKpnbrqk'.index(symbol)
+
+
+def _build_pesto_table(values: Sequence[int], tables: Dict[int, Sequence[int]]) -> Tuple[int, ...]:
+    '''
+    Returns a flat 12 x 64 tuple of piece value + square bonus, indexed by pesto_index(symbol)*64 + square
+    '''
+    flat: List[int] = []
+    for color in [chess.WHITE, chess.BLACK]:
+        for piece_type in chess.PIECE_TYPES:
+            table = tables[piece_type]
+            # the tables start at a8: White reads them rank-flipped, Black as they are
+            flat.extend(values[piece_type]+table[sq ^ 56 if color else sq] for sq in chess.SQUARES)
+    return tuple(flat)
+
+
+PESTO_MG_TABLE = _build_pesto_table(PESTO_MG_VALUES, _PESTO_MG_TABLES)
+PESTO_EG_TABLE = _build_pesto_table(PESTO_EG_VALUES, _PESTO_EG_TABLES)
+
+
+class PeSTO(PSQT, IncrementalTotals):
+    '''
+    PeSTO's tapered evaluation: every piece is scored on a middlegame and an endgame table and
+    the two totals are blended by the game phase, from 24 (all pieces on) down to 0 (pawns and kings).
+    Explains per piece type like PSQT and follows the moves pushed on its context in O(1) per move.
+    '''
+    incremental = True
+    record_kind = KIND_PESTO
+
+    def __init__(self, fen: Union[str, PositionContext]) -> None:
+        super().__init__(fen)
+        # indexed by pesto_index
+        self.mg_totals = [0]*12
+        self.eg_totals = [0]*12
+        self.phase = 0
+        self._track()
+
+    def _add(self, symbol: str, sq: int, sign: int) -> None:
+        index = pesto_index(symbol)
+        self.mg_totals[index] += sign*PESTO_MG_TABLE[index*64+sq]
+        self.eg_totals[index] += sign*PESTO_EG_TABLE[index*64+sq]
+        self.phase += sign*PESTO_PHASE_WEIGHTS[index % 6 + 1]
+
+    def _taper(self, mg: int, eg: int) -> int:
+        phase = min(self.phase, PESTO_MAX_PHASE)
+        return int((mg*phase+eg*(PESTO_MAX_PHASE-phase))/PESTO_MAX_PHASE)
+
+    def get_piece_eval(self, piece_symbol: str) -> int:
+        '''
+        Returns the tapered white minus black score of one piece type
+        '''
+        white = pesto_index(piece_symbol.upper())
+        black = white+6
+        return self._taper(self.mg_totals[white]-self.mg_totals[black], self.eg_totals[white]-self.eg_totals[black])
+
+    def evaluate(self) -> int:
+        '''
+        Returns the tapered score of the whole position in centipawns, from White's point of view
+        '''
+        mg = sum(self.mg_totals[:6])-sum(self.mg_totals[6:])
+        eg = sum(self.eg_totals[:6])-sum(self.eg_totals[6:])
+        return self._taper(mg, eg)
+
+    def get_explanations(self, ex_color=None) -> List[str]:
+        '''
+        Returns list of explanations corresponding to each piece type, as PSQT does
+        '''
+        return render_all(self.get_records(ex_color))
+
+    def get_records(self, ex_color=None) -> List[Explanation]:
+        '''
+        Returns one KIND_PESTO record per piece type whose tapered score favours a side (ex_color,
+        if given), value being the white minus black score
+        '''
+        records = []
+        for piece in ['p', 'b', 'n', 'r', 'q', 'k']:
+            piece_eval = self.get_piece_eval(piece)
+            color = piece_eval > 0
+            if piece_eval and ex_color in (None, color):
+                records.append(Explanation(self.record_kind, int(color), chess.PIECE_SYMBOLS.index(piece), value=piece_eval))
+        return records
 
 
 if __name__ == '__main__':  # pragma: no cover
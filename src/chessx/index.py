@@ -0,0 +1,223 @@
+'''
+Precomputed explanation index for frequent positions.
+
+build_index() runs the full BuildInsights pipeline (engine score and the findings of
+INSIGHT_HEURISTICS for the side the score favours) over a corpus once, and writes the
+results to a compact binary file keyed by Zobrist hash. ExplanationIndex reads that file
+through a read-only memory map: a lookup is a binary search over the sorted keys, O(log n)
+without loading the file, and every process that opens the same file shares one copy of it
+through the page cache. An index records the version of every heuristic it was built with,
+and opening it fails once any of them has changed.
+
+File layout, all integers little-endian:
+
+    header     magic, format version, fields per record, entry count, metadata length
+    metadata   JSON (engine limit, heuristic versions), padded to 8 bytes
+    keys       count x uint64 Zobrist keys, ascending
+    entries    count x (uint64 offset of the records, int32 score, uint32 record count)
+    records    int32 Explanation fields, RECORD_FIELDS per record
+
+    python -m chessx.index openings.pgn openings.idx --engine stockfish --max-ply 30
+'''
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Union
+import argparse
+import json
+import mmap
+import os
+import shlex
+import struct
+import chess
+import chess.engine
+from chessx.engine import EnginePool
+from chessx.export import SourcePosition, read_fens, read_pgn
+from chessx.heuristic import BuildInsights, INSIGHT_HEURISTICS, PositionContext, score_advantage
+from chessx.records import Explanation, RECORD_FIELDS, render_all
+
+MAGIC = b'CHXINDEX'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<8sIIQQ')
+KEY = struct.Struct('<Q')
+ENTRY = struct.Struct('<QiI')
+RECORD = struct.Struct(f'<{RECORD_FIELDS}i')
+
+
+class IndexEntry:
+    '''
+    What the index holds for one position: the engine score (centipawns from White's point of
+    view) and the records of INSIGHT_HEURISTICS for score_advantage(score)
+    '''
+    __slots__ = ('score', 'records')
+
+    def __init__(self, score: int, records: List[Explanation]) -> None:
+        self.score = score
+        self.records = records
+
+    def get_explanations(self) -> List[str]:
+        return render_all(self.records)
+
+    def __str__(self):
+        return (f'score: {self.score}, records: {len(self.records)}')
+
+
+class ExplanationIndex:
+    '''
+    Read-only, memory-mapped index written by build_index. Instances pickle by path, so worker
+    processes reopen (and share) the same file instead of copying it.
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, fields, self.count, meta_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or fields != RECORD_FIELDS:
+            self._mm.close()
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} chessx index')
+        self.metadata: Dict[str, Any] = json.loads(self._mm[HEADER.size:HEADER.size+meta_length])
+        if self.metadata.get('heuristics') != heuristic_versions():
+            self._mm.close()
+            raise ValueError(f'{path} was built with heuristic versions {self.metadata.get("heuristics")}, '
+                             f'current versions are {heuristic_versions()}: rebuild it')
+        self._keys_offset = HEADER.size+_padded(meta_length)
+        self._entries_offset = self._keys_offset+KEY.size*self.count
+
+    def _find(self, key: int) -> int:
+        '''
+        Returns the position of key among the sorted keys, -1 if it is missing
+        '''
+        mm, offset = self._mm, self._keys_offset
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo+hi) // 2
+            if KEY.unpack_from(mm, offset+KEY.size*mid)[0] < key:
+                lo = mid+1
+            else:
+                hi = mid
+        if lo < self.count and KEY.unpack_from(mm, offset+KEY.size*lo)[0] == key:
+            return lo
+        return -1
+
+    def lookup(self, key: int) -> Union[IndexEntry, None]:
+        '''
+        Returns the entry of the position with Zobrist hash key, None if it is not indexed
+        '''
+        i = self._find(key)
+        if i < 0:
+            return None
+        records_offset, score, n = ENTRY.unpack_from(self._mm, self._entries_offset+ENTRY.size*i)
+        records = [Explanation._make(RECORD.unpack_from(self._mm, records_offset+RECORD.size*j)) for j in range(n)]
+        return IndexEntry(score, records)
+
+    def get(self, position: Union[str, PositionContext]) -> Union[IndexEntry, None]:
+        '''
+        Returns the entry of position (a FEN or a context), None if it is not indexed
+        '''
+        return self.lookup(PositionContext.of(position).zobrist_key)
+
+    def __contains__(self, key: int) -> bool:
+        return self._find(key) >= 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __reduce__(self):
+        return (ExplanationIndex, (self.path,))
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self) -> ExplanationIndex:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def heuristic_versions() -> Dict[str, int]:
+    '''
+    Returns the current version of every heuristic an index stores findings of
+    '''
+    return {heuristic.__name__: heuristic.version for heuristic in INSIGHT_HEURISTICS}
+
+
+def _padded(length: int) -> int:
+    return (length+7) & ~7
+
+
+def index_position(ctx: PositionContext, pool: Union[EnginePool, None] = None,
+                   limit: Union[chess.engine.Limit, None] = None) -> IndexEntry:
+    '''
+    Runs BuildInsights' pipeline on one position and returns what the index stores for it
+    '''
+    score = BuildInsights(ctx, pool=pool, limit=limit).eval
+    advantage = score_advantage(score)
+    records: List[Explanation] = []
+    for heuristic in INSIGHT_HEURISTICS:
+        records.extend(heuristic(ctx).get_records(ex_color=advantage))
+    return IndexEntry(score, records)
+
+
+def write_index(path: str, entries: Dict[int, IndexEntry], metadata: Union[Dict[str, Any], None] = None) -> None:
+    '''
+    Writes entries (Zobrist key -> entry) to path in the index format, replacing the file atomically.
+    The metadata records the current heuristic versions.
+    '''
+    meta = json.dumps({**(metadata or {}), 'heuristics': heuristic_versions()}).encode()
+    keys = sorted(entries)
+    records_offset = HEADER.size+_padded(len(meta))+(KEY.size+ENTRY.size)*len(keys)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_FIELDS, len(keys), len(meta)))
+        f.write(meta.ljust(_padded(len(meta)), b'\0'))
+        f.write(b''.join(KEY.pack(key) for key in keys))
+        offset = records_offset
+        for key in keys:
+            entry = entries[key]
+            f.write(ENTRY.pack(offset, entry.score, len(entry.records)))
+            offset += RECORD.size*len(entry.records)
+        for key in keys:
+            f.write(b''.join(RECORD.pack(*record) for record in entries[key].records))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def build_index(source: Iterable[Union[str, SourcePosition]], path: str, pool: Union[EnginePool, None] = None,
+                limit: Union[chess.engine.Limit, None] = None, max_ply: Union[int, None] = None) -> int:
+    '''
+    Analyses every distinct position of source (FENs, or positions from read_fens/read_pgn) and
+    writes the index to path. With max_ply, positions of games beyond that ply are left out.
+    Entries are held in memory until written. Returns the number of positions indexed.
+    '''
+    limit = limit if limit is not None else chess.engine.Limit(time=0.1)
+    entries: Dict[int, IndexEntry] = {}
+    for position in source:
+        fen, ply = (position, None) if isinstance(position, str) else (position[0], position[2])
+        if max_ply is not None and ply is not None and ply > max_ply:
+            continue
+        ctx = PositionContext(fen)
+        if ctx.zobrist_key not in entries:
+            entries[ctx.zobrist_key] = index_position(ctx, pool, limit)
+    write_index(path, entries, {'limit': repr(limit)})
+    return len(entries)
+
+
+def main() -> None:  # pragma: no cover
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='PGN file (.pgn) or file with one FEN/EPD per line')
+    parser.add_argument('output', help='index file to write')
+    parser.add_argument('--engine', required=True, help='UCI engine command')
+    parser.add_argument('--time', type=float, default=0.1, help='engine seconds per position')
+    parser.add_argument('--max-ply', type=int, help='only index the first plies of every game')
+    args = parser.parse_args()
+
+    with EnginePool(shlex.split(args.engine)) as pool, open(args.input) as stream:
+        source = read_pgn(stream) if args.input.endswith('.pgn') else read_fens(stream)
+        count = build_index(source, args.output, pool, chess.engine.Limit(time=args.time), args.max_ply)
+    print(f'{count} positions in {args.output}')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,135 @@
+'''
+Optional instrumentation of the heuristics, engine analyses and caches.
+
+Nothing is measured unless a Metrics sink is active, which collect() arranges for the
+duration of a request. Instrumented code then reports stage wall times and event counts
+to that sink; with no sink the cost is a context variable lookup per instrumented call.
+'''
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, TypeVar, Union
+import cProfile
+import functools
+import pstats
+import threading
+import time
+
+F = TypeVar('F', bound=Callable)
+
+
+class Metrics:
+    '''
+    Interface for metric sinks: override the hooks to forward measurements elsewhere
+    (statsd, Prometheus, logs). The base class discards everything.
+    '''
+    def timing(self, stage: str, seconds: float) -> None:
+        pass
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    def profiled(self, stats: pstats.Stats) -> None:
+        pass
+
+
+class MetricsRecorder(Metrics):
+    '''
+    Keeps totals in memory: wall time and calls per stage, event counters and the cProfile stats
+    '''
+    def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self.profile: Union[pstats.Stats, None] = None
+        self._lock = threading.Lock()
+
+    def timing(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def profiled(self, stats: pstats.Stats) -> None:
+        self.profile = stats
+
+    def __str__(self):
+        stages = ', '.join(f'{stage}: {seconds*1000:.3f} ms/{self.calls[stage]}' for stage, seconds in self.timings.items())
+        counters = ', '.join(f'{name}: {n}' for name, n in self.counters.items())
+        return (f'stages: {{{stages}}}, counters: {{{counters}}}')
+
+
+_current: ContextVar[Union[Metrics, None]] = ContextVar('chessx_metrics', default=None)
+
+
+def current() -> Union[Metrics, None]:
+    '''
+    Returns the sink active in this thread or task, if any
+    '''
+    return _current.get()
+
+
+def count(name: str, n: int = 1) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count(name, n)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    '''
+    Reports the wall time of the block as stage, for blocks too coarse to bother with instrumented()
+    '''
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timing(stage, time.perf_counter() - start)
+
+
+def instrumented(stage: str) -> Callable[[F], F]:
+    '''
+    Decorator reporting the wall time of every call to the function as stage
+    '''
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            metrics = _current.get()
+            if metrics is None:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.timing(stage, time.perf_counter() - start)
+        return wrapper  # type: ignore
+    return decorator
+
+
+@contextmanager
+def collect(metrics: Union[Metrics, None] = None, profile: bool = False) -> Iterator[Metrics]:
+    '''
+    Makes metrics (a new MetricsRecorder if None) the active sink for the block, e.g. one request.
+    With profile=True the block also runs under cProfile and the stats are handed to metrics.profiled().
+    The sink follows asyncio tasks started inside the block, but not plain threads.
+    '''
+    if metrics is None:
+        metrics = MetricsRecorder()
+    token = _current.set(metrics)
+    profiler = cProfile.Profile() if profile else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            metrics.profiled(pstats.Stats(profiler))
+        _current.reset(token)
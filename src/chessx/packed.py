@@ -0,0 +1,174 @@
+'''
+Fixed-width packed positions and shared-memory position buffers.
+
+A position packs into POSITION_SIZE (72) bytes: the eight bitboards python-chess keeps
+(White and Black occupancy, then pawns, knights, bishops, rooks, queens and kings), the files
+of the castling rooks, the en passant square, side to move and Chess960 flags, and both clocks.
+encode() and decode() convert to and from chess.Board without going through a FEN.
+
+A PositionBuffer holds many packed positions in a shared memory block. Worker processes
+attach to it by name and decode positions in place, so batch jobs send workers index ranges
+instead of pickled FEN strings.
+'''
+from __future__ import annotations
+from multiprocessing import shared_memory
+from typing import Any, Iterable, Iterator, Sequence, Union
+import struct
+import chess
+
+POSITION = struct.Struct('<8QHBBHH')
+POSITION_SIZE = POSITION.size
+
+# en passant square of positions without one
+NO_EP_SQUARE = 255
+
+# bits of the flags field
+FLAG_WHITE_TO_MOVE = 1
+FLAG_CHESS960 = 2
+
+
+def _fields(board: chess.Board) -> tuple:
+    castling = board.castling_rights
+    return (board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], board.pawns, board.knights, board.bishops,
+            board.rooks, board.queens, board.kings,
+            (castling & chess.BB_RANK_1) | ((castling >> 48) & 0xff00),
+            NO_EP_SQUARE if board.ep_square is None else board.ep_square,
+            (FLAG_WHITE_TO_MOVE if board.turn else 0) | (FLAG_CHESS960 if board.chess960 else 0),
+            board.halfmove_clock, board.fullmove_number)
+
+
+def encode(board: chess.Board) -> bytes:
+    '''
+    Returns board packed into POSITION_SIZE bytes
+    '''
+    return POSITION.pack(*_fields(board))
+
+
+def encode_into(buffer: Any, offset: int, board: chess.Board) -> None:
+    '''
+    Packs board into a writable buffer at offset
+    '''
+    POSITION.pack_into(buffer, offset, *_fields(board))
+
+
+def decode(buffer: Any, offset: int = 0) -> chess.Board:
+    '''
+    Returns the board packed in buffer at offset (the move stack is not kept)
+    '''
+    white, black, pawns, knights, bishops, rooks, queens, kings, castling, ep_square, flags, halfmove_clock, fullmove_number = \
+        POSITION.unpack_from(buffer, offset)
+    board = chess.Board(None, chess960=bool(flags & FLAG_CHESS960))
+    board.occupied_co[chess.WHITE] = white
+    board.occupied_co[chess.BLACK] = black
+    board.occupied = white | black
+    board.pawns = pawns
+    board.knights = knights
+    board.bishops = bishops
+    board.rooks = rooks
+    board.queens = queens
+    board.kings = kings
+    board.castling_rights = (castling & 0xff) | ((castling & 0xff00) << 48)
+    board.ep_square = None if ep_square == NO_EP_SQUARE else ep_square
+    board.turn = bool(flags & FLAG_WHITE_TO_MOVE)
+    board.halfmove_clock = halfmove_clock
+    board.fullmove_number = fullmove_number
+    return board
+
+
+class PositionBuffer:
+    '''
+    count packed positions in a shared memory block. PositionBuffer(count) creates the block,
+    which the creating process owns and unlinks on close(); PositionBuffer(count, name) attaches
+    to an existing one. Instances pickle by name, so child processes given a buffer attach to the
+    same memory instead of receiving a copy.
+    '''
+
+    def __init__(self, count: int, name: Union[str, None] = None) -> None:
+        if count < 0:
+            raise ValueError(f'count must not be negative, got {count}')
+        self.count = count
+        self.owner = name is None
+        if self.owner:
+            # a shared memory block cannot be empty
+            self.shm = shared_memory.SharedMemory(create=True, size=max(1, count*POSITION_SIZE))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if self.shm.size < count*POSITION_SIZE:
+                self.shm.close()
+                raise ValueError(f'shared memory {name} is too small for {count} positions')
+
+    @classmethod
+    def from_boards(cls, boards: Sequence[chess.Board]) -> PositionBuffer:
+        buffer = cls(len(boards))
+        buffer.fill(boards)
+        return buffer
+
+    @classmethod
+    def from_fens(cls, fens: Sequence[str]) -> PositionBuffer:
+        '''
+        Parses and packs fens, raising ValueError on the first invalid one
+        '''
+        buffer = cls(len(fens))
+        try:
+            buffer.fill(chess.Board(fen) for fen in fens)
+        except BaseException:
+            buffer.close()
+            raise
+        return buffer
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def _offset(self, index: int) -> int:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f'position {index} out of range for {self.count} positions')
+        return index*POSITION_SIZE
+
+    def __getitem__(self, index: int) -> chess.Board:
+        return decode(self.shm.buf, self._offset(index))
+
+    def __setitem__(self, index: int, board: chess.Board) -> None:
+        encode_into(self.shm.buf, self._offset(index), board)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def boards(self, start: int = 0, stop: Union[int, None] = None) -> Iterator[chess.Board]:
+        '''
+        Decodes the positions start to stop (default: the end)
+        '''
+        buf = self.shm.buf
+        for index in range(start, self.count if stop is None else min(stop, self.count)):
+            yield decode(buf, index*POSITION_SIZE)
+
+    def fill(self, boards: Iterable[chess.Board], start: int = 0) -> int:
+        '''
+        Packs boards from index start on, returns the index after the last one written
+        '''
+        index = start
+        for board in boards:
+            self[index] = board
+            index += 1
+        return index
+
+    def __reduce__(self):
+        return (PositionBuffer, (self.count, self.name))
+
+    def close(self) -> None:
+        '''
+        Detaches from the shared memory, and frees it if this buffer created it.
+        Views of the memory (e.g. numpy arrays) must be released first.
+        '''
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            self.owner = False
+
+    def __enter__(self) -> PositionBuffer:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
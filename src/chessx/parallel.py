@@ -0,0 +1,156 @@
+'''
+Explain many positions on all cores with a process pool.
+
+Positions are sent to workers either as FEN strings, pickled chunk by chunk, or in a
+chessx.packed.PositionBuffer: workers then attach to its shared memory once and are sent
+only index ranges, decoding each position straight from the buffer.
+'''
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Set, Tuple, Union
+import multiprocessing.util
+import os
+import chess.engine
+from chessx.engine import EngineCommand, EnginePool, default_engine_command
+from chessx.heuristic import BuildInsights, INSIGHT_HEURISTICS, PositionContext
+from chessx.packed import PositionBuffer
+
+
+class ExplanationResult:
+    '''
+    Outcome for one position of a batch: explanations, or the error that prevented them.
+    Results of a PositionBuffer leave fen out (None) and decode it from positions when it is read.
+    '''
+    def __init__(self, index: int, fen: Union[str, None], explanations: List[str], error: Union[str, None] = None,
+                 positions: Union[PositionBuffer, None] = None) -> None:
+        self.index = index
+        self._fen = fen
+        self.explanations = explanations
+        self.error = error
+        self.positions = positions
+
+    @property
+    def fen(self) -> str:
+        if self._fen is None:
+            assert self.positions is not None
+            self._fen = self.positions[self.index].fen()
+        return self._fen
+
+    def __str__(self):
+        return (f'index: {self.index}, fen: {self.fen}, explanations: {len(self.explanations)}, error: {self.error}')
+
+
+# per worker process state, set up once by _init_worker
+_worker_pool: Union[EnginePool, None] = None
+_worker_limit: Union[chess.engine.Limit, None] = None
+_worker_positions: Union[PositionBuffer, None] = None
+
+
+def _init_worker(engine_command: Union[EngineCommand, None], engine_options: Union[Dict[str, Any], None],
+                 limit: Union[chess.engine.Limit, None], insights: bool, positions: Union[PositionBuffer, None] = None) -> None:
+    global _worker_pool, _worker_limit, _worker_positions
+    _worker_positions = positions
+    if insights:
+        _worker_pool = EnginePool(engine_command, size=1, options=engine_options)
+        multiprocessing.util.Finalize(None, _worker_pool.close, exitpriority=10)
+        _worker_limit = limit
+
+
+def _explain(ctx: PositionContext, insights: bool, ex_color: Union[bool, None]) -> List[str]:
+    if insights:
+        return BuildInsights(ctx, pool=_worker_pool, limit=_worker_limit).get_insights()
+    explanations = []
+    for heuristic in INSIGHT_HEURISTICS:
+        explanations.extend(heuristic(ctx).get_explanations(ex_color=ex_color))
+    return explanations
+
+
+def _explain_position(index: int, fen: Union[str, None], board: Union[chess.Board, None], insights: bool,
+                      ex_color: Union[bool, None]) -> ExplanationResult:
+    try:
+        ctx = PositionContext.from_board(board) if board is not None else PositionContext(fen)  # type: ignore
+        return ExplanationResult(index, fen, _explain(ctx, insights, ex_color))
+    except Exception as e:
+        # a bad FEN (or a crashed engine) fails this position only, not the batch
+        return ExplanationResult(index, fen, [], f'{type(e).__name__}: {e}')
+
+
+def _explain_chunk(chunk: List[Tuple[int, str]], insights: bool, ex_color: Union[bool, None]) -> List[ExplanationResult]:
+    return [_explain_position(index, fen, None, insights, ex_color) for index, fen in chunk]
+
+
+def _explain_range(indices: range, insights: bool, ex_color: Union[bool, None]) -> List[ExplanationResult]:
+    positions: PositionBuffer = _worker_positions  # type: ignore
+    # results are keyed by index alone, the parent process decodes a FEN only if it is asked for
+    return [_explain_position(index, None, board, insights, ex_color)
+            for index, board in zip(indices, positions.boards(indices.start, indices.stop))]
+
+
+def _with_positions(results: List[ExplanationResult], positions: Union[PositionBuffer, None]) -> List[ExplanationResult]:
+    if positions is not None:
+        for result in results:
+            result.positions = positions
+    return results
+
+
+def _chunked(items: Iterable[Tuple[int, str]], size: int) -> Iterator[List[Tuple[int, str]]]:
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def explain_many(fens: Union[Iterable[str], PositionBuffer], workers: Union[int, None] = None, chunksize: int = 64, ordered: bool = True,
+                 ex_color: Union[bool, None] = None, insights: bool = False,
+                 engine_command: Union[EngineCommand, None] = None, engine_options: Union[Dict[str, Any], None] = None,
+                 limit: Union[chess.engine.Limit, None] = None) -> Iterator[ExplanationResult]:
+    '''
+    Explains fens on a pool of worker processes and yields one ExplanationResult per FEN,
+    in input order if ordered is True, else as chunks complete.
+
+    Results hold the explanations of every heuristic in INSIGHT_HEURISTICS, for ex_color. If insights
+    is True, each worker keeps its own warm engine and returns BuildInsights.get_insights() instead.
+    fens may be any iterable: only a few chunks per worker are in flight at a time.
+    It may also be a PositionBuffer, which workers read in place. Its results carry only the
+    buffer index and decode their fen from the buffer on first access, so it must stay open
+    until the results have been consumed.
+    '''
+    if chunksize < 1:
+        raise ValueError(f'chunksize must be at least 1, got {chunksize}')
+    workers = workers or os.cpu_count() or 1
+    if insights and engine_command is None:
+        # resolve it here, so a missing engine fails fast instead of breaking every worker
+        engine_command = default_engine_command()
+    max_pending = 2*workers
+    positions = fens if isinstance(fens, PositionBuffer) else None
+    chunks: Iterator[Any]
+    if positions is not None:
+        chunks = (range(start, min(start+chunksize, len(positions))) for start in range(0, len(positions), chunksize))
+        explain_chunk: Any = _explain_range
+    else:
+        chunks = _chunked(enumerate(fens), chunksize)  # type: ignore
+        explain_chunk = _explain_chunk
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(engine_command, engine_options, limit, insights, positions)) as executor:
+        def submit(chunk: Any) -> Future[List[ExplanationResult]]:
+            return executor.submit(explain_chunk, chunk, insights, ex_color)
+
+        if ordered:
+            queue: Deque[Future[List[ExplanationResult]]] = deque(submit(chunk) for chunk in islice(chunks, max_pending))
+            while queue:
+                results = _with_positions(queue.popleft().result(), positions)
+                for chunk in islice(chunks, 1):
+                    queue.append(submit(chunk))
+                yield from results
+        else:
+            pending: Set[Future[List[ExplanationResult]]] = {submit(chunk) for chunk in islice(chunks, max_pending)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for chunk in islice(chunks, len(done)):
+                    pending.add(submit(chunk))
+                for future in done:
+                    yield from _with_positions(future.result(), positions)
@@ -0,0 +1,90 @@
+'''
+Compact structured explanations.
+
+Heuristics describe their findings as Explanation records: flat tuples of small integers
+(heuristic kind, colour, piece types and squares) that can be stored, filtered and counted
+without parsing text. render() turns a record into the English sentence that
+get_explanations() returns; pack_records()/unpack_records() move records in bulk as raw int32s.
+'''
+from __future__ import annotations
+from array import array
+from itertools import chain
+from typing import Iterable, List, NamedTuple
+import chess
+
+# heuristic kinds
+KIND_PSQT = 1
+KIND_PIN = 2
+KIND_TRAPPED = 3
+KIND_PESTO = 4
+KIND_MOBILITY = 5
+
+KIND_NAMES = {KIND_PSQT: 'PSQT', KIND_PIN: 'PinnedPieces', KIND_TRAPPED: 'TrappedPieces', KIND_PESTO: 'PeSTO', KIND_MOBILITY: 'Mobility'}
+
+# piece names as used in the explanations, indexed by chess.PieceType
+PIECE_NAMES = ['', 'Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King']
+PLURAL_PIECE_NAMES = ['', 'Pawn(s)', 'Knight(s)', 'Bishop(s)', 'Rook(s)', 'Queen', 'King']
+
+COLOR_NAMES = ['Black', 'White']
+
+
+class Explanation(NamedTuple):
+    '''
+    One finding of a heuristic. color and piece_type describe the piece the explanation is
+    about (for PSQT, PeSTO and Mobility: the side whose pieces of that type stand better). square is -1
+    and value the white minus black score for those records; target and source are the
+    piece a pinned piece shields and the slider pinning it, with type 0 and square -1 when not applicable.
+    '''
+    kind: int
+    color: int
+    piece_type: int
+    square: int = -1
+    target_type: int = 0
+    target_sq: int = -1
+    source_type: int = 0
+    source_sq: int = -1
+    value: int = 0
+
+
+RECORD_FIELDS = len(Explanation._fields)
+
+
+def render(record: Explanation) -> str:
+    '''
+    Returns the sentence describing record, as returned by the heuristics' get_explanations
+    '''
+    color = COLOR_NAMES[record.color]
+    if record.kind in (KIND_PSQT, KIND_PESTO):
+        return f"{color}'s {PLURAL_PIECE_NAMES[record.piece_type]} is/are placed at better square(s) than {COLOR_NAMES[not record.color]}"
+    if record.kind == KIND_PIN:
+        return (f'{color} {PIECE_NAMES[record.piece_type]} at {chess.square_name(record.square)} is pinned to its '
+                f'{PIECE_NAMES[record.target_type]} at {chess.square_name(record.target_sq)} by the opponent\'s '
+                f'{PIECE_NAMES[record.source_type]} at {chess.square_name(record.source_sq)}')
+    if record.kind == KIND_MOBILITY:
+        # imported here, as chessx.heuristic imports this module
+        from chessx.heuristic import MOBILITY_LARGE_MARGIN
+        degree = 'much more' if abs(record.value) >= MOBILITY_LARGE_MARGIN else 'more'
+        return f"{color}'s {PLURAL_PIECE_NAMES[record.piece_type]} is/are {degree} active than {COLOR_NAMES[not record.color]}'s"
+    if record.kind == KIND_TRAPPED:
+        return f'{color} {PLURAL_PIECE_NAMES[record.piece_type]} at {chess.square_name(record.square)} is trapped'
+    raise ValueError(f'unknown explanation kind {record.kind}')
+
+
+def render_all(records: Iterable[Explanation]) -> List[str]:
+    return [render(record) for record in records]
+
+
+def pack_records(records: Iterable[Explanation]) -> bytes:
+    '''
+    Returns records as consecutive native int32 rows of RECORD_FIELDS columns
+    '''
+    return array('i', chain.from_iterable(records)).tobytes()
+
+
+def unpack_records(data: bytes) -> List[Explanation]:
+    '''
+    Inverse of pack_records
+    '''
+    values = array('i')
+    values.frombytes(data)
+    return [Explanation._make(values[i:i+RECORD_FIELDS]) for i in range(0, len(values), RECORD_FIELDS)]
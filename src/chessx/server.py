@@ -0,0 +1,400 @@
+'''
+Local explanation server.
+
+An InsightServer keeps engines (an AsyncEnginePool) and an ExplanationCache warm and serves
+BuildInsights over a minimal HTTP/1.1 interface, on a TCP port or a Unix socket:
+
+    POST /insights  {"fen": "..."}  -> {"fen": ..., "score": ..., "insights": [...]}
+    GET  /stats                     -> queue depth, batch sizes, latency percentiles, stage metrics
+
+Requests wait in a bounded queue. Workers take them off in micro-batches: up to max_batch
+requests, or whatever arrived within max_wait seconds of the first one. The distinct positions
+of a batch are analysed concurrently on the engines, and the heuristics for the whole batch run
+in one executor call. When the queue is full a request is turned away at once with 503, so
+load beyond capacity shows up as rejections instead of unbounded latency.
+
+    python -m chessx.server --engine stockfish --engines 4 --port 8000
+    python -m chessx.server --engine "python -m chessx.fake_uci" --unix /tmp/chessx.sock
+'''
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Deque, Dict, List, Sequence, Tuple, Union
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import shlex
+import time
+import chess
+import chess.engine
+from chessx import metrics
+from chessx.aio import AsyncEnginePool, AsyncInsights
+from chessx.cache import ExplanationCache
+from chessx.heuristic import BuildInsights, PositionContext
+
+# HTTP status lines used by the server
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+               500: 'Internal Server Error', 503: 'Service Unavailable'}
+# largest request body read, in bytes; a FEN request needs well under 200
+MAX_BODY = 64*1024
+
+
+class Overloaded(Exception):
+    '''
+    Raised by InsightServer.submit when the request queue is full
+    '''
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    '''
+    Returns the q-th percentile (0..100) of values by the nearest-rank method, 0.0 if empty
+    '''
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered)-1, max(0, int(round(q/100*len(ordered)))-1))]
+
+
+class ServerStats:
+    '''
+    Request counters of an InsightServer, with the queue wait and total latency (seconds)
+    of the last window completed requests
+    '''
+    def __init__(self, window: int = 10000) -> None:
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.batched = 0
+        self.max_queue_depth = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.waits: Deque[float] = deque(maxlen=window)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        waits = list(self.waits)
+        return {
+            'accepted': self.accepted, 'rejected': self.rejected, 'completed': self.completed, 'failed': self.failed,
+            'batches': self.batches, 'mean_batch': self.batched/self.batches if self.batches else 0.0,
+            'max_queue_depth': self.max_queue_depth,
+            'latency_ms': {f'p{q}': percentile(latencies, q)*1000 for q in (50, 90, 99)},
+            'queue_wait_ms': {f'p{q}': percentile(waits, q)*1000 for q in (50, 90, 99)},
+        }
+
+    def __str__(self):
+        stats = self.to_dict()
+        return (f"completed: {self.completed}, rejected: {self.rejected}, failed: {self.failed}, "
+                f"mean_batch: {stats['mean_batch']:.1f}, max_queue_depth: {self.max_queue_depth}, "
+                f"latency p50/p99: {stats['latency_ms']['p50']:.1f}/{stats['latency_ms']['p99']:.1f} ms")
+
+
+class PendingRequest:
+    __slots__ = ('ctx', 'future', 'enqueued')
+
+    def __init__(self, ctx: PositionContext, future: asyncio.Future, enqueued: float) -> None:
+        self.ctx = ctx
+        self.future = future
+        self.enqueued = enqueued
+
+    @property
+    def fen(self) -> str:
+        return self.ctx.fen
+
+
+def _batch_insights(positions: List[PositionContext], scores: List[int],
+                    cache: Union[ExplanationCache, None]) -> List[Union[List[str], Exception]]:
+    results: List[Union[List[str], Exception]] = []
+    for ctx, score in zip(positions, scores):
+        try:
+            results.append(BuildInsights(ctx, cache=cache, score=score).get_insights())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _fail_closed(requests: List[PendingRequest]) -> None:
+    for request in requests:
+        if not request.future.done():
+            request.future.set_exception(RuntimeError('InsightServer closed'))
+
+
+class InsightServer:
+    '''
+    Serves BuildInsights for concurrent clients from warm engines. submit() queues a position
+    (at most queue_size wait at once) and workers (one per engine unless given) answer them in
+    micro-batches. Stage timings and counters of all batches go to the metrics recorder.
+    '''
+
+    def __init__(self, pool: AsyncEnginePool, limit: Union[chess.engine.Limit, None] = None,
+                 cache: Union[ExplanationCache, None] = None, executor: Union[Executor, None] = None,
+                 max_batch: int = 16, max_wait: float = 0.005, queue_size: int = 256, workers: Union[int, None] = None) -> None:
+        if max_batch < 1:
+            raise ValueError(f'max_batch must be at least 1, got {max_batch}')
+        if queue_size < 1:
+            raise ValueError(f'queue_size must be at least 1, got {queue_size}')
+        self.pool = pool
+        self.cache = cache if cache is not None else ExplanationCache()
+        self.insights = AsyncInsights(pool, limit=limit, cache=self.cache)
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.workers = workers if workers is not None else pool.size
+        self.stats = ServerStats()
+        self.metrics = metrics.MetricsRecorder()
+        self._queue: Union[asyncio.Queue[PendingRequest], None] = None
+        self._arrived: Union[asyncio.Event, None] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> InsightServer:
+        '''
+        Starts the workers, must be awaited inside the event loop that serves the requests
+        '''
+        self._queue = asyncio.Queue(self.queue_size)
+        self._arrived = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        return self
+
+    async def close(self) -> None:
+        '''
+        Stops the workers, failing the requests still queued or in a batch
+        '''
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        pending = []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        _fail_closed(pending)
+
+    async def __aenter__(self) -> InsightServer:
+        return await self.start()
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    async def submit(self, fen: Union[str, PositionContext]) -> Tuple[int, List[str]]:
+        '''
+        Returns the engine score and the insights for fen, raises Overloaded if the queue is full.
+        The board of a PositionContext is shared by the engine and the heuristics, not parsed again.
+        '''
+        if self._queue is None or self._arrived is None:
+            raise RuntimeError('InsightServer is not started')
+        request = PendingRequest(PositionContext.of(fen), asyncio.get_running_loop().create_future(), time.perf_counter())
+        try:
+            self._queue.put_nowait(request)
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            raise Overloaded(f'{self.queue_size} requests already queued') from None
+        self.stats.accepted += 1
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self._queue.qsize())
+        self._arrived.set()
+        return await request.future
+
+    async def _next_batch(self, batch: List[PendingRequest]) -> None:
+        '''
+        Waits for a request, then adds more to batch until it is full or max_wait has passed
+        '''
+        assert self._queue is not None and self._arrived is not None
+        loop = asyncio.get_running_loop()
+        batch.append(await self._queue.get())
+        deadline = loop.time()+self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline-loop.time()
+            if remaining <= 0:
+                break
+            # waiting on an event rather than on the queue cannot lose a request on timeout
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+    async def _work(self) -> None:
+        while True:
+            # filled in place, so the requests taken from the queue are known when the worker is cancelled
+            batch: List[PendingRequest] = []
+            try:
+                await self._next_batch(batch)
+                with metrics.collect(self.metrics):
+                    await self._run_batch(batch)
+            except asyncio.CancelledError:
+                _fail_closed(batch)
+                raise
+
+    async def _run_batch(self, batch: List[PendingRequest]) -> None:
+        started = time.perf_counter()
+        self.stats.batches += 1
+        self.stats.batched += len(batch)
+        metrics.count('batched_requests', len(batch))
+        # the first request of each distinct position lends its context to the others
+        distinct: Dict[str, PositionContext] = {}
+        for request in batch:
+            distinct.setdefault(request.fen, request.ctx)
+        positions = list(distinct.values())
+        results: Dict[str, Union[Tuple[int, List[str]], BaseException]] = {}
+        try:
+            scores = await asyncio.gather(*(self.insights.get_score(ctx) for ctx in positions), return_exceptions=True)
+            scored = [(ctx, score) for ctx, score in zip(positions, scores) if not isinstance(score, BaseException)]
+            results.update((ctx.fen, score) for ctx, score in zip(positions, scores) if isinstance(score, BaseException))
+            if scored:
+                call = functools.partial(contextvars.copy_context().run, _batch_insights,
+                                         [ctx for ctx, _ in scored], [score for _, score in scored], self.cache)
+                insights = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+                for (ctx, score), explanations in zip(scored, insights):
+                    results[ctx.fen] = explanations if isinstance(explanations, Exception) else (score, explanations)
+        except Exception as e:
+            results = dict.fromkeys((ctx.fen for ctx in positions), e)
+        finished = time.perf_counter()
+        for request in batch:
+            result = results[request.fen]
+            if isinstance(result, BaseException):
+                self.stats.failed += 1
+                if not request.future.done():
+                    request.future.set_exception(result)
+                continue
+            self.stats.completed += 1
+            self.stats.waits.append(started-request.enqueued)
+            self.stats.latencies.append(finished-request.enqueued)
+            if not request.future.done():
+                request.future.set_result(result)
+
+    def stats_dict(self) -> Dict[str, Any]:
+        stats = self.stats.to_dict()
+        stats['queue_depth'] = self.queue_depth
+        stats['queue_size'] = self.queue_size
+        stats['engine_restarts'] = self.pool.restarts
+        stats['stages_ms'] = {stage: seconds*1000 for stage, seconds in self.metrics.timings.items()}
+        stats['counters'] = dict(self.metrics.counters)
+        return stats
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        '''
+        Answers one HTTP request, returns the status and the JSON payload
+        '''
+        if path == '/stats':
+            if method != 'GET':
+                return 405, {'error': 'use GET'}
+            return 200, self.stats_dict()
+        if path != '/insights':
+            return 404, {'error': f'unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        try:
+            fen = json.loads(body)['fen']
+            ctx = PositionContext(fen)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': f'expected {{"fen": "<FEN>"}}: {e}'}
+        if not ctx.board.is_valid():
+            return 400, {'error': f'invalid position: {fen}'}
+        try:
+            score, insights = await self.submit(ctx)
+        except Overloaded as e:
+            return 503, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': f'{type(e).__name__}: {e}'}
+        return 200, {'fen': fen, 'score': score, 'insights': insights}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''
+        Serves the HTTP/1.1 requests of one connection, kept alive unless the client asks otherwise
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get('content-length', '0')
+                if not (length.isascii() and length.isdigit()):
+                    # the body cannot be skipped without its length, so the connection ends here
+                    await self._respond(writer, 400, {'error': f'invalid Content-Length: {length}'}, False)
+                    break
+                if int(length) > MAX_BODY:
+                    await self._respond(writer, 413, {'error': f'body over {MAX_BODY} bytes'}, False)
+                    break
+                body = await reader.readexactly(int(length))
+                status, payload = await self.handle(method, path, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], keep_alive: bool) -> None:
+        data = json.dumps(payload).encode()
+        head = [f'HTTP/1.1 {status} {STATUS_TEXT[status]}', 'Content-Type: application/json',
+                f'Content-Length: {len(data)}', f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            head.append('Retry-After: 1')
+        writer.write(('\r\n'.join(head)+'\r\n\r\n').encode('latin-1')+data)
+        await writer.drain()
+
+    async def listen(self, host: str = '127.0.0.1', port: int = 8000, path: Union[str, None] = None) -> asyncio.AbstractServer:
+        '''
+        Starts accepting connections on host:port, or on the Unix socket path if given
+        '''
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(command: Union[str, List[str]], engines: int = 1, host: str = '127.0.0.1', port: int = 8000,
+                path: Union[str, None] = None, limit: Union[chess.engine.Limit, None] = None, **kwargs: Any) -> None:
+    '''
+    Runs an InsightServer with engines instances of the UCI engine command until cancelled
+    '''
+    async with AsyncEnginePool(command, size=engines) as pool:
+        async with InsightServer(pool, limit=limit, **kwargs) as server:
+            listener = await server.listen(host, port, path)
+            async with listener:
+                print(f"serving on {path or f'http://{host}:{port}'}, {engines} engine(s)", flush=True)
+                await listener.serve_forever()
+
+
+def main() -> None:  # pragma: no cover
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', required=True, help='UCI engine command, e.g. stockfish or "python -m chessx.fake_uci"')
+    parser.add_argument('--engines', type=int, default=1, help='engine processes kept warm')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix', help='serve on this Unix socket instead of a TCP port')
+    parser.add_argument('--time', type=float, default=0.1, help='engine seconds per position')
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help='how long a batch waits to fill up')
+    parser.add_argument('--queue-size', type=int, default=256, help='queued requests beyond which clients get 503')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(shlex.split(args.engine), args.engines, args.host, args.port, args.unix,
+                          limit=chess.engine.Limit(time=args.time), max_batch=args.max_batch,
+                          max_wait=args.max_wait_ms/1000, queue_size=args.queue_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
@@ -0,0 +1,31 @@
+import sys
+import pytest
+
+# a PSQT imbalance, a pin, trapped pieces and a sharp middlegame
+POSITIONS = [
+    'rn2kb1r/pp2qppp/2p2n2/4p1B1/2B1P3/1QN5/PPP2PPP/R3K2R b KQkq - 1 9',
+    '1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1',
+    'r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24',
+    '6k1/pp1n2pp/3bN3/3P1p2/1PP5/4rBqr/P2Q2P1/R4RK1 w - - 0 27',
+]
+
+
+@pytest.fixture
+def fake_uci():
+    '''
+    Command running chessx.fake_uci, the engine tests use instead of Stockfish
+    '''
+    return [sys.executable, '-m', 'chessx.fake_uci']
+
+
+@pytest.fixture
+def fens():
+    return list(POSITIONS)
+
+
+@pytest.fixture
+def fen():
+    '''
+    The position with trapped pieces
+    '''
+    return POSITIONS[2]
@@ -0,0 +1,64 @@
+import asyncio
+import contextlib
+import chess
+import chess.engine
+import pytest
+import chessx.heuristic as heuristic
+from chessx.aio import AsyncEnginePool, AsyncInsights
+
+
+def test_async_insights(fake_uci, fens):
+    '''
+    Concurrent requests share two engines and match BuildInsights
+    '''
+    async def run():
+        async with AsyncEnginePool(fake_uci, size=2) as pool:
+            insights = AsyncInsights(pool)
+            results = await insights.get_many(fens * 4)
+            # a crashed engine is replaced on its next checkout
+            transport, _ = await pool.checkout()
+            transport.kill()
+            pool.checkin((transport, _))
+            await insights.get_many(fens)
+            return results, pool.restarts
+
+    results, restarts = asyncio.run(run())
+    assert restarts == 1
+    for fen, result in zip(fens * 4, results):
+        score = 0
+        for piece, value in {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900}.items():
+            score += value * (fen.split()[0].count(piece.upper()) - fen.split()[0].count(piece))
+        assert result == heuristic.BuildInsights(fen, score=score).get_insights()
+
+
+def test_fen_parsed_once(fake_uci, fen, monkeypatch):
+    '''
+    A request parses its FEN once, for both the engine and the heuristics
+    '''
+    parsed = []
+    set_fen = chess.Board.set_fen
+    monkeypatch.setattr(chess.Board, 'set_fen', lambda board, fen: parsed.append(fen) or set_fen(board, fen))
+
+    async def run():
+        async with AsyncEnginePool(fake_uci) as pool:
+            return await AsyncInsights(pool).get_insights(fen)
+
+    asyncio.run(run())
+    assert parsed.count(fen) == 1
+
+
+class UnscoredPool:
+    '''
+    Lends an engine whose analyses finish without a score
+    '''
+    async def analyse(self, board, limit):
+        return {'depth': 1}
+
+    @contextlib.asynccontextmanager
+    async def borrow(self):
+        yield self
+
+
+def test_no_score(fen):
+    with pytest.raises(chess.engine.EngineError):
+        asyncio.run(AsyncInsights(UnscoredPool()).get_insights(fen))
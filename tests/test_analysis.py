@@ -0,0 +1,136 @@
+import chess
+import pytest
+import chessx.heuristic as heuristic
+from chessx.analysis import AnalysisPolicy
+from chessx.cache import ExplanationCache
+from chessx.engine import EnginePool
+
+
+@pytest.fixture
+def scripted_pool(fake_uci):
+    '''
+    Returns a function starting a fake engine that reports the given scores at depth 1, 2, ...
+    '''
+    def start(scores, max_depth=50, delay=0):
+        return EnginePool(fake_uci, options={'Script': ','.join(map(str, scores)), 'MaxDepth': max_depth, 'Delay': delay})
+    return start
+
+
+class ScriptedAnalysis:
+    '''
+    Stands in for an engine's analysis, sending the given infos
+    '''
+    def __init__(self, infos):
+        self.infos = infos
+
+    def analysis(self, board, limit, multipv=None):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def __iter__(self):
+        return iter(self.infos)
+
+    def stop(self):
+        pass
+
+    def wait(self):
+        pass
+
+
+def info(depth, cp, **bounds):
+    return dict(depth=depth, multipv=1, score=chess.engine.PovScore(chess.engine.Cp(cp), chess.WHITE), **bounds)
+
+
+def test_stops_when_stable(scripted_pool):
+    '''
+    The search stops once the score holds for stable_depths depths from min_depth on
+    '''
+    policy = AnalysisPolicy(budget=5.0, min_depth=4, stable_depths=3, stable_cp=15)
+    with scripted_pool([10, 80, -40, 20, 25, 30, 300, 300], delay=20) as pool:
+        with pool.borrow() as engine:
+            report = policy.analyse(engine, chess.Board())
+    assert report.stopped_early
+    assert report.depth == 6
+    assert report.score == 30
+    assert report.budget_used < 0.5
+
+
+def test_budget_is_an_upper_bound(scripted_pool):
+    '''
+    A score that never settles runs until the budget is spent, but not much longer
+    '''
+    policy = AnalysisPolicy(budget=0.3)
+    with scripted_pool([0, 100]*100, max_depth=200, delay=20) as pool:
+        with pool.borrow() as engine:
+            report = policy.analyse(engine, chess.Board())
+    assert not report.stopped_early
+    assert 0.5 < report.budget_used < 1.5
+    assert report.depth < 200
+
+
+def test_multipv_and_limits(fen, scripted_pool):
+    policy = AnalysisPolicy(budget=1.0, multipv=3, max_depth=8, nodes_per_second=1000)
+    limit = policy.limit_for(chess.Board())
+    assert (limit.time, limit.depth, limit.nodes) == (pytest.approx(0.9), 8, 900)
+    # a forced move needs a single iteration
+    assert policy.limit_for(chess.Board('4k3/8/8/8/8/8/3q4/K7 w - - 0 1')).depth == 1
+
+    with scripted_pool([50], max_depth=2) as pool:
+        with pool.borrow() as engine:
+            report = policy.analyse(engine, chess.Board(fen))
+    # Black to move: the fake engine's scores are from Black's side
+    assert [score for _, score in report.alternatives()] == [-50, -40, -30]
+    assert report.depth == 2
+
+
+def test_build_insights_with_policy(scripted_pool):
+    cache = ExplanationCache()
+    policy = AnalysisPolicy(budget=1.0, multipv=2)
+    with scripted_pool([150], max_depth=5) as pool:
+        insights = heuristic.BuildInsights(chess.STARTING_FEN, pool=pool, cache=cache, policy=policy)
+        assert insights.eval == 150
+        assert insights.report.depth == 5
+        assert insights.get_insights()[0] == 'White is much better because:'
+        assert insights.get_alternatives() == ['Best move: Nh3 (+1.50)', 'Alternative: Nf3 (+1.40)']
+        # the score is cached per policy
+        cached = heuristic.BuildInsights(chess.STARTING_FEN, pool=pool, cache=cache, policy=policy)
+        assert (cached.eval, cached.info, cached.get_alternatives()) == (150, None, [])
+        assert heuristic.BuildInsights(chess.STARTING_FEN, pool=pool, cache=cache).info is not None
+
+
+def test_bound_scores_are_not_stable():
+    '''
+    Lines whose score is only a lower or upper bound do not count as completed depths
+    '''
+    policy = AnalysisPolicy(budget=5.0, min_depth=1, stable_depths=3, stable_cp=15)
+    infos = [info(1, 10), info(2, 12), info(3, 14, lowerbound=True), info(3, 200), info(4, 201, upperbound=True),
+             info(4, 201), info(5, 202), info(6, 500)]
+    report = policy.analyse(ScriptedAnalysis(infos), chess.Board())
+    assert report.stopped_early
+    assert (report.depth, report.score) == (5, 202)
+
+
+def test_best_line_completes_depth():
+    '''
+    A depth whose last line arrives before the best line has an exact score is not recorded
+    '''
+    policy = AnalysisPolicy(budget=5.0, multipv=2, min_depth=1, stable_depths=2, stable_cp=15)
+    infos = [info(1, 10, lowerbound=True), dict(info(1, 0), multipv=2), info(2, 10), dict(info(2, 0), multipv=2),
+             info(3, 12), dict(info(3, 2), multipv=2)]
+    report = policy.analyse(ScriptedAnalysis(infos), chess.Board())
+    assert (report.depth, report.score) == (3, 12)
+
+
+def test_no_scored_line():
+    '''
+    An engine that finishes without an exact score raises EngineError
+    '''
+    policy = AnalysisPolicy(budget=5.0)
+    for infos in [[], [{'depth': 1}], [info(1, 10, lowerbound=True)]]:
+        with pytest.raises(chess.engine.EngineError):
+            policy.analyse(ScriptedAnalysis(infos), chess.Board())
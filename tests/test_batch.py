@@ -0,0 +1,71 @@
+import pytest
+import chess
+import chessx.heuristic as heuristic
+import chessx.records as records_module
+
+np = pytest.importorskip('numpy')
+batch = pytest.importorskip('chessx.batch')
+
+FENS = [
+    'rn2kb1r/pp2qppp/2p2n2/4p1B1/2B1P3/1QN5/PPP2PPP/R3K2R b KQkq - 1 9',
+    'r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24',
+    '6k1/pp1n2pp/3bN3/3P1p2/1PP5/4rBqr/P2Q2P1/R4RK1 w - - 0 27',
+    chess.STARTING_FEN,
+]
+
+
+def test_batch_piece_eval():
+    '''
+    Batch scores equal PSQT.get_piece_eval for packed and unpacked input
+    '''
+    bitboards = batch.pack_boards(chess.Board(fen) for fen in FENS)
+    assert bitboards.shape == (len(FENS), 12)
+
+    packed_scores = batch.batch_piece_eval(bitboards)
+    occupancy_scores = batch.batch_piece_eval(batch.unpack_bitboards(bitboards))
+    assert packed_scores.shape == (len(FENS), 6)
+    assert (packed_scores == occupancy_scores).all()
+
+    for fen, scores in zip(FENS, packed_scores):
+        psqt = heuristic.PSQT(fen)
+        assert list(scores) == [psqt.get_piece_eval(piece) for piece in batch.PIECE_TYPES]
+
+
+def test_records_array():
+    records = []
+    for fen in FENS:
+        records.extend(heuristic.TrappedPieces(fen).get_records())
+        records.extend(heuristic.PinnedPieces(fen).get_records())
+    array = batch.records_array(records)
+    assert len(array) == len(records)
+    assert [tuple(int(v) for v in row) for row in array] == [tuple(r) for r in records]
+    assert int((array['kind'] == records_module.KIND_PIN).sum()) == sum(r.kind == records_module.KIND_PIN for r in records)
+
+
+def test_batch_mobility():
+    '''
+    Batch mobility equals Mobility.get_mobility, with and without the safe-square rule
+    '''
+    fens = FENS+['4k3/8/8/8/3Q4/8/8/Q2QK2Q w - - 0 1', '4k3/8/8/2b1b3/3B4/2b1b3/8/4K3 w - - 0 1']
+    bitboards = batch.pack_boards(chess.Board(fen) for fen in fens)
+    for safe in [True, False]:
+        mobility = batch.batch_mobility(bitboards, safe=safe)
+        assert mobility.shape == (len(fens), 2, 4)
+        for fen, row in zip(fens, mobility):
+            mob = heuristic.Mobility(fen)
+            for color, counts in zip([chess.WHITE, chess.BLACK], row):
+                expected = mob.get_mobility(color, safe=safe)
+                assert list(counts) == [expected[chess.PIECE_SYMBOLS.index(piece)] for piece in batch.MOBILITY_PIECE_TYPES]
+
+
+def test_positions_array():
+    '''
+    Packed positions in a shared buffer read as POSITION_DTYPE without copying, and give pack_boards' bitboards
+    '''
+    from chessx.packed import POSITION_SIZE, PositionBuffer
+    assert batch.POSITION_DTYPE.itemsize == POSITION_SIZE
+    with PositionBuffer.from_fens(FENS) as buffer:
+        positions = batch.positions_array(buffer)
+        assert list(positions['fullmove_number']) == [chess.Board(fen).fullmove_number for fen in FENS]
+        assert (batch.piece_bitboards(positions) == batch.pack_boards(chess.Board(fen) for fen in FENS)).all()
+        del positions
@@ -0,0 +1,58 @@
+import pytest
+import chessx.heuristic as heuristic
+from chessx.cache import ExplanationCache
+from chessx.engine import EnginePool
+
+
+def test_lru_eviction():
+    cache = ExplanationCache(maxsize=2)
+    cache.put(('a',), 1)
+    cache.put(('b',), 2)
+    assert cache.get(('a',)) == 1
+    cache.put(('c',), 3)
+    # 'b' was the least recently used entry
+    assert cache.get(('b',)) is None
+    assert cache.get(('c',)) == 3
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (2, 1, 1)
+
+
+def test_sqlite_store(tmp_path):
+    '''
+    Entries survive reopening the SQLite file
+    '''
+    path = str(tmp_path / 'cache.sqlite')
+    with ExplanationCache(path=path) as cache:
+        cache.put(('explanations', 1, 'PSQT', 1, None), ['x', 'y'])
+    with ExplanationCache(path=path) as cache:
+        assert cache.get(('explanations', 1, 'PSQT', 1, None)) == ['x', 'y']
+        assert cache.stats.disk_hits == 1
+
+
+def test_heuristics_consult_cache(fen):
+    '''
+    A second heuristic on a transposed position is answered from the cache
+    '''
+    cache = ExplanationCache()
+    psqt = heuristic.PSQT(fen)
+    psqt.cache = cache
+    explanations = psqt.get_explanations()
+    assert cache.stats.misses == 1
+
+    # same position, different move counters
+    psqt = heuristic.PSQT(fen.replace(' 0 24', ' 3 40'))
+    psqt.cache = cache
+    assert psqt.get_explanations() == explanations
+    assert cache.stats.hits == 1
+
+
+def test_insights_use_cache(fake_uci, fen):
+    '''
+    A cached engine score means no engine is needed
+    '''
+    cache = ExplanationCache()
+    with EnginePool(fake_uci) as pool:
+        insights = heuristic.BuildInsights(fen, pool=pool, cache=cache).get_insights()
+    # the pool is closed now, a second request must not touch it
+    assert heuristic.BuildInsights(fen, pool=pool, cache=cache).get_insights() == insights
+    with pytest.raises(RuntimeError):
+        heuristic.BuildInsights(fen.replace('b - -', 'w - -'), pool=pool, cache=cache)
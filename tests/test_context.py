@@ -0,0 +1,34 @@
+import chessx.heuristic as heuristic
+
+
+def test_heuristics_share_context():
+    '''
+    Heuristics built from one PositionContext reuse its board
+    '''
+    fen_str = 'r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24'
+    ctx = heuristic.PositionContext(fen_str)
+
+    psqt = heuristic.PSQT(ctx)
+    pin = heuristic.PinnedPieces(ctx)
+    tp = heuristic.TrappedPieces(ctx)
+
+    assert pin.board is ctx.board
+    assert tp.board is ctx.board
+    assert psqt.piece_loc_map is ctx.piece_loc_map
+
+    # explanations match the ones built from the FEN string
+    assert psqt.get_explanations() == heuristic.PSQT(fen_str).get_explanations()
+    assert pin.get_explanations() == heuristic.PinnedPieces(fen_str).get_explanations()
+    assert tp.get_explanations() == heuristic.TrappedPieces(fen_str).get_explanations()
+
+    # the heuristics leave the shared board as they found it
+    assert ctx.board.fen() == fen_str
+
+
+def test_zobrist_key():
+    '''
+    Transpositions share a Zobrist key
+    '''
+    ctx_1 = heuristic.PositionContext('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1')
+    ctx_2 = heuristic.PositionContext('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 3 7')
+    assert ctx_1.zobrist_key == ctx_2.zobrist_key
@@ -0,0 +1,56 @@
+import pytest
+import chessx.heuristic as heuristic
+from chessx.engine import EnginePool
+
+
+@pytest.fixture
+def pool(fake_uci):
+    with EnginePool(fake_uci, size=2, threads=2, hash_mb=32) as pool:
+        yield pool
+
+
+def test_checkout_checkin(pool):
+    '''
+    Engines are reused instead of spawned per call
+    '''
+    engine_1 = pool.checkout()
+    engine_2 = pool.checkout()
+    assert engine_1 is not engine_2
+    assert engine_1.protocol.config['Threads'] == 2
+    assert engine_1.protocol.config['Hash'] == 32
+    with pytest.raises(TimeoutError):
+        pool.checkout(timeout=0.01)
+    pool.checkin(engine_1)
+    pool.checkin(engine_2)
+    with pool.borrow() as engine:
+        assert engine in (engine_1, engine_2)
+
+
+def test_restart_on_crash(pool):
+    '''
+    A dead engine fails its health check and is replaced on checkout
+    '''
+    engine = pool.checkout()
+    engine.transport.kill()
+    engine.returncode.result(timeout=5)
+    assert not pool.is_healthy(engine)
+    pool.checkin(engine)
+
+    engines = [pool.checkout(), pool.checkout()]
+    assert engine not in engines
+    assert pool.restarts == 1
+    for engine in engines:
+        assert pool.is_healthy(engine)
+        pool.checkin(engine)
+
+
+def test_insights_borrow_from_pool(pool):
+    '''
+    BuildInsights takes its engine from the given pool and gives it back
+    '''
+    # Black to move and a pawn up, the fake engine scores material
+    fen_str = 'r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24'
+    insights = heuristic.BuildInsights(fen_str, pool=pool)
+    assert insights.eval == 10
+    assert insights.get_insights()[0] == 'Position is equal'
+    assert pool._idle.qsize() == 2
@@ -0,0 +1,127 @@
+import contextlib
+import io
+import json
+import chess.engine
+import pytest
+import chessx.heuristic as heuristic
+from chessx.engine import EnginePool
+from chessx.export import analyse_position, NDJSONExporter, ParquetExporter, export, read_fens, read_pgn
+
+FENS = '''rn2kb1r/pp2qppp/2p2n2/4p1B1/2B1P3/1QN5/PPP2PPP/R3K2R b KQkq - 1 9
+# a comment
+r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24
+
+1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - id "pins";
+6k1/pp1n2pp/3bN3/3P1p2/1PP5/4rBqr/P2Q2P1/R4RK1 w - - 0 27
+8/8/8/3k4/8/3K4/3P4/8 w - - 0 1
+'''
+PGN = '''[Event "Short"]
+[Result "*"]
+
+1. e4 e5 2. Nf3 Nc6 *
+
+[Event "Shorter"]
+[Result "*"]
+
+1. d4 *
+'''
+
+
+def read_ndjson(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_ndjson_export(tmp_path, fake_uci):
+    path = str(tmp_path / 'out.ndjson')
+    with EnginePool(fake_uci) as pool:
+        assert export(read_fens(io.StringIO(FENS)), NDJSONExporter(path), batch_size=2, pool=pool) == 5
+    rows = read_ndjson(path)
+    assert [row['index'] for row in rows] == list(range(5))
+    assert rows[2]['fen'] == '1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1'
+    # fake engine: material from White's side
+    assert rows[2]['score'] == 900 + 320 + 330 - 500 - 320
+    for row in rows:
+        expected = []
+        for cls in heuristic.INSIGHT_HEURISTICS:
+            expected.extend(cls(row['fen']).get_explanations())
+        assert row['explanations'] == expected
+        assert len(row['findings']) == len(expected)
+    assert {f['heuristic'] for f in rows[2]['findings']} == {'PSQT', 'PinnedPieces', 'Mobility'}
+
+
+def test_ndjson_resume(tmp_path):
+    '''
+    An interrupted export resumes after its last completed batch, dropping the partial one
+    '''
+    path = str(tmp_path / 'out.ndjson')
+    full = list(read_fens(io.StringIO(FENS)))
+
+    def failing_source():
+        yield from full[:3]
+        raise RuntimeError('interrupted')
+
+    with pytest.raises(RuntimeError):
+        export(failing_source(), NDJSONExporter(path), batch_size=2)
+    assert len(read_ndjson(path)) == 2
+    # simulate a batch torn by a crash during the write
+    with open(path, 'a') as f:
+        f.write('{"index": 2, "fen"')
+    analysed = []
+
+    def counting_source():
+        for position in full:
+            analysed.append(position)
+            yield position
+
+    assert export(counting_source(), NDJSONExporter(path), batch_size=2) == 5
+    assert [row['index'] for row in read_ndjson(path)] == list(range(5))
+    assert export(iter(full), NDJSONExporter(path), batch_size=2, resume=False) == 5
+    assert len(read_ndjson(path)) == 5
+
+
+def test_unparsable_lines(tmp_path, caplog):
+    '''
+    Lines that are not positions are skipped with a warning instead of ending the export
+    '''
+    path = str(tmp_path / 'out.ndjson')
+    source = FENS.replace('# a comment\n', 'not a position\n')
+    assert export(read_fens(io.StringIO(source)), NDJSONExporter(path), batch_size=2) == 5
+    assert [row['fen'] for row in read_ndjson(path)] == [fen for fen, _, _ in read_fens(io.StringIO(FENS))]
+    assert 'skipping line 2' in caplog.text
+
+
+def test_pgn_source():
+    positions = list(read_pgn(io.StringIO(PGN)))
+    assert [(game, ply) for _, game, ply in positions] == [(0, 1), (0, 2), (0, 3), (0, 4), (1, 1)]
+    assert positions[-1][0] == 'rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1'
+
+
+def test_parquet_export(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    directory = str(tmp_path / 'out')
+    assert export(read_pgn(io.StringIO(PGN)), ParquetExporter(directory), batch_size=2) == 5
+    table = pq.read_table(directory)
+    assert table.num_rows == 5
+    assert table.column('ply').to_pylist() == [1, 2, 3, 4, 1]
+    assert table.column('score').to_pylist() == [None] * 5
+    # resuming a finished export writes nothing new
+    assert export(read_pgn(io.StringIO(PGN)), ParquetExporter(directory), batch_size=2) == 5
+    assert len(list((tmp_path / 'out').iterdir())) == 3
+
+
+class UnscoredPool:
+    '''
+    Lends an engine whose analyses finish without a score
+    '''
+    def analyse(self, board, limit):
+        return {'depth': 1}
+
+    @contextlib.contextmanager
+    def borrow(self):
+        yield self
+
+
+def test_no_score():
+    with pytest.raises(chess.engine.EngineError):
+        analyse_position(chess.STARTING_FEN, pool=UnscoredPool())
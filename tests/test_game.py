@@ -0,0 +1,85 @@
+import io
+import chess
+import chess.pgn
+import chessx.heuristic as heuristic
+from chessx.game import diff_game, explain_game
+
+PGN = '''[Event "Opera Game"]
+[White "Morphy"]
+[Black "Duke of Brunswick and Count Isouard"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 d6 3. d4 Bg4 (3... exd4 4. Nxd4) 4. dxe5 Bxf3 5. Qxf3 dxe5 6. Bc4 Nf6 7. Qb3 Qe7
+8. Nc3 c6 9. Bg5 b5 10. Nxb5 cxb5 11. Bxb5+ Nbd7 12. O-O-O Rd8 13. Rxd7 Rxd7 14. Rd1 Qe6
+15. Bxd7+ Nxd7 16. Qb8+ Nxb8 17. Rd8# 1-0
+
+[Event "Short"]
+[FEN "4k3/8/8/8/8/8/4P3/4K3 w - - 0 1"]
+[SetUp "1"]
+[Result "*"]
+
+1. e4 Kd7 *
+'''
+
+
+def test_explain_game():
+    '''
+    explain_game yields one record per ply, matching explanations built from each FEN
+    '''
+    plies = list(explain_game(io.StringIO(PGN)))
+
+    assert [p.game_index for p in plies] == [0] * 33 + [1] * 2
+    assert plies[0].san == 'e4'
+    assert plies[32].san == 'Rd8#'
+    assert plies[33].ply == 1
+
+    board = chess.Board()
+    for ply in plies[:33]:
+        board.push(ply.move)
+        fen = board.fen()
+        expected = heuristic.PSQT(fen).get_explanations() + heuristic.PinnedPieces(fen).get_explanations() + \
+            heuristic.TrappedPieces(fen).get_explanations()
+        assert ply.explanations == expected
+
+
+def test_diff_game():
+    '''
+    Applying every ply's new and resolved explanations to the starting position's rebuilds explain_game's output
+    '''
+    plies = list(explain_game(io.StringIO(PGN)))
+    diffs = list(diff_game(io.StringIO(PGN)))
+    assert [(d.game_index, d.ply, d.san) for d in diffs] == [(p.game_index, p.ply, p.san) for p in plies]
+
+    current = set()
+    for ply, diff in zip(plies, diffs):
+        if diff.ply == 1:
+            ctx = heuristic.PositionContext.from_board(ply.headers.board())
+            current = set(heuristic.PSQT(ctx).get_explanations() + heuristic.PinnedPieces(ctx).get_explanations() +
+                          heuristic.TrappedPieces(ctx).get_explanations())
+        assert not current & set(diff.new)
+        assert set(diff.resolved) <= current
+        current = (current - set(diff.resolved)) | set(diff.new)
+        assert current == set(ply.explanations)
+    assert sum(len(d.new)+len(d.resolved) for d in diffs) < sum(len(p.explanations) for p in plies)
+
+
+def test_incremental_findings():
+    '''
+    Incremental pins and trapped pieces follow pushed and popped moves like fresh instances
+    '''
+    ctx = heuristic.PositionContext(chess.STARTING_FEN)
+    pins = heuristic.IncrementalPinnedPieces(ctx)
+    trapped = heuristic.IncrementalTrappedPieces(ctx)
+    game = chess.pgn.read_game(io.StringIO(PGN))
+    fens = []
+    for move in game.mainline_moves():
+        fens.append(ctx.board.fen())
+        pins.push(move)
+        fen = ctx.board.fen()
+        for ex_color in [None, True, False]:
+            assert pins.get_explanations(ex_color) == heuristic.PinnedPieces(fen).get_explanations(ex_color)
+            assert trapped.get_explanations(ex_color) == heuristic.TrappedPieces(fen).get_explanations(ex_color)
+    for fen in reversed(fens):
+        trapped.pop()
+        assert pins.get_explanations() == heuristic.PinnedPieces(fen).get_explanations()
+        assert trapped.get_explanations() == heuristic.TrappedPieces(fen).get_explanations()
@@ -0,0 +1,85 @@
+import io
+import pickle
+import chess
+import chess.polyglot
+import pytest
+import chessx.heuristic as heuristic
+from chessx import metrics
+from chessx.engine import EnginePool
+from chessx.export import read_pgn
+from chessx.index import ExplanationIndex, build_index
+
+PGN = '''[Event "Italian"]
+[Result "*"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 *
+
+[Event "Transposition"]
+[Result "*"]
+
+1. Nf3 Nc6 2. e4 e5 *
+'''
+
+
+def test_build_and_lookup(tmp_path, fake_uci, fens):
+    '''
+    Indexed positions give BuildInsights' output without asking the engine
+    '''
+    fens = fens + [chess.STARTING_FEN]
+    path = str(tmp_path / 'positions.idx')
+    with EnginePool(fake_uci) as pool:
+        assert build_index(fens + fens[:2], path, pool) == len(fens)
+        expected = [heuristic.BuildInsights(fen, pool=pool).get_insights() for fen in fens]
+
+    with ExplanationIndex(path) as index:
+        assert len(index) == len(fens)
+        assert index.metadata['heuristics'] == {'PSQT': 1, 'PinnedPieces': 1, 'TrappedPieces': 1, 'Mobility': 1}
+        with metrics.collect() as recorder:
+            for fen, insights in zip(fens, expected):
+                assert heuristic.BuildInsights(fen, index=index).get_insights() == insights
+        assert 'engine' not in recorder.timings
+        assert 'PSQT.get_explanations' not in recorder.timings
+
+        missing = chess.Board('8/8/8/3k4/8/3K4/3P4/8 w - - 0 1')
+        assert index.get(missing.fen()) is None
+        assert chess.polyglot.zobrist_hash(missing) not in index
+        entry = index.get(fens[1])
+        assert entry.get_explanations() == expected[1][1:]
+
+        # workers reopen the same file
+        copy = pickle.loads(pickle.dumps(index))
+        assert str(copy.get(fens[1])) == str(entry)
+        copy.close()
+
+
+def test_pgn_source(tmp_path, fake_uci):
+    path = str(tmp_path / 'openings.idx')
+    with EnginePool(fake_uci) as pool:
+        # the second game transposes into the position after 2...Nc6
+        assert build_index(read_pgn(io.StringIO(PGN)), path, pool, max_ply=4) == 7
+    with ExplanationIndex(path) as index:
+        board = chess.Board()
+        for san in ['e4', 'e5', 'Nf3', 'Nc6']:
+            board.push_san(san)
+        assert index.get(board.fen()).score == 0
+        board.push_san('Bc4')
+        assert index.get(board.fen()) is None
+
+
+def test_not_an_index(tmp_path):
+    path = tmp_path / 'bogus.idx'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        ExplanationIndex(str(path))
+
+
+def test_stale_index(tmp_path, monkeypatch, fake_uci, fens):
+    '''
+    An index built before a heuristic changed is refused instead of serving old findings
+    '''
+    path = str(tmp_path / 'positions.idx')
+    with EnginePool(fake_uci) as pool:
+        build_index(fens[:2], path, pool)
+    monkeypatch.setattr(heuristic.Mobility, 'version', heuristic.Mobility.version+1)
+    with pytest.raises(ValueError, match='rebuild'):
+        ExplanationIndex(path)
@@ -0,0 +1,51 @@
+import chessx.heuristic as heuristic
+from chessx import metrics
+from chessx.cache import ExplanationCache
+from chessx.engine import EnginePool
+
+
+def test_nothing_recorded_without_sink(fen):
+    assert metrics.current() is None
+    heuristic.TrappedPieces(fen).get_explanations()
+    assert metrics.current() is None
+
+
+def test_build_insights_stages(fake_uci, fen):
+    cache = ExplanationCache()
+    with EnginePool(fake_uci) as pool:
+        with metrics.collect() as recorder:
+            heuristic.BuildInsights(fen, pool=pool, cache=cache).get_insights()
+    assert metrics.current() is None
+    for stage in ('parse', 'engine', 'BuildInsights.get_insights', 'PSQT.__init__', 'PinnedPieces.get_explanations',
+                  'TrappedPieces.__init__', 'TrappedPieces.get_explanations'):
+        assert recorder.calls[stage] == 1, stage
+        assert recorder.timings[stage] >= 0
+    assert recorder.counters['boards_built'] == 1
+    assert recorder.counters['see_calls'] > 0
+    # the eval and the four heuristics all miss the empty cache
+    assert recorder.counters['cache_misses'] == 5
+    assert 'cache_hits' not in recorder.counters
+
+    with metrics.collect() as recorder:
+        heuristic.BuildInsights(fen, pool=pool, cache=cache).get_insights()
+    assert recorder.counters['cache_hits'] == 5
+    assert 'engine' not in recorder.timings
+
+
+def test_custom_sink_and_profile(fen):
+    class Events(metrics.Metrics):
+        def __init__(self):
+            self.events = []
+            self.stats = None
+
+        def count(self, name, n=1):
+            self.events.append(name)
+
+        def profiled(self, stats):
+            self.stats = stats
+
+    events = Events()
+    with metrics.collect(events, profile=True):
+        heuristic.PinnedPieces(fen).get_explanations()
+    assert events.events == ['boards_built']
+    assert events.stats is not None and events.stats.total_calls > 0
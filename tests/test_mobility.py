@@ -0,0 +1,35 @@
+import chess
+import chessx.heuristic as heuristic
+from chessx.heuristic import MOBILITY_MARGIN
+from chessx.records import KIND_MOBILITY
+
+
+def test_mobility_counts():
+    mob = heuristic.Mobility(chess.STARTING_FEN)
+    assert mob.get_mobility(chess.WHITE) == {chess.KNIGHT: 4, chess.BISHOP: 0, chess.ROOK: 0, chess.QUEEN: 0}
+    assert mob.get_mobility(chess.BLACK) == mob.get_mobility(chess.WHITE)
+    assert mob.get_explanations() == []
+
+    # the knight on d4 reaches 8 squares, two of them (c6, e6) are covered by the pawn on d7
+    mob = heuristic.Mobility('4k3/3p4/8/8/3N4/8/8/4K3 w - - 0 1')
+    assert mob.get_mobility(chess.WHITE, safe=False)[chess.KNIGHT] == 8
+    assert mob.get_mobility(chess.WHITE)[chess.KNIGHT] == 6
+    # own pieces block and are not counted, enemy pieces are
+    mob = heuristic.Mobility('4k3/8/8/8/8/8/P7/R3K2r w - - 0 1')
+    assert mob.get_mobility(chess.WHITE)[chess.ROOK] == 3
+    assert mob.get_mobility(chess.BLACK)[chess.ROOK] == 10
+
+
+def test_mobility_explanations():
+    '''
+    Explanations name the more active side per piece type and honour ex_color
+    '''
+    fen = '4k3/8/8/8/3Q4/8/8/4K2q w - - 0 1'
+    mob = heuristic.Mobility(fen)
+    difference = mob.get_mobility(chess.WHITE)[chess.QUEEN]-mob.get_mobility(chess.BLACK)[chess.QUEEN]
+    assert difference >= MOBILITY_MARGIN
+    assert mob.get_records() == [(KIND_MOBILITY, 1, chess.QUEEN, -1, 0, -1, 0, -1, difference)]
+    assert mob.get_explanations(ex_color=True) == ["White's Queen is/are much more active than Black's"]
+    assert mob.get_explanations(ex_color=False) == []
+    mirrored = heuristic.Mobility(chess.Board(fen).mirror().fen())
+    assert mirrored.get_explanations(ex_color=False) == ["Black's Queen is/are much more active than White's"]
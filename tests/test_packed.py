@@ -0,0 +1,66 @@
+import pickle
+import pytest
+import chess
+import chessx.heuristic as heuristic
+from chessx.packed import decode, encode, POSITION_SIZE, PositionBuffer
+from chessx.parallel import explain_many
+
+FENS = [
+    chess.STARTING_FEN,
+    'rn2kb1r/pp2qppp/2p2n2/4p1B1/2B1P3/1QN5/PPP2PPP/R3K2R b KQkq - 1 9',
+    'rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b Kq e3 0 3',
+    'r3k2r/8/8/8/8/8/8/R3K2R w Qk - 99 150',
+    '1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1',
+]
+
+
+def test_encode_decode():
+    '''
+    Packed positions decode to the same board, including castling, en passant, clocks and Chess960
+    '''
+    boards = [chess.Board(fen) for fen in FENS] + [chess.Board.from_chess960_pos(518), chess.Board.from_chess960_pos(959)]
+    for board in boards:
+        packed = encode(board)
+        assert len(packed) == POSITION_SIZE
+        decoded = decode(packed)
+        assert decoded == board
+        assert decoded.fen() == board.fen()
+        assert decoded.chess960 == board.chess960
+        assert decoded.castling_rights == board.castling_rights
+
+
+def test_position_buffer():
+    '''
+    Buffers index like lists, and unpickle by attaching to the same shared memory
+    '''
+    with PositionBuffer.from_fens(FENS) as buffer:
+        assert len(buffer) == len(FENS)
+        assert [board.fen() for board in buffer.boards()] == FENS
+        assert buffer[-1].fen() == FENS[-1]
+        assert [board.fen() for board in buffer.boards(1, 3)] == FENS[1:3]
+        with pytest.raises(IndexError):
+            buffer[len(FENS)]
+
+        attached = pickle.loads(pickle.dumps(buffer))
+        assert not attached.owner
+        attached[0] = chess.Board(FENS[1])
+        assert buffer[0].fen() == FENS[1]
+        attached.close()
+
+    with pytest.raises(ValueError):
+        PositionBuffer.from_fens(['not a fen'])
+
+
+def test_explain_many_buffer():
+    '''
+    Workers reading a shared buffer explain the same as workers given FENs
+    '''
+    with PositionBuffer.from_fens(FENS) as buffer:
+        results = list(explain_many(buffer, workers=2, chunksize=2))
+        # workers send back indices, FENs are only decoded when read
+        assert all(r._fen is None for r in results)
+        assert [r.fen for r in results] == FENS
+    assert [r.index for r in results] == list(range(len(FENS)))
+    for result, fen in zip(results, FENS):
+        assert result.error is None
+        assert result.explanations == [ex for h in heuristic.INSIGHT_HEURISTICS for ex in h(fen).get_explanations()]
@@ -0,0 +1,37 @@
+import chessx.heuristic as heuristic
+from chessx.parallel import explain_many
+
+FENS = [
+    'rn2kb1r/pp2qppp/2p2n2/4p1B1/2B1P3/1QN5/PPP2PPP/R3K2R b KQkq - 1 9',
+    'not a fen',
+    '1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1',
+    'r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24',
+] * 3
+
+
+def test_explain_many():
+    '''
+    Results come back in order, and a bad FEN only fails its own entry
+    '''
+    results = list(explain_many(FENS, workers=2, chunksize=2))
+    assert [r.index for r in results] == list(range(len(FENS)))
+    for result, fen in zip(results, FENS):
+        if fen == 'not a fen':
+            assert result.error.startswith('ValueError')
+            assert result.explanations == []
+        else:
+            assert result.error is None
+            assert result.explanations == [ex for h in heuristic.INSIGHT_HEURISTICS for ex in h(fen).get_explanations()]
+
+    unordered = list(explain_many(iter(FENS), workers=2, chunksize=1, ordered=False))
+    assert sorted(r.index for r in unordered) == list(range(len(FENS)))
+
+
+def test_explain_many_insights(fake_uci):
+    '''
+    Workers keep their own engine when insights are requested
+    '''
+    results = list(explain_many(FENS[:4], workers=2, chunksize=1, insights=True,
+                                engine_command=fake_uci))
+    assert results[0].explanations[0] == 'Position is equal'
+    assert results[1].error is not None
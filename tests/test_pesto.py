@@ -0,0 +1,74 @@
+import chess
+import chessx.heuristic as heuristic
+
+MOVES = 'e2e4 g8f6 e4e5 d7d5 e5d6 c8e6 d6c7 d8d7 c7b8q a8b8 g1f3 g7g6 f1c4 f8g7 e1g1 e8g8 a2a4 h7h6 a4a5 h6h5 a5a6 b8c8 a6b7 c8c7 b7b8n'
+
+
+def test_pesto_tables():
+    '''
+    The flat tables are read rank-flipped for White, so a piece and its mirror image score the same
+    '''
+    assert len(heuristic.PESTO_MG_TABLE) == len(heuristic.PESTO_EG_TABLE) == 12*64
+    # White knight on e4: 28 in the published table, whose a8-first index of e4 is 36
+    assert heuristic.PESTO_MG_TABLE[heuristic.pesto_index('N')*64+chess.E4] == 337 + 28
+    for symbol in 'PNBRQK':
+        for sq in chess.SQUARES:
+            white = heuristic.pesto_index(symbol)*64+sq
+            black = heuristic.pesto_index(symbol.lower())*64+chess.square_mirror(sq)
+            assert heuristic.PESTO_MG_TABLE[white] == heuristic.PESTO_MG_TABLE[black]
+            assert heuristic.PESTO_EG_TABLE[white] == heuristic.PESTO_EG_TABLE[black]
+
+
+def test_pesto_phase():
+    pesto = heuristic.PeSTO(chess.STARTING_FEN)
+    assert pesto.phase == heuristic.PESTO_MAX_PHASE
+    assert pesto.evaluate() == 0
+    assert pesto.get_explanations() == []
+
+    # a pawn ending is scored on the endgame tables alone
+    pesto = heuristic.PeSTO('8/8/8/3k4/8/3K4/3P4/8 w - - 0 1')
+    assert pesto.phase == 0
+    eg = heuristic.PESTO_EG_TABLE
+    assert pesto.get_piece_eval('p') == eg[chess.D2]
+    assert pesto.get_explanations(ex_color=True) == ["White's Pawn(s) is/are placed at better square(s) than Black"]
+    assert pesto.get_explanations(ex_color=False) == ["Black's King is/are placed at better square(s) than White"]
+
+
+def test_pesto_records_by_colour():
+    '''
+    Only piece types whose tapered score favours the requested colour are reported, with their score
+    '''
+    pesto = heuristic.PeSTO('4k3/3p4/8/8/8/8/8/4K1N1 w - - 0 1')
+    assert pesto.get_piece_eval('n') > 0 > pesto.get_piece_eval('p')
+    assert [(r.color, r.piece_type) for r in pesto.get_records(ex_color=True)] == [(chess.WHITE, chess.KNIGHT)]
+    black = pesto.get_records(ex_color=False)
+    assert [(r.color, r.piece_type, r.value) for r in black] == [(chess.BLACK, chess.PAWN, pesto.get_piece_eval('p'))]
+    assert sorted(pesto.get_records()) == sorted(black + pesto.get_records(ex_color=True))
+
+
+def test_pesto_mirror():
+    for fen in ['r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24',
+                'rn2kb1r/pp2qppp/2p2n2/4p1B1/2B1P3/1QN5/PPP2PPP/R3K2R b KQkq - 1 9']:
+        board = chess.Board(fen)
+        assert heuristic.PeSTO(fen).evaluate() == -heuristic.PeSTO(board.mirror().fen()).evaluate()
+
+
+def test_incremental_pesto():
+    '''
+    PeSTO followed move by move matches PeSTO built from scratch, forwards and backwards
+    '''
+    ctx = heuristic.PositionContext(chess.STARTING_FEN)
+    pesto = heuristic.PeSTO(ctx)
+    fens = []
+    for uci in MOVES.split():
+        fens.append(ctx.board.fen())
+        pesto.push(chess.Move.from_uci(uci))
+        expected = heuristic.PeSTO(ctx.board.fen())
+        assert (pesto.mg_totals, pesto.eg_totals, pesto.phase) == (expected.mg_totals, expected.eg_totals, expected.phase)
+        for ex_color in [None, True, False]:
+            assert pesto.get_explanations(ex_color) == expected.get_explanations(ex_color)
+
+    for fen in reversed(fens):
+        pesto.pop()
+        expected = heuristic.PeSTO(fen)
+        assert (pesto.mg_totals, pesto.eg_totals, pesto.phase) == (expected.mg_totals, expected.eg_totals, expected.phase)
@@ -0,0 +1,44 @@
+import chess
+import chessx.heuristic as heuristic
+
+
+def test_pinned_pieces():
+    '''
+    Relative pins to queens and absolute pins to kings
+    '''
+    pin = heuristic.PinnedPieces('1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1')
+    assert pin.get_explanations() == [
+        "White Knight at b4 is pinned to its Queen at b1 by the opponent's Rook at b8",
+        "Black Knight at e6 is pinned to its King at c8 by the opponent's Bishop at f5",
+    ]
+    assert pin.get_explanations(ex_color=True) == pin.get_explanations()[1:]
+
+    pin = heuristic.PinnedPieces('6k1/pp1n2pp/3bN3/3P1p2/1PP5/4rBqr/P2Q2P1/R4RK1 w - - 0 27')
+    assert pin.get_explanations() == ["White Pawn at g2 is pinned to its King at g1 by the opponent's Queen at g3"]
+
+
+def test_absolute_pins():
+    '''
+    get_absolute_pins agrees with board.is_pinned and finds the pinning slider
+    '''
+    for fen in ['1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1',
+                '6k1/pp1n2pp/3bN3/3P1p2/1PP5/4rBqr/P2Q2P1/R4RK1 w - - 0 27',
+                'q3r2k/1b6/8/8/4N3/8/2B1P3/r2RK3 w - - 0 1']:
+        pin = heuristic.PinnedPieces(fen)
+        board = chess.Board(fen)
+        absolute_pins = pin.get_absolute_pins()
+        expected = [(color, sq) for color in [chess.BLACK, chess.WHITE] for sq in chess.SQUARES if board.is_pinned(color, sq)]
+        assert [(board.king(chess.WHITE) == p.pinned_to_sq, p.piece_sq) for p in absolute_pins] == expected
+        for p in absolute_pins:
+            assert p.pinned_by_sq in board.pin(board.color_at(p.pinned_to_sq), p.piece_sq)
+            assert board.piece_type_at(p.pinned_by_sq) in [chess.BISHOP, chess.ROOK, chess.QUEEN]
+
+
+def test_pins_searched_per_colour():
+    '''
+    Reporting one side's pins never searches the other side's
+    '''
+    pin = heuristic.PinnedPieces('1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1')
+    assert len(pin.get_explanations(ex_color=False)) == 1
+    assert list(pin._pinned) == [chess.WHITE]
+    assert [p.piece_sq for p in pin.pinned_pieces] == [chess.B4, chess.E6]
@@ -1,3 +1,4 @@
+import chess
 import chessx.heuristic as heuristic
 
 
@@ -29,3 +30,31 @@ def test_explanations():
 
     # fen_str_1 should generate 4 PSQT explanation strings
     assert len(exp_list) == 4
+
+
+def test_incremental_psqt():
+    '''
+    IncrementalPSQT matches PSQT built from scratch through castling, en passant,
+    promotions and take-backs
+    '''
+
+    # exd6 e.p., cxb8=Q, castling on both sides and an underpromotion to a knight
+    moves = 'e2e4 g8f6 e4e5 d7d5 e5d6 c8e6 d6c7 d8d7 c7b8q a8b8 g1f3 g7g6 f1c4 f8g7 e1g1 e8g8 a2a4 h7h6 a4a5 h6h5 a5a6 b8c8 a6b7 c8c7 b7b8n'
+    ctx = heuristic.PositionContext(chess.STARTING_FEN)
+    psqt = heuristic.IncrementalPSQT(ctx)
+    fens = []
+    for uci in moves.split():
+        fens.append(ctx.board.fen())
+        psqt.push(chess.Move.from_uci(uci))
+        expected = heuristic.PSQT(ctx.board.fen())
+        for piece in ['p', 'b', 'n', 'r', 'q', 'k']:
+            assert psqt.get_piece_eval(piece) == expected.get_piece_eval(piece)
+        for ex_color in [None, True, False]:
+            assert psqt.get_explanations(ex_color) == expected.get_explanations(ex_color)
+
+    for fen in reversed(fens):
+        psqt.pop()
+        assert ctx.board.fen() == fen
+        expected = heuristic.PSQT(fen)
+        for piece in ['p', 'b', 'n', 'r', 'q', 'k']:
+            assert psqt.get_piece_eval(piece) == expected.get_piece_eval(piece)
@@ -0,0 +1,33 @@
+import json
+import chess
+import chessx.heuristic as heuristic
+from chessx import records
+
+FENS = [
+    'rn2kb1r/pp2qppp/2p2n2/4p1B1/2B1P3/1QN5/PPP2PPP/R3K2R b KQkq - 1 9',
+    'r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24',
+    '1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1',
+]
+
+
+def test_records_render_to_explanations():
+    for fen in FENS:
+        for cls in [heuristic.PSQT, heuristic.PinnedPieces, heuristic.TrappedPieces]:
+            for ex_color in [None, True, False]:
+                h = cls(fen)
+                assert records.render_all(h.get_records(ex_color)) == h.get_explanations(ex_color)
+
+
+def test_pin_record():
+    pin = heuristic.PinnedPieces('1rk5/8/4n3/5B2/1N6/8/8/1Q1K4 b - - 0 1')
+    assert pin.get_records(ex_color=True) == [
+        records.Explanation(records.KIND_PIN, chess.BLACK, chess.KNIGHT, chess.E6, chess.KING, chess.C8, chess.BISHOP, chess.F5)]
+
+
+def test_pack_records():
+    recs = [r for fen in FENS for r in heuristic.TrappedPieces(fen).get_records() + heuristic.PSQT(fen).get_records()]
+    data = records.pack_records(recs)
+    assert len(data) == 4*records.RECORD_FIELDS*len(recs)
+    assert records.unpack_records(data) == recs
+    # records are plain tuples of ints
+    assert [records.Explanation(*r) for r in json.loads(json.dumps(recs))] == recs
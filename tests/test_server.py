@@ -0,0 +1,151 @@
+import asyncio
+import json
+import chess
+import chess.engine
+import pytest
+import chessx.heuristic as heuristic
+from chessx.aio import AsyncEnginePool
+from chessx.fake_uci import material_score
+from chessx.server import InsightServer, MAX_BODY, Overloaded
+
+LIMIT = chess.engine.Limit(depth=1)
+
+
+def expected(fen):
+    board = chess.Board(fen)
+    score = chess.engine.PovScore(chess.engine.Cp(material_score(board)), board.turn).white().score()
+    return score, heuristic.BuildInsights(fen, score=score).get_insights()
+
+
+def test_micro_batching(fake_uci, fens):
+    '''
+    Concurrent requests are answered in batches and match BuildInsights
+    '''
+    async def run():
+        async with AsyncEnginePool(fake_uci, size=2) as pool:
+            async with InsightServer(pool, limit=LIMIT, max_batch=8, max_wait=0.05) as server:
+                results = await asyncio.gather(*(server.submit(fen) for fen in fens * 5))
+                return results, server.stats, server.stats_dict(), server.metrics.calls['engine']
+
+    results, stats, stats_dict, engine_calls = asyncio.run(run())
+    for fen, result in zip(fens * 5, results):
+        assert result == expected(fen)
+    assert stats.completed == 20
+    assert stats.batches < 20
+    assert stats_dict['queue_depth'] == 0
+    assert stats_dict['counters']['batched_requests'] == 20
+    # repeated positions are analysed once per batch at most, then come from the cache
+    assert len(fens) <= engine_calls < 20
+    assert stats_dict['latency_ms']['p99'] >= stats_dict['latency_ms']['p50'] > 0
+
+
+def test_backpressure(fake_uci, fens):
+    async def run():
+        async with AsyncEnginePool(fake_uci, size=1) as pool:
+            async with InsightServer(pool, limit=LIMIT, max_batch=1, queue_size=2) as server:
+                results = await asyncio.gather(*(server.submit(fen) for fen in fens * 3), return_exceptions=True)
+                return results, server.stats
+
+    results, stats = asyncio.run(run())
+    rejected = [r for r in results if isinstance(r, Overloaded)]
+    assert rejected and len(rejected) == stats.rejected
+    assert stats.accepted + stats.rejected == 12
+    assert stats.max_queue_depth == 2
+
+
+def test_http(tmp_path, fake_uci, fens):
+    '''
+    The server answers HTTP/1.1 on a Unix socket, keeping the connection alive
+    '''
+    async def request(reader, writer, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) != b'\r\n':
+            name, _, value = line.decode().partition(':')
+            headers[name.lower()] = value.strip()
+        return status, json.loads(await reader.readexactly(int(headers['content-length'])))
+
+    async def run():
+        async with AsyncEnginePool(fake_uci, size=1) as pool:
+            async with InsightServer(pool, limit=LIMIT) as server:
+                path = str(tmp_path / 'chessx.sock')
+                async with await server.listen(path=path):
+                    reader, writer = await asyncio.open_unix_connection(path)
+                    responses = [await request(reader, writer, 'POST', '/insights', {'fen': fens[0]}),
+                                 await request(reader, writer, 'POST', '/insights', {'fen': 'not a fen'}),
+                                 await request(reader, writer, 'POST', '/insights', {'fen': '8/8/8/8/8/8/8/8 w - - 0 1'}),
+                                 await request(reader, writer, 'GET', '/insights'),
+                                 await request(reader, writer, 'GET', '/nowhere'),
+                                 await request(reader, writer, 'GET', '/stats')]
+                    writer.close()
+                    return responses
+
+    responses = asyncio.run(run())
+    score, insights = expected(fens[0])
+    assert responses[0] == (200, {'fen': fens[0], 'score': score, 'insights': insights})
+    assert [status for status, _ in responses[1:5]] == [400, 400, 405, 404]
+    status, stats = responses[5]
+    assert status == 200
+    assert (stats['completed'], stats['rejected'], stats['queue_depth']) == (1, 0, 0)
+
+
+def test_fen_parsed_once(fake_uci, fen, monkeypatch):
+    '''
+    An HTTP request parses its FEN once, for validation, the engine and the heuristics
+    '''
+    parsed = []
+    set_fen = chess.Board.set_fen
+    monkeypatch.setattr(chess.Board, 'set_fen', lambda board, fen: parsed.append(fen) or set_fen(board, fen))
+
+    async def run():
+        async with AsyncEnginePool(fake_uci, size=1) as pool:
+            async with InsightServer(pool, limit=LIMIT) as server:
+                return await server.handle('POST', '/insights', json.dumps({'fen': fen}).encode())
+
+    status, _ = asyncio.run(run())
+    assert status == 200
+    assert parsed.count(fen) == 1
+
+
+def test_content_length(tmp_path, fake_uci):
+    '''
+    Bad or oversized Content-Length headers are refused before any body is read, closing the connection
+    '''
+    async def request(path, length):
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(f'POST /insights HTTP/1.1\r\nHost: localhost\r\nContent-Length: {length}\r\n\r\n'.encode())
+        response = await asyncio.wait_for(reader.read(), 2)
+        writer.close()
+        return int(response.split()[1]), b'Connection: close' in response
+
+    async def run():
+        async with AsyncEnginePool(fake_uci, size=1) as pool:
+            async with InsightServer(pool, limit=LIMIT) as server:
+                path = str(tmp_path / 'chessx.sock')
+                async with await server.listen(path=path):
+                    return [await request(path, length) for length in ('abc', '-1', MAX_BODY+1, 10**12)]
+
+    assert asyncio.run(run()) == [(400, True), (400, True), (413, True), (413, True)]
+
+
+def test_close_in_flight(fake_uci, fens):
+    '''
+    Closing the server fails the requests being analysed and those still queued, instead of leaving them pending
+    '''
+    async def run():
+        async with AsyncEnginePool(fake_uci, size=1, options={'Delay': 300}) as pool:
+            server = await InsightServer(pool, limit=LIMIT, max_batch=1).start()
+            requests = [asyncio.ensure_future(server.submit(fen)) for fen in fens[:2]]
+            await asyncio.sleep(0.1)
+            await server.close()
+            return await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), 2)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) and str(r) == 'InsightServer closed' for r in results)
+
+
+def test_validation():
+    with pytest.raises(ValueError):
+        InsightServer(None, max_batch=0)
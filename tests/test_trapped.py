@@ -0,0 +1,78 @@
+import chess
+import chessx.heuristic as heuristic
+
+
+def test_static_exchange_eval():
+    '''
+    SEE uses the least valuable attacker and sees x-ray attackers behind other pieces
+    '''
+    # Black queen on d6 backs up the rook on c2 through the d-file: Bd2 loses the bishop
+    fen_str = '2b3r1/2p1kp2/n2q1n1p/1P2p1p1/p1P1BNP1/4P3/1Pr4P/1RBR1QK1 b - - 2 28'
+    board = chess.Board(fen_str)
+    assert heuristic.static_exchange_eval(board, chess.D2, chess.WHITE, 3, chess.BB_SQUARES[chess.C1]) == 3
+    assert heuristic.TrappedPieces(fen_str).get_explanations(ex_color=False) == ['White Bishop(s) at c1 is trapped']
+
+    # doubled rooks win a knight defended once, the rook on d1 joins in behind the one on d2
+    board = chess.Board('6k1/3r4/8/3n4/8/8/3R4/3RK3 w - - 0 1')
+    assert heuristic.static_exchange_eval(board, chess.D5, chess.BLACK, 3) == 3
+    board = chess.Board('3r2k1/3r4/8/3n4/8/8/3R4/3RK3 w - - 0 1')
+    assert heuristic.static_exchange_eval(board, chess.D5, chess.BLACK, 3) == 0
+
+    # a king may not capture onto a defended square
+    board = chess.Board('6k1/8/8/8/8/8/2n5/3K4 w - - 0 1')
+    assert heuristic.static_exchange_eval(board, chess.C2, chess.BLACK, 3) == 3
+    board = chess.Board('6k1/8/8/8/8/8/2n5/n2K4 w - - 0 1')
+    assert heuristic.static_exchange_eval(board, chess.C2, chess.BLACK, 3) == 0
+
+
+def test_see_is_memoised():
+    '''
+    Repeated SEE queries for a position are answered from the context
+    '''
+    ctx = heuristic.PositionContext('r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24')
+    tp = heuristic.TrappedPieces(ctx)
+    tp.get_explanations()
+    cached = len(ctx._see)
+    assert cached > 0
+    tp.get_explanations()
+    assert len(ctx._see) == cached
+
+
+def test_see_memo_keeps_from_square():
+    '''
+    A memoised SEE without from_sq is not shared with a knight moving to the square, in either call order
+    '''
+    fen_str = '4k3/8/6b1/8/8/2N5/8/4K3 w - - 0 1'
+    ctx = heuristic.PositionContext(fen_str)
+    assert ctx.see(chess.E4, chess.WHITE, 3, chess.C3) == 3
+    assert ctx.see(chess.E4, chess.WHITE, 3) == 0
+    ctx = heuristic.PositionContext(fen_str)
+    assert ctx.see(chess.E4, chess.WHITE, 3) == 0
+    assert ctx.see(chess.E4, chess.WHITE, 3, chess.C3) == 3
+
+
+def test_attack_map_matches_see():
+    '''
+    check_en_prise answered from the attack maps agrees with a full SEE for every capture-free escape
+    '''
+    for fen_str in ['r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24',
+                    '2b3r1/2p1kp2/n2q1n1p/1P2p1p1/p1P1BNP1/4P3/1Pr4P/1RBR1QK1 b - - 2 28',
+                    '1r2kb2/p2p3p/1q2N3/3n1pB1/Pp1ppNrQ/6P1/4b1KP/2R2B1R w - - 0 41']:
+        tp = heuristic.TrappedPieces(fen_str)
+        board = chess.Board(fen_str)
+        for from_sq in chess.scan_forward(board.occupied & ~board.pawns):
+            color = board.color_at(from_sq)
+            value = heuristic.PIECE_VALUES[board.piece_type_at(from_sq)]
+            for to_sq in chess.scan_forward(board.attacks_mask(from_sq) & ~board.occupied_co[color]):
+                see = heuristic.static_exchange_eval(board, to_sq, color, value, chess.BB_SQUARES[from_sq])
+                assert tp.check_en_prise(from_sq, to_sq) == (see > 0)
+
+
+def test_trapped_searched_per_colour():
+    '''
+    Reporting one side's trapped pieces never searches the other side's
+    '''
+    tp = heuristic.TrappedPieces('r5k1/p4p1p/2p3pb/2N1n2n/1p2PP2/1B2B1PP/PP4K1/3R4 b - - 0 24')
+    black = tp.get_explanations(ex_color=True)
+    assert list(tp._trapped) == [chess.BLACK]
+    assert black == [ex for ex in tp.get_explanations() if ex.startswith('Black')]